@@ -0,0 +1,210 @@
+import argparse
+import email.parser
+import email.policy
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8089
+
+_LESSON = re.compile(r"user_id (\S+), lesson_id (\S+)\):")
+_ATTEMPTS = re.compile(r"Total attempts: (\S+)")
+_ACCURACY = re.compile(r"Accuracy rate: (\S+)")
+
+
+def _summary(stats: str) -> str:
+    attempts = _ATTEMPTS.search(stats)
+    accuracy = _ACCURACY.search(stats)
+    return (
+        f"The learner answered {accuracy.group(1) if accuracy else 'some'} of "
+        f"{attempts.group(1) if attempts else 'their'} attempts correctly."
+    )
+
+
+def _completion(body: dict, ids) -> dict:
+    """
+    A canned chat completion for a summary request: one sentence from the
+    prompt's stats, or for JSON-mode (multi-lesson) prompts one entry per
+    lesson.
+    """
+    prompt = body["messages"][-1]["content"]
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        parts = _LESSON.split(prompt)
+        summaries = [
+            {"user_id": int(user_id), "lesson_id": int(lesson_id), "summary": _summary(stats)}
+            for user_id, lesson_id, stats in zip(parts[1::3], parts[2::3], parts[3::3])
+        ]
+        content = json.dumps({"summaries": summaries})
+    else:
+        content = _summary(prompt)
+
+    return {
+        "id": f"chatcmpl-{next(ids)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model"),
+        "choices": [
+            {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}
+        ],
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 20, "total_tokens": len(prompt) // 4 + 20},
+    }
+
+
+class StubState:
+    """
+    Files and batches held in memory; batches finish batch_delay seconds
+    after they were created.
+    """
+
+    def __init__(self, batch_delay: float = 0.0):
+        self.batch_delay = batch_delay
+        self.files = {}
+        self.batches = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def add_file(self, content: bytes, purpose: str, filename: str) -> dict:
+        with self.lock:
+            file_id = f"file-{next(self.ids)}"
+            self.files[file_id] = content
+        return {
+            "id": file_id,
+            "object": "file",
+            "bytes": len(content),
+            "created_at": int(time.time()),
+            "filename": filename,
+            "purpose": purpose,
+            "status": "processed",
+        }
+
+    def create_batch(self, request: dict) -> dict:
+        lines = self.files[request["input_file_id"]].decode("utf-8").splitlines()
+        output = []
+        for line in filter(None, (line.strip() for line in lines)):
+            item = json.loads(line)
+            output.append(
+                {
+                    "id": f"batch_req_{next(self.ids)}",
+                    "custom_id": item["custom_id"],
+                    "response": {"status_code": 200, "body": _completion(item["body"], self.ids)},
+                    "error": None,
+                }
+            )
+        output_file = self.add_file(
+            "".join(json.dumps(line) + "\n" for line in output).encode("utf-8"), "batch_output", "output.jsonl"
+        )
+
+        with self.lock:
+            batch_id = f"batch_{next(self.ids)}"
+            self.batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": request["endpoint"],
+                "input_file_id": request["input_file_id"],
+                "completion_window": request["completion_window"],
+                "metadata": request.get("metadata"),
+                "created_at": int(time.time()),
+                "request_counts": {"total": len(output), "completed": len(output), "failed": 0},
+                "_ready_at": time.monotonic() + self.batch_delay,
+                "_output_file_id": output_file["id"],
+            }
+        return self.get_batch(batch_id)
+
+    def get_batch(self, batch_id: str) -> dict:
+        batch = self.batches[batch_id]
+        done = time.monotonic() >= batch["_ready_at"]
+        return {
+            **{k: v for k, v in batch.items() if not k.startswith("_")},
+            "status": "completed" if done else "in_progress",
+            "output_file_id": batch["_output_file_id"] if done else None,
+            "error_file_id": None,
+        }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    state: StubState = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, payload, content_type: str = "application/json"):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", content_type)
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("content-length", 0)))
+
+    def do_POST(self):
+        path = self.path.split("?")[0].rstrip("/")
+        if path.endswith("/chat/completions"):
+            self._send(200, _completion(json.loads(self._body()), self.state.ids))
+        elif path.endswith("/files"):
+            form = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+                f"content-type: {self.headers['content-type']}\r\n\r\n".encode("utf-8") + self._body()
+            )
+            fields = {
+                part.get_param("name", header="content-disposition"): part
+                for part in form.iter_parts()
+            }
+            upload = fields["file"]
+            self._send(
+                200,
+                self.state.add_file(
+                    upload.get_payload(decode=True),
+                    fields["purpose"].get_payload(decode=True).decode("utf-8"),
+                    upload.get_filename() or "upload.jsonl",
+                ),
+            )
+        elif path.endswith("/batches"):
+            self._send(200, self.state.create_batch(json.loads(self._body())))
+        else:
+            self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        match = re.search(r"/files/([^/]+)/content$", path)
+        if match and match.group(1) in self.state.files:
+            self._send(200, self.state.files[match.group(1)], "application/octet-stream")
+            return
+        match = re.search(r"/batches/([^/]+)$", path)
+        if match and match.group(1) in self.state.batches:
+            self._send(200, self.state.get_batch(match.group(1)))
+            return
+        self._send(404, {"error": {"message": f"unknown path {self.path}"}})
+
+
+def serve(port: int = DEFAULT_PORT, batch_delay: float = 0.0):
+    """
+    Serve the stand-in on 127.0.0.1:port until interrupted.
+    """
+    handler = type("Handler", (StubHandler,), {"state": StubState(batch_delay)})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    print(f"LLM stand-in on http://127.0.0.1:{port}/v1 (batches finish after {batch_delay:g}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m ai_manager.bench.llm_stub",
+        description="Local OpenAI-compatible stand-in for chat completions, files and batches.",
+    )
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--batch-delay", type=float, default=0.0, help="seconds before a batch completes")
+    args = parser.parse_args(argv)
+    serve(args.port, args.batch_delay)
+
+
+if __name__ == "__main__":
+    main()
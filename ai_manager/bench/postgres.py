@@ -0,0 +1,77 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+# Durability is irrelevant for a database that is deleted afterwards.
+SERVER_OPTIONS = (
+    "-c listen_addresses='' "
+    "-c fsync=off "
+    "-c synchronous_commit=off "
+    "-c full_page_writes=off"
+)
+
+
+def _pg_bin(name: str) -> str:
+    """
+    Locate a PostgreSQL server binary: $PG_BINDIR first, then PATH.
+    """
+    bindir = os.getenv("PG_BINDIR")
+    if bindir:
+        path = Path(bindir) / name
+        if path.exists():
+            return str(path)
+
+    found = shutil.which(name)
+    if not found:
+        raise RuntimeError(f"{name} not found; install PostgreSQL or set PG_BINDIR")
+    return found
+
+
+@contextmanager
+def throwaway_postgres(extra_options: str = ""):
+    """
+    Run a private PostgreSQL server in a temp directory for the duration of
+    the block and yield its DSN. The server only listens on a Unix socket
+    inside that directory, so nothing is reachable over the network.
+    The data directory is deleted afterwards.
+    """
+    if hasattr(os, "geteuid") and os.geteuid() == 0:
+        raise RuntimeError("PostgreSQL refuses to run as root; run the benchmark as an unprivileged user")
+
+    root = Path(tempfile.mkdtemp(prefix="ai_bench_pg_"))
+    data_dir = root / "data"
+    socket_dir = root / "sock"
+    socket_dir.mkdir()
+
+    try:
+        subprocess.run(
+            [_pg_bin("initdb"), "-D", str(data_dir), "-U", "postgres", "-A", "trust", "-E", "UTF8"],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        subprocess.run(
+            [
+                _pg_bin("pg_ctl"),
+                "-D", str(data_dir),
+                "-l", str(root / "server.log"),
+                "-o", f"-k {socket_dir} {SERVER_OPTIONS} {extra_options}",
+                "-w",
+                "start",
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+
+        try:
+            yield f"postgresql:///postgres?host={socket_dir}&user=postgres"
+        finally:
+            subprocess.run(
+                [_pg_bin("pg_ctl"), "-D", str(data_dir), "-m", "fast", "-w", "stop"],
+                check=False,
+                stdout=subprocess.DEVNULL,
+            )
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,150 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+import traceback
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+import psycopg2
+
+from ai_manager.bench.postgres import throwaway_postgres
+from ai_manager.bench.synthetic import SCALES, create_schema, load_synthetic
+
+# Results are tracked, so a change's effect on them shows up in review.
+DEFAULT_OUTPUT_DIR = "bench_results"
+
+
+def _lane_child(lane: str, results):
+    """
+    Runs in a fresh forked process so peak RSS belongs to this lane alone.
+    """
+    from ai_manager.main import LANES
+
+    try:
+        started = time.perf_counter()
+        stats = LANES[lane]() or {}
+        seconds = time.perf_counter() - started
+        results.put({
+            "ok": True,
+            "seconds": seconds,
+            "stats": stats,
+            # Linux reports ru_maxrss in KiB.
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        })
+    except Exception:
+        results.put({"ok": False, "error": traceback.format_exc()})
+
+
+def run_lane(lane: str) -> dict:
+    """
+    Run one lane in a child process and return its measurements.
+    """
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    child = ctx.Process(target=_lane_child, args=(lane, results))
+    child.start()
+    outcome = results.get()
+    child.join()
+
+    if not outcome["ok"]:
+        print(outcome["error"], file=sys.stderr)
+        return {"ok": False, "error": outcome["error"].strip().splitlines()[-1]}
+
+    stats = outcome["stats"]
+    seconds = outcome["seconds"]
+    attempts = stats.get("attempts", 0)
+    stages = {
+        name: {
+            "busy_seconds": round(timing["busy"], 4),
+            "idle_seconds": round(timing["idle"], 4),
+            "items": timing["items"],
+            "ms_per_item": round(1000 * timing["busy"] / timing["items"], 3) if timing["items"] else None,
+        }
+        for name, timing in stats.get("stages", {}).items()
+    }
+
+    return {
+        "ok": True,
+        "seconds": round(seconds, 3),
+        "attempts": attempts,
+        "attempts_per_second": round(attempts / seconds, 1) if seconds > 0 else None,
+        "rows_written": stats.get("rows_written", 0),
+        "peak_rss_mb": round(outcome["peak_rss_mb"], 1),
+        "stages": stages,
+        **{k: v for k, v in stats.items() if k not in ("attempts", "rows_written", "stages")},
+    }
+
+
+def run_benchmark(database_url: str, scale: str, seed: int, lanes) -> dict:
+    os.environ["DATABASE_URL"] = database_url
+
+    with psycopg2.connect(database_url) as conn:
+        create_schema(conn)
+        loaded = load_synthetic(conn, SCALES[scale], seed=seed)
+        with conn.cursor() as cur:
+            cur.execute("SHOW server_version")
+            server_version = cur.fetchone()[0]
+    conn.close()
+
+    report = {
+        "scale": scale,
+        "rows_per_table": SCALES[scale],
+        "seed": seed,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "postgres": server_version,
+        "load": loaded,
+        "lanes": {},
+    }
+
+    for lane in lanes:
+        print(f"Benchmarking {lane} lane ({scale})")
+        report["lanes"][lane] = run_lane(lane)
+
+    return report
+
+
+def main(argv=None):
+    from ai_manager.main import LANES
+
+    parser = argparse.ArgumentParser(
+        prog="python -m ai_manager.bench.run",
+        description="Load a seeded synthetic data set and time each lane against it.",
+    )
+    parser.add_argument("--scale", default="10k", choices=sorted(SCALES))
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--lanes", nargs="*", default=list(LANES), metavar="LANE")
+    parser.add_argument(
+        "--database-url",
+        default=os.getenv("BENCH_DATABASE_URL"),
+        help="scratch database to load (DESTROYS its fixture tables); "
+             "default: start a throwaway local server",
+    )
+    parser.add_argument("--out", help=f"results file (default: {DEFAULT_OUTPUT_DIR}/<scale>.json)")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.lanes if name not in LANES]
+    if unknown:
+        parser.error(f"unknown lane(s): {', '.join(unknown)} (choose from {', '.join(LANES)})")
+
+    server = nullcontext(args.database_url) if args.database_url else throwaway_postgres()
+    with server as database_url:
+        report = run_benchmark(database_url, args.scale, args.seed, args.lanes)
+
+    out = args.out or os.path.join(DEFAULT_OUTPUT_DIR, f"{args.scale}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+        f.write("\n")
+    print(f"Wrote {out}")
+
+    sys.exit(0 if all(r["ok"] for r in report["lanes"].values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
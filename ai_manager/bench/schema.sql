@@ -0,0 +1,132 @@
+-- Benchmark fixture schema.
+-- Minimal copies of the app-local source tables and the *_ai_* tables the
+-- lanes write, with the keys the upserts conflict on. Only ever applied to
+-- a throwaway benchmark database.
+
+CREATE TABLE IF NOT EXISTS public.words (
+    word_id BIGINT PRIMARY KEY,
+    headword TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS public.attempts (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    course_id INT NOT NULL,
+    lesson_id BIGINT NOT NULL,
+    headword TEXT,
+    is_correct BOOLEAN NOT NULL,
+    response_ms INT,
+    ts TIMESTAMPTZ NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS public.spelling_attempts (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    lesson_id BIGINT NOT NULL,
+    word TEXT NOT NULL,
+    is_correct BOOLEAN NOT NULL,
+    response_ms INT,
+    ts TIMESTAMPTZ NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS public.math_attempts (
+    id BIGSERIAL PRIMARY KEY,
+    user_id BIGINT NOT NULL,
+    lesson_id BIGINT NOT NULL,
+    question_id BIGINT NOT NULL,
+    is_correct BOOLEAN NOT NULL,
+    response_ms INT,
+    ts TIMESTAMPTZ NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS public.synonym_ai_word_insights (
+    user_id BIGINT NOT NULL,
+    course_id INT,
+    lesson_id BIGINT NOT NULL,
+    word_id BIGINT NOT NULL,
+    attempts_total BIGINT NOT NULL,
+    attempts_incorrect BIGINT NOT NULL,
+    accuracy_rate NUMERIC,
+    avg_response_ms NUMERIC,
+    response_ms_sum NUMERIC,
+    response_ms_count BIGINT,
+    last_attempt_at TIMESTAMPTZ,
+    last_incorrect_at TIMESTAMPTZ,
+    weakness_score NUMERIC,
+    evaluated_at TIMESTAMPTZ,
+    model_version TEXT,
+    job_run_id TEXT,
+    PRIMARY KEY (user_id, lesson_id, word_id)
+);
+
+CREATE TABLE IF NOT EXISTS public.synonym_ai_lesson_insights (
+    user_id BIGINT NOT NULL,
+    course_id INT,
+    lesson_id BIGINT NOT NULL,
+    accuracy_rate NUMERIC,
+    avg_response_ms NUMERIC,
+    last_attempt_at TIMESTAMPTZ,
+    top_weak_word_ids JSONB,
+    summary_text TEXT,
+    evaluated_at TIMESTAMPTZ,
+    model_version TEXT,
+    job_run_id TEXT,
+    PRIMARY KEY (user_id, lesson_id)
+);
+
+CREATE TABLE IF NOT EXISTS public.spelling_ai_word_insights (
+    user_id BIGINT NOT NULL,
+    lesson_id BIGINT NOT NULL,
+    headword TEXT NOT NULL,
+    attempts_total BIGINT NOT NULL,
+    attempts_incorrect BIGINT NOT NULL,
+    accuracy_rate NUMERIC,
+    avg_response_ms NUMERIC,
+    response_ms_sum NUMERIC,
+    response_ms_count BIGINT,
+    last_attempt_at TIMESTAMPTZ,
+    last_incorrect_at TIMESTAMPTZ,
+    weakness_score NUMERIC,
+    evaluated_at TIMESTAMPTZ,
+    model_version TEXT,
+    PRIMARY KEY (user_id, lesson_id, headword)
+);
+
+CREATE TABLE IF NOT EXISTS public.math_ai_question_insights (
+    user_id BIGINT NOT NULL,
+    lesson_id BIGINT NOT NULL,
+    question_id TEXT NOT NULL,
+    attempts_total BIGINT NOT NULL,
+    attempts_incorrect BIGINT NOT NULL,
+    accuracy_rate NUMERIC,
+    avg_response_ms NUMERIC,
+    response_ms_sum NUMERIC,
+    response_ms_count BIGINT,
+    last_attempt_at TIMESTAMPTZ,
+    last_incorrect_at TIMESTAMPTZ,
+    weakness_score NUMERIC,
+    evaluated_at TIMESTAMPTZ,
+    model_version TEXT,
+    PRIMARY KEY (user_id, lesson_id, question_id)
+);
+
+CREATE TABLE IF NOT EXISTS public.platform_ai_job_runs (
+    id BIGSERIAL PRIMARY KEY,
+    job_name TEXT,
+    job_run_id TEXT,
+    lane TEXT,
+    status TEXT NOT NULL CHECK (status IN ('STARTED', 'SUCCESS', 'FAILED')),
+    started_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMPTZ,
+    error_message TEXT,
+    processed_users INT,
+    processed_lessons INT,
+    processed_attempts BIGINT,
+    model_version TEXT
+);
+
+CREATE TABLE IF NOT EXISTS public.platform_ai_job_checkpoints (
+    job_name TEXT PRIMARY KEY,
+    last_processed_at TIMESTAMPTZ,
+    last_processed_id BIGINT
+);
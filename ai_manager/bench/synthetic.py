@@ -0,0 +1,219 @@
+import io
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from ai_manager.repo.synonym_repo import SYNONYM_COURSE_IDS
+
+SCHEMA_SQL = Path(__file__).with_name("schema.sql")
+SQL_DIR = Path(__file__).resolve().parent.parent / "sql"
+# One-time service SQL applied on top of the fixture schema.
+SERVICE_SQL = (
+    "synonym_ai_summary_cache.sql",
+    "synonym_ai_summary_batches.sql",
+    "platform_ai_job_runs_metrics.sql",
+    "ai_daily_rollups.sql",
+    "ai_lesson_insights.sql",
+    "platform_ai_backfill_ranges.sql",
+)
+
+# Attempts per source table.
+SCALES = {
+    "10k": 10_000,
+    "1m": 1_000_000,
+    "10m": 10_000_000,
+}
+
+WORDS = 5_000
+LESSONS = 40
+ITEMS_PER_LESSON = 25
+HISTORY_DAYS = 90
+# Share of synonym attempts whose headword has no row in public.words.
+UNMATCHED_SHARE = 0.01
+LOAD_PAGE_ROWS = 100_000
+
+# Built after the load, as in production: keyset paging walks (ts, id).
+POST_LOAD_INDEXES = {
+    "attempts_ts_id_idx": "public.attempts (ts, id)",
+    "spelling_attempts_ts_id_idx": "public.spelling_attempts (ts, id)",
+    "math_attempts_ts_id_idx": "public.math_attempts (ts, id)",
+    "attempts_user_lesson_idx": "public.attempts (user_id, lesson_id)",
+    "spelling_attempts_user_lesson_idx": "public.spelling_attempts (user_id, lesson_id)",
+    "math_attempts_user_lesson_idx": "public.math_attempts (user_id, lesson_id)",
+    "words_lower_headword_idx": "public.words (LOWER(headword))",
+}
+
+
+def _users_for(rows: int) -> int:
+    # ~200 attempts per learner, never fewer than 50 learners.
+    return max(50, rows // 200)
+
+
+def _headword(word_id: int) -> str:
+    return f"word{word_id:05d}"
+
+
+def _cased(rng: random.Random, text: str) -> str:
+    # The apps store headwords as typed; the lanes normalise with LOWER().
+    roll = rng.random()
+    if roll < 0.1:
+        return text.upper()
+    if roll < 0.3:
+        return text.capitalize()
+    return text
+
+
+def _attempt_ts(rng: random.Random, end: datetime) -> str:
+    return (end - timedelta(seconds=rng.random() * HISTORY_DAYS * 86400)).isoformat()
+
+
+def _outcome(rng: random.Random, difficulty: float):
+    is_correct = rng.random() > difficulty
+    response_ms = "\\N" if rng.random() < 0.02 else str(int(rng.lognormvariate(8.0, 0.5)))
+    return ("t" if is_correct else "f"), response_ms
+
+
+def _synonym_rows(rng, rows, users, end):
+    for _ in range(rows):
+        lesson_id = rng.randrange(LESSONS)
+        if rng.random() < UNMATCHED_SHARE:
+            headword = f"unknown{rng.randrange(500):03d}"
+        else:
+            headword = _cased(rng, _headword(lesson_id * ITEMS_PER_LESSON + rng.randrange(ITEMS_PER_LESSON)))
+        is_correct, response_ms = _outcome(rng, 0.1 + (lesson_id % 5) * 0.08)
+        yield (
+            str(rng.randrange(users)),
+            str(SYNONYM_COURSE_IDS[lesson_id % len(SYNONYM_COURSE_IDS)]),
+            str(lesson_id),
+            headword,
+            is_correct,
+            response_ms,
+            _attempt_ts(rng, end),
+        )
+
+
+def _spelling_rows(rng, rows, users, end):
+    for _ in range(rows):
+        lesson_id = rng.randrange(LESSONS)
+        headword = _headword(lesson_id * ITEMS_PER_LESSON + rng.randrange(ITEMS_PER_LESSON))
+        is_correct, response_ms = _outcome(rng, 0.15 + (lesson_id % 7) * 0.05)
+        yield (
+            str(rng.randrange(users)),
+            str(lesson_id),
+            headword,
+            is_correct,
+            response_ms,
+            _attempt_ts(rng, end),
+        )
+
+
+def _math_rows(rng, rows, users, end):
+    for _ in range(rows):
+        lesson_id = rng.randrange(LESSONS)
+        question_id = lesson_id * ITEMS_PER_LESSON + rng.randrange(ITEMS_PER_LESSON)
+        is_correct, response_ms = _outcome(rng, 0.2 + (question_id % 9) * 0.04)
+        yield (
+            str(rng.randrange(users)),
+            str(lesson_id),
+            str(question_id),
+            is_correct,
+            response_ms,
+            _attempt_ts(rng, end),
+        )
+
+
+def _copy(cur, table: str, columns, rows) -> int:
+    """
+    COPY pre-formatted text tuples in pages of LOAD_PAGE_ROWS.
+    """
+    copied = 0
+    page = io.StringIO()
+    in_page = 0
+
+    for row in rows:
+        page.write("\t".join(row))
+        page.write("\n")
+        in_page += 1
+        if in_page == LOAD_PAGE_ROWS:
+            page.seek(0)
+            cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", page)
+            copied += in_page
+            page = io.StringIO()
+            in_page = 0
+
+    if in_page:
+        page.seek(0)
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", page)
+        copied += in_page
+
+    return copied
+
+
+def create_schema(conn):
+    """
+    Apply the fixture schema plus the service's own one-time SQL.
+    """
+    with conn.cursor() as cur:
+        cur.execute(SCHEMA_SQL.read_text())
+        for name in SERVICE_SQL:
+            cur.execute((SQL_DIR / name).read_text())
+    conn.commit()
+
+
+def load_synthetic(conn, rows: int, seed: int = 1234, end: datetime = None) -> dict:
+    """
+    Truncate and reload every source and *_ai_* fixture table with a
+    deterministic data set of `rows` attempts per source table.
+    Attempts end an hour before `end` so the drain lag never holds any back.
+    Returns {table: {"rows": n, "seconds": s}}.
+    """
+    end = (end or datetime.now(timezone.utc)) - timedelta(hours=1)
+    users = _users_for(rows)
+    loaded = {}
+
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            TRUNCATE public.words, public.attempts, public.spelling_attempts,
+                     public.math_attempts, public.synonym_ai_word_insights,
+                     public.synonym_ai_lesson_insights, public.spelling_ai_word_insights,
+                     public.math_ai_question_insights, public.synonym_ai_word_daily,
+                     public.spelling_ai_word_daily, public.math_ai_question_daily,
+                     public.spelling_ai_lesson_insights, public.math_ai_lesson_insights,
+                     public.platform_ai_backfill_ranges,
+                     public.platform_ai_job_runs, public.platform_ai_job_checkpoints,
+                     public.synonym_ai_summary_cache, public.synonym_ai_summary_batches,
+                     public.synonym_ai_summary_batch_lessons
+            RESTART IDENTITY
+            """
+        )
+        for name in POST_LOAD_INDEXES:
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+
+        sources = (
+            ("public.words", ("word_id", "headword"),
+             ((str(w), _headword(w)) for w in range(WORDS))),
+            ("public.attempts",
+             ("user_id", "course_id", "lesson_id", "headword", "is_correct", "response_ms", "ts"),
+             _synonym_rows(random.Random(f"{seed}:synonym"), rows, users, end)),
+            ("public.spelling_attempts",
+             ("user_id", "lesson_id", "word", "is_correct", "response_ms", "ts"),
+             _spelling_rows(random.Random(f"{seed}:spelling"), rows, users, end)),
+            ("public.math_attempts",
+             ("user_id", "lesson_id", "question_id", "is_correct", "response_ms", "ts"),
+             _math_rows(random.Random(f"{seed}:math"), rows, users, end)),
+        )
+
+        for table, columns, generated in sources:
+            started = time.perf_counter()
+            copied = _copy(cur, table, columns, generated)
+            loaded[table] = {"rows": copied, "seconds": round(time.perf_counter() - started, 3)}
+            print(f"Loaded {copied} rows into {table} in {loaded[table]['seconds']:.1f}s")
+
+        for name, target in POST_LOAD_INDEXES.items():
+            cur.execute(f"CREATE INDEX {name} ON {target}")
+        cur.execute("ANALYZE")
+
+    conn.commit()
+    return loaded
@@ -1 +1,86 @@
+import os
 
+# Keyset drain: attempts per chunk, lag window for late-arriving rows,
+# and an optional cap on chunks per invocation (0 = drain until caught up).
+DRAIN_CHUNK_SIZE = int(os.getenv("AI_DRAIN_CHUNK_SIZE", "50000"))
+DRAIN_LAG_SECONDS = int(os.getenv("AI_DRAIN_LAG_SECONDS", "120"))
+DRAIN_MAX_CHUNKS = int(os.getenv("AI_DRAIN_MAX_CHUNKS", "0"))
+
+# Bulk writes: "copy" streams rows with COPY into a temp staging table,
+# "values" stages them with multi-row INSERT ... VALUES pages.
+BULK_WRITE_METHOD = os.getenv("AI_BULK_WRITE_METHOD", "copy")
+BULK_PAGE_SIZE = int(os.getenv("AI_BULK_PAGE_SIZE", "5000"))
+
+# Lane runner: how many lanes run at once, on threads or processes.
+LANE_WORKERS = int(os.getenv("AI_LANE_WORKERS", "3"))
+LANE_EXECUTOR = os.getenv("AI_LANE_EXECUTOR", "thread")
+# Hash-partition each lane's learners into this many shards; every worker
+# (thread, process or host) claims free shards with advisory locks.
+LANE_SHARDS = int(os.getenv("AI_LANE_SHARDS", "1"))
+
+# Historical backfill: user_id ranges planned per lane, worker threads
+# rebuilding ranges at once (each pins one pooled connection), and aggregate
+# rows merged / item keys rescored per step while a range streams.
+BACKFILL_RANGES = int(os.getenv("AI_BACKFILL_RANGES", "64"))
+BACKFILL_WORKERS = int(os.getenv("AI_BACKFILL_WORKERS", "4"))
+BACKFILL_PAGE_ROWS = int(os.getenv("AI_BACKFILL_PAGE_ROWS", "20000"))
+
+# LLM lesson summaries: concurrent requests, per-minute request/token
+# budgets, attempts per lesson (429/5xx are retried) and a per-run deadline.
+SUMMARY_CONCURRENCY = int(os.getenv("AI_SUMMARY_CONCURRENCY", "4"))
+SUMMARY_REQUESTS_PER_MINUTE = int(os.getenv("AI_SUMMARY_RPM", "60"))
+SUMMARY_TOKENS_PER_MINUTE = int(os.getenv("AI_SUMMARY_TPM", "60000"))
+SUMMARY_MAX_ATTEMPTS = int(os.getenv("AI_SUMMARY_MAX_ATTEMPTS", "5"))
+SUMMARY_DEADLINE_SECONDS = float(os.getenv("AI_SUMMARY_DEADLINE_SECONDS", "300"))
+# Lessons packed into one completion (JSON reply keyed by user and lesson);
+# 1 sends one request per lesson.
+SUMMARY_BATCH_SIZE = int(os.getenv("AI_SUMMARY_BATCH_SIZE", "1"))
+# Completed summaries are written back in batches of this many lessons.
+SUMMARY_WRITE_BATCH_SIZE = int(os.getenv("AI_SUMMARY_WRITE_BATCH_SIZE", "200"))
+
+# Summary mode: "sync" generates summaries inside the lane; "batch" submits
+# them to the OpenAI-compatible Batch API and applies finished batches on a
+# later run. Batch input files are kept in AI_SUMMARY_BATCH_DIR when set.
+SUMMARY_MODE = os.getenv("AI_SUMMARY_MODE", "sync").lower()
+SUMMARY_BATCH_DIR = os.getenv("AI_SUMMARY_BATCH_DIR", "")
+SUMMARY_BATCH_MAX_REQUESTS = int(os.getenv("AI_SUMMARY_BATCH_MAX_REQUESTS", "50000"))
+SUMMARY_BATCH_COMPLETION_WINDOW = os.getenv("AI_SUMMARY_BATCH_COMPLETION_WINDOW", "24h")
+
+# Content-addressed summary cache (synonym_ai_summary_cache).
+SUMMARY_CACHE_ENABLED = os.getenv("AI_SUMMARY_CACHE", "true").lower() == "true"
+SUMMARY_CACHE_TTL_SECONDS = int(os.getenv("AI_SUMMARY_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("AI_SUMMARY_CACHE_MAX_ENTRIES", "200000"))
+
+# Lane pipeline: chunks buffered between fetch and write stages
+# (0 = run the stages one after another on the lane thread).
+PIPELINE_QUEUE_SIZE = int(os.getenv("AI_PIPELINE_QUEUE_SIZE", "2"))
+
+# Weakness scoring model. "phase1-v1" is the SQL formula; any other model
+# in ai_manager.scoring.engine.MODELS rescoring touched items with NumPy.
+SCORING_MODEL_VERSION = os.getenv("AI_SCORING_MODEL", "phase1-v1")
+SCORING_HALF_LIFE_DAYS = float(os.getenv("AI_SCORING_HALF_LIFE_DAYS", "14"))
+
+# Run metrics: also write a Prometheus textfile per lane into this
+# directory (node_exporter textfile collector). Empty = off.
+METRICS_TEXTFILE_DIR = os.getenv("AI_METRICS_TEXTFILE_DIR", "")
+
+# Resident scheduler (python -m ai_manager.scheduler): each lane runs at least
+# every interval, and earlier when the max(ts) probe or a NOTIFY on the
+# channel shows attempts past its checkpoint, but never more often than the
+# minimum gap. Probe 0 = off; empty channel = no LISTEN.
+SCHEDULER_INTERVAL_SECONDS = float(os.getenv("AI_SCHEDULER_INTERVAL_SECONDS", "900"))
+SCHEDULER_LANE_INTERVALS = {
+    lane: float(os.getenv(f"AI_SCHEDULER_{lane.upper()}_INTERVAL_SECONDS", str(SCHEDULER_INTERVAL_SECONDS)))
+    for lane in ("synonym", "spelling", "math")
+}
+SCHEDULER_MIN_GAP_SECONDS = float(os.getenv("AI_SCHEDULER_MIN_GAP_SECONDS", "60"))
+SCHEDULER_PROBE_SECONDS = float(os.getenv("AI_SCHEDULER_PROBE_SECONDS", "30"))
+SCHEDULER_NOTIFY_CHANNEL = os.getenv("AI_SCHEDULER_NOTIFY_CHANNEL", "")
+
+# Query-plan profiling: EXPLAIN (ANALYZE, BUFFERS) every repo statement
+# before running it, and keep plans/timings in the run's metrics (plus a
+# JSON report per run when a directory is set). Dry run: roll back every
+# commit, so nothing is written to *_ai_* tables.
+PROFILE_PLANS = os.getenv("AI_PROFILE_PLANS", "false").lower() == "true"
+PROFILE_DIR = os.getenv("AI_PROFILE_DIR", "")
+DRY_RUN = os.getenv("AI_DRY_RUN", "false").lower() == "true"
@@ -1,6 +1,12 @@
 import os
+import threading
+import time
 import psycopg2
 from contextlib import contextmanager
+from psycopg2 import extensions, pool
+
+from ai_manager.config import DRY_RUN
+from ai_manager.logging.metrics import count_round_trip, current_plans, record_stage
 
 try:
     from dotenv import load_dotenv
@@ -9,15 +15,251 @@ except Exception:
     # dotenv is optional in prod (env vars may already be set)
     pass
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Wait this long for a free connection before giving up.
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+# Connections idle for longer than this are pinged (SELECT 1) on checkout.
+DB_POOL_HEALTHCHECK_IDLE_SECONDS = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE_SECONDS", "30"))
+
+
+class CountingCursor(extensions.cursor):
+    """
+    Counts every statement sent towards the run's DB round-trips, and
+    profiles it first when the run is profiling query plans.
+    """
+
+    def execute(self, query, vars=None):
+        count_round_trip()
+        plans = current_plans()
+        if plans is not None:
+            plans.explain(self, query, vars)
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        count_round_trip()
+        return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        count_round_trip()
+        return super().copy_expert(sql, file, size)
+
+    def fetchmany(self, size=None):
+        if self.name is not None:
+            # Each batch of a named (server-side) cursor is its own FETCH
+            count_round_trip()
+        return super().fetchmany(size)
+
+
+class PooledConnection(extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_used = time.monotonic()
+        self.cursor_factory = CountingCursor
+        self.defer_commits = False
+
+    def commit(self):
+        # Inside transaction() the block's final commit is the only one.
+        if self.defer_commits:
+            return
+        if _dry_run:
+            super().rollback()
+            return
+        super().commit()
+
+
+# Dry run: commits on pooled connections roll back instead, so a run reads,
+# computes (and profiles) as usual but leaves the database untouched.
+_dry_run = DRY_RUN
+
+_pool = None
+_pool_pid = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+
+def _get_pool():
+    """
+    Process-wide pool, created lazily on first use (so importing the lanes
+    does not require DATABASE_URL). A forked child (process lane runner)
+    builds its own pool and never touches the parent's sockets.
+    """
+    global _pool, _pool_pid, _pool_slots
+
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                database_url = os.getenv("DATABASE_URL")
+                if not database_url:
+                    raise RuntimeError("DATABASE_URL is not set")
+
+                _pool = pool.ThreadedConnectionPool(
+                    DB_POOL_MIN,
+                    DB_POOL_MAX,
+                    database_url,
+                    connection_factory=PooledConnection,
+                )
+                _pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+                _pool_pid = pid
+
+    return _pool, _pool_slots
+
+
+def _is_healthy(conn) -> bool:
+    if conn.closed:
+        return False
+
+    if time.monotonic() - conn.last_used < DB_POOL_HEALTHCHECK_IDLE_SECONDS:
+        return True
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _checkout():
+    started = time.perf_counter()
+    conn_pool, slots = _get_pool()
+    if not slots.acquire(timeout=DB_POOL_TIMEOUT_SECONDS):
+        raise RuntimeError("Timed out waiting for a pooled database connection")
+
+    try:
+        conn = conn_pool.getconn()
+        if not _is_healthy(conn):
+            conn_pool.putconn(conn, close=True)
+            conn = conn_pool.getconn()
+    except Exception:
+        slots.release()
+        raise
+
+    record_stage("db_checkout", time.perf_counter() - started)
+    return conn, conn_pool, slots
+
+
+def _checkin(conn, conn_pool, slots):
+    broken = bool(conn.closed)
+
+    if not broken and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        # Discard whatever the borrower left uncommitted.
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+
+    conn.last_used = time.monotonic()
+    try:
+        conn_pool.putconn(conn, close=broken)
+    finally:
+        slots.release()
 
-if not DATABASE_URL:
-    raise RuntimeError("DATABASE_URL is not set")
 
 @contextmanager
 def get_connection():
-    conn = psycopg2.connect(DATABASE_URL)
+    """
+    Check a connection out of the pool for the duration of the block.
+    Inside borrowed_connection() the thread's pinned connection is reused.
+    """
+    borrowed = getattr(_local, "conn", None)
+    if borrowed is not None:
+        try:
+            yield borrowed
+        except Exception:
+            if not borrowed.closed:
+                borrowed.rollback()
+            raise
+        return
+
+    conn, conn_pool, slots = _checkout()
+    try:
+        yield conn
+    finally:
+        _checkin(conn, conn_pool, slots)
+
+
+@contextmanager
+def borrowed_connection():
+    """
+    Pin one pooled connection to the current thread so a lane's whole
+    read-upsert-checkpoint sequence runs on it. Usable as a decorator.
+    """
+    if getattr(_local, "conn", None) is not None:
+        yield _local.conn
+        return
+
+    conn, conn_pool, slots = _checkout()
+    _local.conn = conn
     try:
         yield conn
     finally:
-        conn.close()
+        _local.conn = None
+        _checkin(conn, conn_pool, slots)
+
+
+@contextmanager
+def transaction():
+    """
+    Run the block as one transaction on the thread's pinned connection.
+    Commits issued by repo functions inside it are deferred to the end of
+    the block; an exception rolls the whole block back. Nests as a no-op.
+    """
+    with borrowed_connection() as conn:
+        if conn.defer_commits:
+            yield conn
+            return
+
+        conn.defer_commits = True
+        try:
+            yield conn
+        except BaseException:
+            conn.defer_commits = False
+            if not conn.closed:
+                conn.rollback()
+            raise
+
+        conn.defer_commits = False
+        conn.commit()
+
+
+def set_dry_run(enabled: bool = True):
+    global _dry_run
+    _dry_run = enabled
+
+
+def dry_run() -> bool:
+    return _dry_run
+
+
+def open_listener(channel: str):
+    """
+    Dedicated autocommit connection LISTENing on `channel`, outside the pool
+    (it idles between notifications). Wait on it with select(), then poll().
+    """
+    database_url = os.getenv("DATABASE_URL")
+    if not database_url:
+        raise RuntimeError("DATABASE_URL is not set")
+
+    conn = psycopg2.connect(database_url)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"LISTEN {extensions.quote_ident(channel, conn)}")
+    return conn
+
+
+def close_pool():
+    """
+    Close every pooled connection owned by this process.
+    """
+    global _pool, _pool_pid, _pool_slots
+
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+        _pool_pid = None
+        _pool_slots = None
@@ -0,0 +1,495 @@
+import argparse
+import itertools
+import sys
+import traceback
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
+from operator import attrgetter
+from typing import Callable, NamedTuple, Optional
+
+from ai_manager.config import (
+    BACKFILL_PAGE_ROWS,
+    BACKFILL_RANGES,
+    BACKFILL_WORKERS,
+    LANE_SHARDS,
+    SCORING_MODEL_VERSION,
+)
+from ai_manager.db import borrowed_connection, close_pool, transaction
+from ai_manager.jobs.math_job import JOB_NAME as MATH_JOB_NAME
+from ai_manager.jobs.sharding import claimed_shard, shard_job_name
+from ai_manager.jobs.spelling_job import JOB_NAME as SPELLING_JOB_NAME
+from ai_manager.jobs.synonym_job import JOB_NAME as SYNONYM_JOB_NAME
+from ai_manager.logging.job_runs import finish_job, start_job
+from ai_manager.repo.backfill_repo import (
+    finish_backfill_range,
+    get_backfill_range,
+    get_backfill_ranges,
+    plan_backfill_ranges,
+)
+from ai_manager.repo.math_repo import (
+    delete_math_question_state,
+    get_math_active_users,
+    get_math_lesson_rollups,
+    get_math_question_aggregates,
+    get_math_response_baselines,
+    get_math_user_range_bounds,
+    iter_math_question_attempts,
+    update_math_question_scores,
+    upsert_math_lesson_insights,
+    upsert_math_question_insights,
+)
+from ai_manager.repo.spelling_repo import (
+    delete_spelling_word_state,
+    get_spelling_active_users,
+    get_spelling_lesson_rollups,
+    get_spelling_response_baselines,
+    get_spelling_user_range_bounds,
+    get_spelling_word_aggregates,
+    iter_spelling_word_attempts,
+    update_spelling_word_scores,
+    upsert_spelling_lesson_insights,
+    upsert_spelling_word_insights,
+)
+from ai_manager.repo.synonym_repo import (
+    delete_synonym_word_state,
+    get_synonym_active_users,
+    get_synonym_lesson_rollups,
+    get_synonym_response_baselines,
+    get_synonym_user_range_bounds,
+    get_synonym_word_aggregates,
+    iter_synonym_word_attempts,
+    update_synonym_word_scores,
+    upsert_synonym_lesson_insights,
+    upsert_synonym_word_insights,
+)
+from ai_manager.repo.word_resolver import resolve_word_ids
+from ai_manager.scoring.stage import SQL_MODEL_VERSION, rescore_items
+from ai_manager.state.checkpoints import get_checkpoints, lock_checkpoints
+
+# Lowest / highest user_id, so a lane's ranges cover every learner.
+MIN_USER_ID = -(2**63 - 1)
+MAX_USER_ID = 2**63 - 1
+
+
+class BackfillLane(NamedTuple):
+    job_name: str
+    range_bounds: Callable
+    active_users: Callable
+    aggregates: Callable
+    delete_state: Callable
+    upsert_items: Callable
+    rescore_key: Callable
+    iter_attempts: Callable
+    update_scores: Callable
+    response_baselines: Callable
+    lesson_rollups: Callable
+    upsert_lessons: Callable
+    # synonym only: streamed key -> stored key, and headword resolution
+    stored_key: Optional[Callable] = None
+    resolve: Optional[Callable] = None
+
+
+def _resolve_headwords(rows) -> list:
+    # Rows without a match are dropped, as in the live lane; _rebuild counts them.
+    return resolve_word_ids(rows)[0]
+
+
+def synonym_backfill(job_run_id=None) -> BackfillLane:
+    return BackfillLane(
+        job_name=SYNONYM_JOB_NAME,
+        range_bounds=get_synonym_user_range_bounds,
+        active_users=get_synonym_active_users,
+        aggregates=get_synonym_word_aggregates,
+        delete_state=delete_synonym_word_state,
+        upsert_items=partial(upsert_synonym_word_insights, job_run_id=job_run_id),
+        rescore_key=attrgetter("user_id", "lesson_id", "headword_key"),
+        iter_attempts=iter_synonym_word_attempts,
+        update_scores=update_synonym_word_scores,
+        response_baselines=get_synonym_response_baselines,
+        lesson_rollups=get_synonym_lesson_rollups,
+        upsert_lessons=partial(upsert_synonym_lesson_insights, job_run_id=job_run_id),
+        stored_key=attrgetter("user_id", "lesson_id", "word_id"),
+        resolve=_resolve_headwords,
+    )
+
+
+def spelling_backfill(job_run_id=None) -> BackfillLane:
+    return BackfillLane(
+        job_name=SPELLING_JOB_NAME,
+        range_bounds=get_spelling_user_range_bounds,
+        active_users=get_spelling_active_users,
+        aggregates=get_spelling_word_aggregates,
+        delete_state=delete_spelling_word_state,
+        upsert_items=upsert_spelling_word_insights,
+        rescore_key=attrgetter("user_id", "lesson_id", "headword"),
+        iter_attempts=iter_spelling_word_attempts,
+        update_scores=update_spelling_word_scores,
+        response_baselines=get_spelling_response_baselines,
+        lesson_rollups=get_spelling_lesson_rollups,
+        upsert_lessons=upsert_spelling_lesson_insights,
+    )
+
+
+def math_backfill(job_run_id=None) -> BackfillLane:
+    return BackfillLane(
+        job_name=MATH_JOB_NAME,
+        range_bounds=get_math_user_range_bounds,
+        active_users=get_math_active_users,
+        aggregates=get_math_question_aggregates,
+        delete_state=delete_math_question_state,
+        upsert_items=upsert_math_question_insights,
+        rescore_key=attrgetter("user_id", "lesson_id", "question_id"),
+        iter_attempts=iter_math_question_attempts,
+        update_scores=update_math_question_scores,
+        response_baselines=get_math_response_baselines,
+        lesson_rollups=get_math_lesson_rollups,
+        upsert_lessons=upsert_math_lesson_insights,
+    )
+
+
+LANES = {
+    "synonym": synonym_backfill,
+    "spelling": spelling_backfill,
+    "math": math_backfill,
+}
+
+
+def user_ranges(bounds) -> list:
+    """
+    Inclusive (user_from, user_to) ranges from ascending upper bounds; the
+    first and last ranges are open-ended, so learners added later are covered.
+    """
+    ranges = []
+    user_from = MIN_USER_ID
+    for bound in bounds:
+        ranges.append((user_from, bound))
+        user_from = bound + 1
+    ranges.append((user_from, MAX_USER_ID))
+    return ranges
+
+
+def layout_shards(shards: int) -> list:
+    return [None] if shards <= 1 else [(index, shards) for index in range(shards)]
+
+
+def _batched(items, size: int):
+    items = iter(items)
+    return iter(lambda: list(itertools.islice(items, size)), [])
+
+
+def _active_users(lane: BackfillLane, shards, after: dict, users) -> set:
+    """
+    Learners of the range with attempts past each shard's checkpoint in
+    `after` ({checkpoint_name: key}).
+    """
+    active = set()
+    for shard in shards:
+        active.update(lane.active_users(after[shard_job_name(lane.job_name, shard)], users, shard=shard))
+    return active
+
+
+def _rebuild(lane: BackfillLane, shards, until: dict, users, model_version: str, **learners) -> tuple:
+    """
+    Replace the item and lesson rows of the range's learners (narrowed by
+    user_ids / skip_user_ids) with their attempts up to the checkpoints in
+    `until`. Aggregates are streamed and merged BACKFILL_PAGE_ROWS at a time
+    and items rescored in batches as large, so memory is bounded by the
+    page and the range's item keys, not by its attempts.
+    Returns (attempts per learner, unresolved rows dropped per learner,
+    lesson keys, rows written).
+    """
+    attempts = Counter()
+    unresolved = Counter()
+    items = {}
+    written = 0
+
+    lane.delete_state(users, **learners)
+    for shard in shards:
+        until_key = until[shard_job_name(lane.job_name, shard)]
+        stream = lane.aggregates(None, until_key, shard=shard, users=users, stream=True, **learners)
+        for page in _batched(stream, BACKFILL_PAGE_ROWS):
+            for r in page:
+                attempts[r.user_id] += r.attempts_total
+            if lane.resolve:
+                resolved = lane.resolve(page)
+                if len(resolved) < len(page):
+                    unresolved.update(Counter(r.user_id for r in page) - Counter(r.user_id for r in resolved))
+                page = resolved
+            written += lane.upsert_items(page, model_version=model_version)
+            items.update((lane.rescore_key(r), lane.stored_key(r) if lane.stored_key else None) for r in page)
+
+    if model_version != SQL_MODEL_VERSION:
+        for keys in _batched(items, BACKFILL_PAGE_ROWS):
+            rescore_items(
+                keys,
+                lane.iter_attempts,
+                lane.update_scores,
+                model_version,
+                key_map={key: items[key] for key in keys} if lane.stored_key else None,
+                user_baselines=lane.response_baselines,
+            )
+
+    lesson_keys = {(user_id, lesson_id) for user_id, lesson_id, *_ in items}
+    written += lane.upsert_lessons(lane.lesson_rollups(lesson_keys), model_version=model_version)
+    return attempts, unresolved, lesson_keys, written
+
+
+def backfill_range(lane: BackfillLane, shards, users, model_version: str) -> dict:
+    """
+    Rebuild the item and lesson insight rows of one inclusive user_id range
+    from every attempt the live lane has merged, i.e. up to its checkpoints.
+
+    The range is rebuilt up to a snapshot of the checkpoints without
+    locking them, leaving out learners with attempts past the snapshot:
+    only those can be written by live chunks meanwhile. A short transaction
+    then locks the checkpoint rows (live chunks of the lane wait) and
+    rebuilds, up to the locked checkpoints, just the learners with attempts
+    past the snapshot. Either way each learner ends up with exactly the
+    lane's merged history, and no checkpoint moves.
+    """
+    names = [shard_job_name(lane.job_name, shard) for shard in shards]
+
+    with transaction():
+        snapshot = get_checkpoints(names)
+        active = _active_users(lane, shards, snapshot, users)
+        attempts, unresolved, lesson_keys, written = _rebuild(
+            lane, shards, snapshot, users, model_version, skip_user_ids=active
+        )
+
+    with transaction():
+        current = lock_checkpoints(names)
+        active |= _active_users(lane, shards, snapshot, users)
+        if active:
+            caught_up, caught_up_unresolved, active_lessons, active_written = _rebuild(
+                lane, shards, current, users, model_version, user_ids=active
+            )
+            for user_id in active:
+                attempts.pop(user_id, None)
+                unresolved.pop(user_id, None)
+            attempts.update(caught_up)
+            unresolved.update(caught_up_unresolved)
+            lesson_keys |= active_lessons
+            written += active_written
+
+    return {
+        "attempts": sum(attempts.values()),
+        "users": len(attempts),
+        "lessons": len(lesson_keys),
+        "rows_written": written,
+        "unresolved_rows": sum(unresolved.values()),
+    }
+
+
+@borrowed_connection()
+def run_range(
+    backfill_name: str,
+    lane_name: str,
+    lane: BackfillLane,
+    shards,
+    planned: dict,
+    range_count: int,
+    model_version: str,
+    job_run_id=None,
+) -> Optional[dict]:
+    """
+    Claim one planned range (advisory lock, so concurrent backfill processes
+    share the work), rebuild it and mark it done in the ledger. Returns None
+    when another worker holds it or has finished it meanwhile.
+    """
+    index = planned["range_index"]
+    with claimed_shard(f"ai_backfill:{backfill_name}:{lane_name}", (index, range_count)) as claimed:
+        if not claimed:
+            return None
+        current = get_backfill_range(backfill_name, lane_name, index)
+        if current is None or current["finished_at"] is not None:
+            return None
+
+        stats = backfill_range(lane, shards, (planned["user_from"], planned["user_to"]), model_version)
+        finish_backfill_range(
+            backfill_name,
+            lane_name,
+            index,
+            attempts=stats["attempts"],
+            rows_written=stats["rows_written"],
+            job_run_id=job_run_id,
+        )
+        return stats
+
+
+def plan_lane(backfill_name: str, lane_name: str, lane: BackfillLane, model_version: str, ranges: int) -> list:
+    """
+    The lane's ledger ranges, planned on the first run of the backfill.
+    """
+    planned = get_backfill_ranges(backfill_name, lane_name)
+    if not planned:
+        bounds = lane.range_bounds(ranges)
+        planned = plan_backfill_ranges(backfill_name, lane_name, model_version, user_ranges(bounds))
+
+    versions = {r["model_version"] for r in planned}
+    if versions != {model_version}:
+        raise RuntimeError(
+            f"Backfill {backfill_name} ({lane_name}) was planned for {', '.join(sorted(versions))}, "
+            f"not {model_version}; use another --name"
+        )
+    return planned
+
+
+def run_backfill(
+    backfill_name: str,
+    lane_names=None,
+    model_version: str = SCORING_MODEL_VERSION,
+    ranges: int = BACKFILL_RANGES,
+    workers: int = BACKFILL_WORKERS,
+    shards: int = LANE_SHARDS,
+) -> int:
+    """
+    Rebuild every insight row of the given lanes under model_version, one
+    user_id range per task on a thread pool. Finished ranges are recorded in
+    platform_ai_backfill_ranges, so rerunning the same backfill_name resumes
+    with the pending ones. Live checkpoints are read, never written; a lane
+    must have run (with the same shard count) before it can be backfilled.
+    Returns 0 when every range finished, 1 otherwise.
+    """
+    lane_names = list(lane_names or LANES)
+    layout = layout_shards(shards)
+    runs = {}
+    tasks = []
+
+    for lane_name in lane_names:
+        lane = LANES[lane_name]()
+        job_name = lane.job_name
+        names = [shard_job_name(job_name, shard) for shard in layout]
+        checkpoints = [
+            name for name in get_checkpoints()
+            if name == job_name or name.startswith(f"{job_name}:")
+        ]
+        if not checkpoints:
+            print(f"Backfill {backfill_name}: {lane_name} has never run; nothing to rebuild")
+            continue
+        missing = sorted(set(names) - set(checkpoints))
+        if missing:
+            raise RuntimeError(
+                f"{lane_name} has no checkpoint for {', '.join(missing)}; "
+                "backfill with the shard count the lane runs with"
+            )
+
+        planned = plan_lane(backfill_name, lane_name, lane, model_version, ranges)
+        pending = [r for r in planned if r["finished_at"] is None]
+        print(
+            f"Backfill {backfill_name}: {lane_name} {len(pending)}/{len(planned)} ranges pending "
+            f"(model_version={model_version})"
+        )
+        if not pending:
+            continue
+
+        job_id, job_run_id = start_job(f"{job_name}:backfill:{backfill_name}")
+        runs[lane_name] = (job_id, job_run_id, LANES[lane_name](job_run_id), Counter())
+        tasks.extend((lane_name, r, len(planned)) for r in pending)
+
+    # Interleave lanes, so every worker is not on the same lane's locks.
+    tasks.sort(key=lambda task: (task[1]["range_index"], task[0]))
+    failed = Counter()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tasks) or 1))) as pool:
+        futures = {
+            pool.submit(
+                run_range,
+                backfill_name,
+                lane_name,
+                runs[lane_name][2],
+                layout,
+                planned,
+                range_count,
+                model_version,
+                runs[lane_name][1],
+            ): (lane_name, planned)
+            for lane_name, planned, range_count in tasks
+        }
+
+        for future in as_completed(futures):
+            lane_name, planned = futures[future]
+            label = f"{lane_name} range {planned['range_index']}"
+            try:
+                stats = future.result()
+            except Exception:
+                failed[lane_name] += 1
+                print(f"Backfill {backfill_name}: {label} FAILED", file=sys.stderr)
+                traceback.print_exc()
+                continue
+
+            totals = runs[lane_name][3]
+            if stats is None:
+                totals["skipped"] += 1
+                continue
+            totals["ranges"] += 1
+            totals.update({key: stats[key] for key in ("attempts", "users", "lessons", "rows_written", "unresolved_rows")})
+
+    for lane_name, (job_id, job_run_id, _, totals) in runs.items():
+        finish_job(
+            job_id,
+            status="FAILED" if failed[lane_name] else "SUCCESS",
+            error_message=f"{failed[lane_name]} ranges failed; rerun to resume" if failed[lane_name] else None,
+            processed_users=totals["users"],
+            processed_lessons=totals["lessons"],
+            processed_attempts=totals["attempts"],
+            model_version=model_version,
+        )
+        print(
+            f"Backfill {backfill_name}: {lane_name} "
+            f"{totals['ranges']} ranges rebuilt, "
+            f"{failed[lane_name]} failed, "
+            f"{totals['skipped']} held elsewhere; "
+            f"{totals['attempts']} attempts, "
+            f"{totals['rows_written']} rows written, "
+            f"{totals['unresolved_rows']} unresolved rows dropped "
+            f"(run_id={job_run_id})"
+        )
+
+    if failed:
+        print(f"Backfill {backfill_name} incomplete; rerun it to resume", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m ai_manager.jobs.backfill",
+        description="Rebuild every insight row under a scoring model version, resumably.",
+    )
+    parser.add_argument("lanes", nargs="*", help=f"Lanes to backfill: {', '.join(LANES)} (default: all)")
+    parser.add_argument("--name", help="ledger name; rerun with the same name to resume (default: the model version)")
+    parser.add_argument("--model-version", default=SCORING_MODEL_VERSION)
+    parser.add_argument("--ranges", type=int, default=BACKFILL_RANGES, help="user_id ranges per lane (first run only)")
+    parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS)
+    parser.add_argument("--shards", type=int, default=LANE_SHARDS, help="the shard count the lanes run with")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.lanes if name not in LANES]
+    if unknown:
+        parser.error(f"unknown lanes: {', '.join(unknown)}")
+
+    if args.model_version != SQL_MODEL_VERSION:
+        # NumPy is only needed once a non-SQL model is selected.
+        from ai_manager.scoring.engine import MODELS
+
+        if args.model_version not in MODELS:
+            parser.error(f"unknown model version: {args.model_version}")
+
+    try:
+        code = run_backfill(
+            args.name or args.model_version,
+            args.lanes,
+            model_version=args.model_version,
+            ranges=args.ranges,
+            workers=args.workers,
+            shards=args.shards,
+        )
+    finally:
+        close_pool()
+    sys.exit(code)
+
+
+if __name__ == "__main__":
+    main()
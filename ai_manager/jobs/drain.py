@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta, timezone
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from ai_manager.config import DRAIN_CHUNK_SIZE, DRAIN_LAG_SECONDS, DRAIN_MAX_CHUNKS
+from ai_manager.state.checkpoints import get_checkpoint_key
+
+
+class Chunk(NamedTuple):
+    after_key: Optional[Tuple]  # exclusive lower (ts, id); None = from the beginning
+    until_key: Tuple  # inclusive upper (ts, id)
+    attempts: int
+
+
+def iter_chunks(
+    job_name: str,
+    next_bound: Callable,
+    chunk_size: int = DRAIN_CHUNK_SIZE,
+    lag_seconds: int = DRAIN_LAG_SECONDS,
+    max_chunks: int = DRAIN_MAX_CHUNKS,
+):
+    """
+    Walk a lane's attempts in (ts, id) order from its checkpoint, one chunk at a time.
+    Rows newer than now - lag_seconds are left for a later run.
+    The caller writes update_checkpoint(job_name, *chunk.until_key) in the same
+    db.transaction() as the chunk's upserts, so a crash resumes at the last
+    finished chunk and no chunk is merged twice.
+    """
+    after_key = get_checkpoint_key(job_name)
+    if after_key[0] is None:
+        after_key = None
+
+    until_ts = datetime.now(timezone.utc) - timedelta(seconds=lag_seconds)
+    chunks = 0
+
+    while not max_chunks or chunks < max_chunks:
+        bound = next_bound(after_key, until_ts, chunk_size)
+        if bound is None:
+            return
+
+        ts, last_id, attempts = bound
+        yield Chunk(after_key, (ts, last_id), attempts)
+
+        after_key = (ts, last_id)
+        chunks += 1
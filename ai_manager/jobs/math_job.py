@@ -1,47 +1,135 @@
-from datetime import datetime, timezone
+from functools import partial
 
+from ai_manager.config import SCORING_MODEL_VERSION
+from ai_manager.db import borrowed_connection, transaction
+from ai_manager.jobs.drain import iter_chunks
+from ai_manager.jobs.pipeline import format_stage_timings, run_pipeline
+from ai_manager.jobs.sharding import shard_job_name, sharded
 from ai_manager.logging.job_runs import finish_job, start_job
+from ai_manager.logging.metrics import bind_metrics, current_metrics, write_textfile
+from ai_manager.logging.plans import write_plan_report
 from ai_manager.repo.math_repo import (
+    get_math_attempt_chunk_bound,
+    get_math_lesson_rollups,
     get_math_question_aggregates,
+    get_math_response_baselines,
+    iter_math_question_attempts,
+    update_math_question_scores,
+    upsert_math_lesson_insights,
     upsert_math_question_insights,
 )
-from ai_manager.state.checkpoints import get_checkpoint, update_checkpoint
+from ai_manager.scoring.stage import SQL_MODEL_VERSION, rescore_items
+from ai_manager.state.checkpoints import lock_checkpoints, update_checkpoint
 
 JOB_NAME = "math_ai_phase1"
 
 
-def run_math_lane():
-    job_id, job_run_id = start_job(JOB_NAME)
+@sharded(JOB_NAME)
+@bind_metrics()
+@borrowed_connection()
+def run_math_lane(shard=None):
+    metrics = current_metrics()
+    checkpoint_name = shard_job_name(JOB_NAME, shard)
+    job_id, job_run_id = start_job(checkpoint_name)
 
     try:
-        since_ts = get_checkpoint(JOB_NAME)
+        processed_attempts = 0
+        written_questions = 0
+        written_lessons = 0
+        rolled_up_lessons = 0
+        touched_users = set()
 
-        rows = get_math_question_aggregates(
-            limit=500,
-            since_ts=since_ts,
-        )
+        def fetch(chunk):
+            rows = get_math_question_aggregates(
+                after_key=chunk.after_key,
+                until_key=chunk.until_key,
+                shard=shard,
+            )
+            return chunk, rows
+
+        def write(item):
+            nonlocal processed_attempts, written_questions, written_lessons, rolled_up_lessons
+            chunk, rows = item
+
+            touched_lessons = {(r.user_id, r.lesson_id) for r in rows}
+            touched_users.update(user_id for user_id, _ in touched_lessons)
+
+            # Deltas, rescores, the touched lessons' rollups and the checkpoint
+            # commit together, so a crash never leaves a chunk merged without
+            # its checkpoint or its lessons (or vice versa).
+            with transaction():
+                lock_checkpoints([checkpoint_name])
+                written_questions += upsert_math_question_insights(
+                    rows,
+                    model_version=SCORING_MODEL_VERSION,
+                )
+
+                if SCORING_MODEL_VERSION != SQL_MODEL_VERSION:
+                    rescore_items(
+                        list(dict.fromkeys((r.user_id, r.lesson_id, r.question_id) for r in rows)),
+                        iter_math_question_attempts,
+                        update_math_question_scores,
+                        SCORING_MODEL_VERSION,
+                        user_baselines=get_math_response_baselines,
+                    )
 
-        written_questions = upsert_math_question_insights(
-            rows,
-            model_version="phase1-v1",
+                written_lessons += upsert_math_lesson_insights(
+                    get_math_lesson_rollups(touched_lessons),
+                    model_version=SCORING_MODEL_VERSION,
+                )
+
+                update_checkpoint(checkpoint_name, *chunk.until_key)
+            processed_attempts += chunk.attempts
+            rolled_up_lessons += len(touched_lessons)
+
+        timings = run_pipeline(
+            iter_chunks(checkpoint_name, partial(get_math_attempt_chunk_bound, shard=shard)),
+            stages=[("fetch", fetch)],
+            sink=("write", write),
         )
 
-        update_checkpoint(JOB_NAME, datetime.now(timezone.utc))
+        processed_users = len(touched_users)
+        snapshot = metrics.to_dict(
+            status="SUCCESS",
+            processed_attempts=processed_attempts,
+            processed_users=processed_users,
+            processed_lessons=rolled_up_lessons,
+            pipeline=timings,
+        )
         finish_job(
             job_id,
             status="SUCCESS",
-            processed_attempts=len(rows),
-            model_version="phase1-v1",
+            processed_users=processed_users,
+            processed_lessons=rolled_up_lessons,
+            processed_attempts=processed_attempts,
+            model_version=SCORING_MODEL_VERSION,
+            metrics=snapshot,
         )
+        write_textfile(checkpoint_name, snapshot)
+        write_plan_report(checkpoint_name, job_run_id, metrics.plans)
 
         print(
             "Math AI job complete: "
-            f"{written_questions} question rows written "
-            f"(run_id={job_run_id})"
+            f"{processed_attempts} attempts, "
+            f"{written_questions} question rows written, "
+            f"{written_lessons} lesson rows written, "
+            f"{snapshot['counters'].get('rows_skipped', 0)} unchanged rows skipped "
+            f"(run_id={job_run_id}); "
+            f"{format_stage_timings(timings)}"
         )
 
+        return {
+            "attempts": processed_attempts,
+            "rows_written": written_questions + written_lessons,
+            "stages": timings,
+            "metrics": snapshot,
+        }
+
     except Exception as e:
-        finish_job(job_id, status="FAILED", error_message=str(e))
+        snapshot = metrics.to_dict(status="FAILED")
+        finish_job(job_id, status="FAILED", error_message=str(e), metrics=snapshot)
+        write_textfile(checkpoint_name, snapshot)
+        write_plan_report(checkpoint_name, job_run_id, metrics.plans)
         raise
 
 
@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from ai_manager.config import PIPELINE_QUEUE_SIZE
+from ai_manager.db import borrowed_connection
+from ai_manager.logging.metrics import propagate
+
+Stage = Tuple[str, Callable]
+
+_DONE = object()
+_STOPPED = object()
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _STOPPED
+
+
+def _run_stage(fn, inbox, outbox, stop, timing, errors):
+    """
+    Worker thread body. The first stage pulls from the source iterable
+    (its iteration counts as busy time); later stages pull from a queue.
+    """
+    try:
+        with borrowed_connection() as conn:
+            source = None if isinstance(inbox, queue.Queue) else iter(inbox)
+
+            while not stop.is_set():
+                started = time.perf_counter()
+                waited = 0.0
+                if source is not None:
+                    item = next(source, _DONE)
+                else:
+                    item = _get(inbox, stop)
+                    waited = time.perf_counter() - started
+                    timing["idle"] += waited
+
+                if item is _DONE or item is _STOPPED:
+                    break
+
+                result = fn(item)
+                # Never wait on a queue inside a transaction: its locks could
+                # block the sink's writes (e.g. checkpoint DDL) indefinitely.
+                conn.commit()
+                timing["busy"] += time.perf_counter() - started - waited
+                timing["items"] += 1
+
+                started = time.perf_counter()
+                delivered = _put(outbox, result, stop)
+                timing["idle"] += time.perf_counter() - started
+                if not delivered:
+                    return
+
+            _put(outbox, _DONE, stop)
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+
+
+def run_pipeline(
+    source: Iterable,
+    stages: List[Stage],
+    sink: Stage,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+) -> Dict[str, Dict]:
+    """
+    Run source -> stages -> sink with each stage on its own thread and
+    bounded queues in between, so chunk N+1 is read while chunk N is written.
+    The sink runs on the calling thread (and its borrowed connection), in
+    source order. The first failure stops every stage and is re-raised.
+    Returns {stage name: {"busy": s, "idle": s, "items": n}}.
+    """
+    sink_name, sink_fn = sink
+    stats = {name: {"busy": 0.0, "idle": 0.0, "items": 0} for name, _ in [*stages, sink]}
+
+    if queue_size <= 0 or not stages:
+        for item in source:
+            for name, fn in [*stages, sink]:
+                started = time.perf_counter()
+                item = fn(item)
+                stats[name]["busy"] += time.perf_counter() - started
+                stats[name]["items"] += 1
+        return stats
+
+    stop = threading.Event()
+    errors = []
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    threads = []
+
+    for i, (name, fn) in enumerate(stages):
+        inbox = source if i == 0 else queues[i - 1]
+        thread = threading.Thread(
+            target=propagate(_run_stage),
+            args=(fn, inbox, queues[i], stop, stats[name], errors),
+            name=f"pipeline-{name}",
+            daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+
+    timing = stats[sink_name]
+    try:
+        while True:
+            started = time.perf_counter()
+            item = _get(queues[-1], stop)
+            timing["idle"] += time.perf_counter() - started
+            if item is _DONE or item is _STOPPED:
+                break
+
+            started = time.perf_counter()
+            sink_fn(item)
+            timing["busy"] += time.perf_counter() - started
+            timing["items"] += 1
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+
+    return stats
+
+
+def format_stage_timings(stats: Dict[str, Dict]) -> str:
+    return ", ".join(
+        f"{name} busy {t['busy']:.2f}s idle {t['idle']:.2f}s ({t['items']} chunks)"
+        for name, t in stats.items()
+    )
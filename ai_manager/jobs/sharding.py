@@ -0,0 +1,166 @@
+from contextlib import contextmanager
+from functools import wraps
+from typing import Optional, Tuple
+
+from ai_manager.db import borrowed_connection
+from ai_manager.state.checkpoints import get_checkpoints, update_checkpoint
+
+Shard = Optional[Tuple[int, int]]  # (index, count); None = the whole lane
+
+
+def shard_count(shard: Shard) -> int:
+    return shard[1] if shard and shard[1] > 1 else 1
+
+
+def shard_job_name(job_name: str, shard: Shard = None) -> str:
+    """
+    Checkpoint / run name of one shard: "<job>:<index>/<count>".
+    Unsharded runs keep the plain job name (and its existing checkpoint).
+    """
+    if shard_count(shard) == 1:
+        return job_name
+    index, count = shard
+    return f"{job_name}:{index}/{count}"
+
+
+def _layout_count(name: str, job_name: str) -> Optional[int]:
+    if name == job_name:
+        return 1
+    if name.startswith(f"{job_name}:") and "/" in name:
+        return int(name.rsplit("/", 1)[1])
+    return None
+
+
+def _position(key) -> tuple:
+    ts, last_id = key
+    return ts, -1 if last_id is None else last_id
+
+
+# Shard counts other than %(count)s whose layout lock on the job is held.
+OTHER_LAYOUTS_SQL = """
+    SELECT DISTINCT objid::bigint
+    FROM pg_locks
+    WHERE locktype = 'advisory'
+      AND database = (SELECT oid FROM pg_database WHERE datname = current_database())
+      AND classid = (hashtext(%(layout)s)::bigint & 4294967295)::oid
+      AND objsubid = 2
+      AND objid <> %(count)s::bigint::oid
+      AND granted
+    ORDER BY 1
+"""
+
+
+@contextmanager
+def claimed_shard(job_name: str, shard: Shard = None):
+    """
+    Try to take the (job_name, shard) advisory lock on the thread's pinned
+    connection; yields whether it was claimed. The lock is session-level, so
+    it covers the whole run (every chunk transaction) and is released at the
+    end of the block, or by the server if the worker dies.
+
+    A claimed shard also holds a shared layout lock keyed by (job_name,
+    shard count). It is taken before looking for another count's, so of two
+    workers with different counts at least one sees the other and raises:
+    shards of different layouts overlap in learners and would merge the
+    same attempts twice.
+    """
+    count = shard_count(shard)
+    index = shard[0] if count > 1 else 0
+    layout = f"{job_name}:layout"
+
+    with borrowed_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(hashtext(%s), %s)", (job_name, index))
+            claimed = cur.fetchone()[0]
+            others = []
+            if claimed:
+                cur.execute("SELECT pg_advisory_lock_shared(hashtext(%s), %s)", (layout, count))
+                cur.execute(OTHER_LAYOUTS_SQL, {"layout": layout, "count": count})
+                others = [row[0] for row in cur.fetchall()]
+        conn.commit()
+
+        def release():
+            if not conn.closed:
+                conn.rollback()
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_unlock_shared(hashtext(%s), %s)", (layout, count))
+                    cur.execute("SELECT pg_advisory_unlock(hashtext(%s), %s)", (job_name, index))
+                conn.commit()
+
+        if others:
+            release()
+            raise RuntimeError(
+                f"{shard_job_name(job_name, shard)} refused: {job_name} is running with "
+                f"{', '.join(map(str, others))} shard(s) elsewhere; all workers must use the same count"
+            )
+
+        try:
+            yield claimed
+        finally:
+            if claimed:
+                release()
+
+
+def prepare_shard_checkpoint(job_name: str, shard: Shard = None):
+    """
+    Refuse to run a shard layout that would re-merge attempts another layout
+    already merged, and seed a new layout's checkpoints from the previous one.
+
+    A shard without a checkpoint starts where the other layout stopped, but
+    only if that layout left every learner at the same position (e.g. moving
+    from unsharded to N shards). A shard whose checkpoint is behind another
+    layout's is refused, since its users' attempts after it were merged there.
+    """
+    count = shard_count(shard)
+    name = shard_job_name(job_name, shard)
+
+    checkpoints = {
+        key: position
+        for key, position in get_checkpoints().items()
+        if _layout_count(key, job_name) is not None and position[0] is not None
+    }
+    other = {key: position for key, position in checkpoints.items() if _layout_count(key, job_name) != count}
+    if not other:
+        return
+
+    own = checkpoints.get(name)
+    if own is not None:
+        ahead = sorted(key for key, position in other.items() if _position(position) > _position(own))
+        if ahead:
+            raise RuntimeError(
+                f"{name} is behind checkpoints of another shard layout ({', '.join(ahead)}); "
+                "running it would merge those attempts twice"
+            )
+        return
+
+    positions = set(other.values())
+    if len(positions) > 1:
+        raise RuntimeError(
+            f"Cannot start {name}: the previous layout's checkpoints "
+            f"({', '.join(sorted(other))}) are at different positions. "
+            "Finish with the previous shard count, or align it first."
+        )
+    update_checkpoint(name, *positions.pop())
+
+
+def sharded(job_name: str):
+    """
+    Decorate a run_*_lane(shard=None) entry point: claim the shard's lock and
+    check its checkpoint before running. Returns None without running when
+    another worker (process or host) already holds the shard.
+    """
+
+    def decorate(run_lane):
+        @wraps(run_lane)
+        def wrapper(shard: Shard = None):
+            with claimed_shard(job_name, shard) as claimed:
+                if not claimed:
+                    print(f"{shard_job_name(job_name, shard)} is held by another worker; skipping")
+                    return None
+
+                prepare_shard_checkpoint(job_name, shard)
+                return run_lane(shard=shard)
+
+        return wrapper
+
+    return decorate
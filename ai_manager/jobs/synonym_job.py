@@ -1,79 +1,298 @@
 import os
-from datetime import datetime, timezone
+import time
+from collections import Counter
+from functools import partial
 
-from ai_manager.llm.client import generate_summary
+from ai_manager.config import (
+    SCORING_MODEL_VERSION,
+    SUMMARY_CACHE_ENABLED,
+    SUMMARY_CACHE_MAX_ENTRIES,
+    SUMMARY_BATCH_SIZE,
+    SUMMARY_CACHE_TTL_SECONDS,
+    SUMMARY_DEADLINE_SECONDS,
+    SUMMARY_MODE,
+    SUMMARY_WRITE_BATCH_SIZE,
+)
+from ai_manager.db import borrowed_connection, dry_run, transaction
+from ai_manager.jobs.drain import iter_chunks
+from ai_manager.jobs.pipeline import format_stage_timings, run_pipeline
+from ai_manager.jobs.sharding import shard_job_name, sharded
+from ai_manager.llm.batch import collect_summary_batches, submit_summary_batches
+from ai_manager.llm.client import OPENAI_MODEL, summary_cache_key
 from ai_manager.llm.prompts import lesson_summary_prompt
+from ai_manager.llm.summariser import summarise_lessons
 from ai_manager.logging.job_runs import finish_job, start_job
+from ai_manager.logging.metrics import bind_metrics, current_metrics, write_textfile
+from ai_manager.logging.plans import write_plan_report
+from ai_manager.repo.summary_cache_repo import (
+    evict_summary_cache,
+    get_cached_summaries,
+    put_cached_summaries,
+)
 from ai_manager.repo.synonym_repo import (
+    LessonSummaryWriter,
+    get_synonym_attempt_chunk_bound,
     get_synonym_lesson_rollups,
+    get_synonym_response_baselines,
     get_synonym_word_aggregates,
-    update_synonym_lesson_summary,
+    iter_synonym_word_attempts,
+    update_synonym_word_scores,
     upsert_synonym_lesson_insights,
     upsert_synonym_word_insights,
 )
-from ai_manager.state.checkpoints import get_checkpoint, update_checkpoint
+from ai_manager.repo.word_resolver import resolve_word_ids
+from ai_manager.scoring.stage import SQL_MODEL_VERSION, rescore_items
+from ai_manager.state.checkpoints import lock_checkpoints, update_checkpoint
 
 JOB_NAME = "synonym_ai_phase1"
 ENABLE_LLM_SUMMARIES = os.getenv("ENABLE_LLM_SUMMARIES", "false").lower() == "true"
 
 
-def run_synonym_summaries(lesson_rows):
-    for row in lesson_rows:
-        prompt = lesson_summary_prompt(row)
-        summary = generate_summary(prompt)
+def run_synonym_summaries(lesson_rows, job_run_id=None, deadline_seconds=SUMMARY_DEADLINE_SECONDS):
+    model_version = f"{SCORING_MODEL_VERSION}+llm"
+    writer = LessonSummaryWriter(batch_size=SUMMARY_WRITE_BATCH_SIZE)
 
-        if summary:
-            update_synonym_lesson_summary(
-                user_id=row["user_id"],
-                lesson_id=row["lesson_id"],
-                summary_text=summary,
-                model_version="phase1-v1+llm",
-            )
+    def write_summary(row, summary):
+        writer.add(row["user_id"], row["lesson_id"], summary, model_version)
 
+    prompts = [(lesson_summary_prompt(row), row) for row in lesson_rows]
+    keyed_rows = [(summary_cache_key(prompt), row) for prompt, row in prompts]
+    # Items of multi-lesson replies are cached under their own keys; either
+    # kind serves a lesson, the single-lesson one first.
+    batch_keys = {}
+    if SUMMARY_BATCH_SIZE > 1:
+        batch_keys = {
+            key: summary_cache_key(prompt, batched=True)
+            for (key, _), (prompt, _) in zip(keyed_rows, prompts)
+        }
+    cached = {}
+    if SUMMARY_CACHE_ENABLED:
+        found = get_cached_summaries(
+            [key for key, _ in keyed_rows] + list(batch_keys.values()),
+            ttl_seconds=SUMMARY_CACHE_TTL_SECONDS,
+        )
+        for key, _ in keyed_rows:
+            summary = found.get(key) or found.get(batch_keys.get(key))
+            if summary:
+                cached[key] = summary
 
-def run_synonym_lane():
-    job_id, job_run_id = start_job(JOB_NAME)
+    for key, row in keyed_rows:
+        if key in cached:
+            write_summary(row, cached[key])
 
-    try:
-        since_ts = get_checkpoint(JOB_NAME)
+    # Lessons that render the same prompt share one request and its result.
+    misses = {}
+    for key, row in keyed_rows:
+        if key not in cached:
+            misses.setdefault(key, []).append(row)
+    missed_lessons = sum(len(rows) for rows in misses.values())
 
-        rows = get_synonym_word_aggregates(
-            limit=500,
-            since_ts=since_ts,
+    if SUMMARY_MODE == "batch":
+        # Cache misses go to the Batch API; a later run applies the results.
+        writer.flush()
+        batch_ids = submit_summary_batches(misses.items(), model_version, job_run_id=job_run_id)
+        stats = {"cache_hits": len(keyed_rows) - missed_lessons, "submitted": len(misses), "batches": batch_ids}
+        print(
+            "Synonym summaries: "
+            f"{stats['cache_hits']} cache hits, "
+            f"{missed_lessons} lessons submitted as {len(misses)} prompts in {len(batch_ids)} batch(es)"
         )
+        return stats
+
+    row_keys = {(rows[0]["user_id"], rows[0]["lesson_id"]): key for key, rows in misses.items()}
+    generated = []
+
+    def write_generated(row, summary, batched):
+        key = row_keys[(row["user_id"], row["lesson_id"])]
+        for shared in misses[key]:
+            write_summary(shared, summary)
+        generated.append({"cache_key": batch_keys[key] if batched else key, "summary_text": summary})
 
-        written_words = upsert_synonym_word_insights(
-            rows,
-            job_run_id=job_run_id,
-            model_version="phase1-v1",
+    stats = summarise_lessons(
+        [rows[0] for rows in misses.values()],
+        write_generated,
+        deadline_seconds=deadline_seconds,
+    )
+    writer.flush()
+    stats["cache_hits"] = len(keyed_rows) - missed_lessons
+    stats["cache_misses"] = missed_lessons
+    stats["unique_prompts"] = len(misses)
+
+    if SUMMARY_CACHE_ENABLED:
+        put_cached_summaries(generated, model=OPENAI_MODEL)
+        evict_summary_cache(
+            ttl_seconds=SUMMARY_CACHE_TTL_SECONDS,
+            max_entries=SUMMARY_CACHE_MAX_ENTRIES,
         )
 
-        lesson_rows = get_synonym_lesson_rollups(limit=500)
-        written_lessons = upsert_synonym_lesson_insights(
-            lesson_rows,
-            model_version="phase1-v1",
+    print(
+        "Synonym summaries: "
+        f"{stats['cache_hits']} cache hits, "
+        f"{stats['cache_misses']} misses ({stats['unique_prompts']} distinct prompts), "
+        f"{stats['succeeded']}/{stats['requested']} generated, "
+        f"{stats['batch_requests']} batch requests "
+        f"({stats['fallbacks']} lessons retried singly), "
+        f"{stats['throttled']} throttled, "
+        f"{stats['server_errors']} server errors, "
+        f"{stats['failed'] + stats['exhausted']} failed, "
+        f"{stats['deadline']} past deadline, "
+        f"{stats['tokens']} tokens"
+    )
+
+    return stats
+
+
+@sharded(JOB_NAME)
+@bind_metrics()
+@borrowed_connection()
+def run_synonym_lane(shard=None):
+    metrics = current_metrics()
+    checkpoint_name = shard_job_name(JOB_NAME, shard)
+    job_id, job_run_id = start_job(checkpoint_name)
+
+    try:
+        processed_attempts = 0
+        written_words = 0
+        written_lessons = 0
+        rolled_up_lessons = 0
+        touched_users = set()
+        unmatched_headwords = Counter()
+        unresolved_rows = 0
+
+        def fetch(chunk):
+            rows = get_synonym_word_aggregates(
+                after_key=chunk.after_key,
+                until_key=chunk.until_key,
+                shard=shard,
+            )
+            return chunk, rows
+
+        def resolve(item):
+            nonlocal unresolved_rows
+            chunk, rows = item
+            resolved, unmatched = resolve_word_ids(rows)
+            unresolved_rows += len(rows) - len(resolved)
+            unmatched_headwords.update(unmatched)
+            return chunk, resolved
+
+        summarise = ENABLE_LLM_SUMMARIES and not dry_run()
+        summary_deadline = time.monotonic() + SUMMARY_DEADLINE_SECONDS
+
+        def write(item):
+            nonlocal processed_attempts, written_words, written_lessons, rolled_up_lessons
+            chunk, rows = item
+
+            touched_lessons = {(r.user_id, r.lesson_id) for r in rows}
+            touched_users.update(user_id for user_id, _ in touched_lessons)
+
+            # Deltas, rescores, the touched lessons' rollups and the checkpoint
+            # commit together, so a crash never leaves a chunk merged without
+            # its checkpoint or its lessons (or vice versa).
+            with transaction():
+                lock_checkpoints([checkpoint_name])
+                written_words += upsert_synonym_word_insights(
+                    rows,
+                    job_run_id=job_run_id,
+                    model_version=SCORING_MODEL_VERSION,
+                )
+
+                if SCORING_MODEL_VERSION != SQL_MODEL_VERSION:
+                    word_keys = {
+                        (r.user_id, r.lesson_id, r.headword_key): (r.user_id, r.lesson_id, r.word_id)
+                        for r in rows
+                    }
+                    rescore_items(
+                        list(word_keys),
+                        iter_synonym_word_attempts,
+                        update_synonym_word_scores,
+                        SCORING_MODEL_VERSION,
+                        key_map=word_keys,
+                        user_baselines=get_synonym_response_baselines,
+                    )
+
+                lesson_rows = get_synonym_lesson_rollups(touched_lessons)
+                written_lessons += upsert_synonym_lesson_insights(
+                    lesson_rows,
+                    model_version=SCORING_MODEL_VERSION,
+                )
+
+                update_checkpoint(checkpoint_name, *chunk.until_key)
+            processed_attempts += chunk.attempts
+            rolled_up_lessons += len(touched_lessons)
+
+            # After the commit: summaries call the LLM and never hold the
+            # chunk's locks. The run's deadline is shared by every chunk.
+            if summarise:
+                run_synonym_summaries(
+                    lesson_rows,
+                    job_run_id=job_run_id,
+                    deadline_seconds=max(0.0, summary_deadline - time.monotonic()),
+                )
+
+        # A dry run writes nothing back, so it makes no paid LLM calls either.
+        if summarise and SUMMARY_MODE == "batch":
+            collect_summary_batches()
+
+        timings = run_pipeline(
+            iter_chunks(checkpoint_name, partial(get_synonym_attempt_chunk_bound, shard=shard)),
+            stages=[("fetch", fetch), ("resolve", resolve)],
+            sink=("write", write),
         )
 
-        if ENABLE_LLM_SUMMARIES:
-            run_synonym_summaries(lesson_rows)
+        if unmatched_headwords:
+            sample = ", ".join(h for h, _ in unmatched_headwords.most_common(10))
+            print(
+                "Synonym AI job: "
+                f"{unresolved_rows} word rows dropped: "
+                f"{sum(unmatched_headwords.values())} attempts over "
+                f"{len(unmatched_headwords)} headwords had no match in public.words "
+                f"(most frequent: {sample})"
+            )
 
-        update_checkpoint(JOB_NAME, datetime.now(timezone.utc))
+        processed_users = len(touched_users)
+        snapshot = metrics.to_dict(
+            status="SUCCESS",
+            processed_attempts=processed_attempts,
+            processed_users=processed_users,
+            processed_lessons=rolled_up_lessons,
+            pipeline=timings,
+        )
         finish_job(
             job_id,
             status="SUCCESS",
-            processed_attempts=len(rows),
-            model_version="phase1-v1",
+            processed_users=processed_users,
+            processed_lessons=rolled_up_lessons,
+            processed_attempts=processed_attempts,
+            model_version=SCORING_MODEL_VERSION,
+            metrics=snapshot,
         )
+        write_textfile(checkpoint_name, snapshot)
+        write_plan_report(checkpoint_name, job_run_id, metrics.plans)
 
         print(
             "Synonym AI job complete: "
+            f"{processed_attempts} attempts, "
             f"{written_words} word rows written, "
-            f"{written_lessons} lesson rows written "
-            f"(run_id={job_run_id})"
+            f"{written_lessons} lesson rows written, "
+            f"{snapshot['counters'].get('rows_skipped', 0)} unchanged rows skipped "
+            f"(run_id={job_run_id}); "
+            f"{format_stage_timings(timings)}"
         )
 
+        return {
+            "attempts": processed_attempts,
+            "rows_written": written_words + written_lessons,
+            "unmatched_headwords": len(unmatched_headwords),
+            "unresolved_rows": unresolved_rows,
+            "stages": timings,
+            "metrics": snapshot,
+        }
+
     except Exception as e:
-        finish_job(job_id, status="FAILED", error_message=str(e))
+        snapshot = metrics.to_dict(status="FAILED")
+        finish_job(job_id, status="FAILED", error_message=str(e), metrics=snapshot)
+        write_textfile(checkpoint_name, snapshot)
+        write_plan_report(checkpoint_name, job_run_id, metrics.plans)
         raise
 
 
@@ -0,0 +1,251 @@
+import json
+import os
+import sys
+import tempfile
+import uuid
+from collections import Counter
+
+import openai
+
+from ai_manager.config import (
+    SUMMARY_BATCH_COMPLETION_WINDOW,
+    SUMMARY_BATCH_DIR,
+    SUMMARY_BATCH_MAX_REQUESTS,
+    SUMMARY_WRITE_BATCH_SIZE,
+)
+from ai_manager.db import borrowed_connection, close_pool, transaction
+from ai_manager.llm.client import OPENAI_MODEL, get_client, summary_request_body
+from ai_manager.llm.prompts import lesson_summary_prompt
+from ai_manager.logging.metrics import add_counter
+from ai_manager.repo.summary_batch_repo import (
+    claim_summary_batch,
+    get_latest_summary_keys,
+    get_pending_summary_batches,
+    record_summary_batch,
+    record_summary_batch_lessons,
+    update_summary_batch,
+)
+from ai_manager.repo.summary_cache_repo import put_cached_summaries
+from ai_manager.repo.synonym_repo import LessonSummaryWriter
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+# Batch API states after which the batch will not change any more.
+FINISHED_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def _custom_id(row, cache_key: str) -> str:
+    # Everything needed to apply the result, so no per-lesson state is stored.
+    return f"{row['user_id']}:{row['lesson_id']}:{cache_key}"
+
+
+def write_batch_file(path: str, keyed_rows) -> int:
+    """
+    Write one Batch API request line per (cache_key, lesson_row), with the
+    same prompt and parameters as a direct summary request.
+    Returns the number of lines written.
+    """
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for cache_key, row in keyed_rows:
+            line = {
+                "custom_id": _custom_id(row, cache_key),
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": summary_request_body(lesson_summary_prompt(row)),
+            }
+            f.write(json.dumps(line, default=str) + "\n")
+            written += 1
+    return written
+
+
+def submit_summary_batches(keyed_groups, model_version: str, job_run_id=None, directory: str = SUMMARY_BATCH_DIR) -> list:
+    """
+    Submit (cache_key, lesson_rows) groups as Batch API jobs of at most
+    AI_SUMMARY_BATCH_MAX_REQUESTS requests each and record them in
+    synonym_ai_summary_batches. Each group is one request line (its lessons
+    share a prompt); the other lessons of the group are stored with the
+    batch and get the same summary. Every lesson's cache_key becomes its
+    latest submitted prompt, which supersedes lines of older batches.
+    Input files go to `directory` when set (kept), else to a temporary
+    directory. Returns the batch ids.
+    """
+    keyed_groups = [(cache_key, list(rows)) for cache_key, rows in keyed_groups]
+    client = get_client()
+    if not client or not keyed_groups:
+        return []
+
+    batch_ids = []
+    run_tag = job_run_id or uuid.uuid4().hex
+
+    with tempfile.TemporaryDirectory() as scratch:
+        target = directory or scratch
+        os.makedirs(target, exist_ok=True)
+
+        for part, start in enumerate(range(0, len(keyed_groups), SUMMARY_BATCH_MAX_REQUESTS)):
+            chunk = keyed_groups[start:start + SUMMARY_BATCH_MAX_REQUESTS]
+            path = os.path.join(target, f"synonym_summaries.{run_tag}.{part}.jsonl")
+            write_batch_file(path, [(cache_key, rows[0]) for cache_key, rows in chunk])
+            shared_lessons = {
+                cache_key: [[row["user_id"], row["lesson_id"]] for row in rows[1:]]
+                for cache_key, rows in chunk
+                if len(rows) > 1
+            }
+
+            with open(path, "rb") as f:
+                input_file = client.files.create(file=f, purpose="batch")
+            batch = client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=SUMMARY_BATCH_COMPLETION_WINDOW,
+                metadata={"job_run_id": str(job_run_id)},
+            )
+            with transaction():
+                record_summary_batch(
+                    batch.id,
+                    input_file.id,
+                    model=OPENAI_MODEL,
+                    model_version=model_version,
+                    lesson_count=sum(len(rows) for _, rows in chunk),
+                    status=batch.status,
+                    job_run_id=job_run_id,
+                    shared_lessons=shared_lessons,
+                )
+                record_summary_batch_lessons(
+                    batch.id,
+                    [(row["user_id"], row["lesson_id"], cache_key) for cache_key, rows in chunk for row in rows],
+                )
+            add_counter("llm_batches_submitted")
+            batch_ids.append(batch.id)
+
+    return batch_ids
+
+
+def parse_batch_output(text: str):
+    """
+    Yield (user_id, lesson_id, cache_key, summary, total_tokens) for each
+    successful line of a batch output file; summary is None for lines that
+    failed or carry no usable completion.
+    """
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            user_id, lesson_id, cache_key = record["custom_id"].split(":", 2)
+        except (ValueError, KeyError, AttributeError):
+            continue
+
+        summary, total_tokens = None, 0
+        response = record.get("response") or {}
+        if not record.get("error") and response.get("status_code") == 200:
+            body = response.get("body") or {}
+            try:
+                content = body["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                content = None
+            summary = content.strip() if isinstance(content, str) and content.strip() else None
+            total_tokens = (body.get("usage") or {}).get("total_tokens", 0)
+
+        yield user_id, lesson_id, cache_key, summary, total_tokens
+
+
+def _apply_batch(client, batch: dict, remote, stats: Counter):
+    applied = 0
+    superseded = 0
+    tokens = 0
+    generated = {}
+    shared_lessons = batch.get("shared_lessons") or {}
+
+    if remote.output_file_id:
+        output = client.files.content(remote.output_file_id).text
+        results = []
+        for user_id, lesson_id, cache_key, summary, total_tokens in parse_batch_output(output):
+            tokens += total_tokens
+            if summary is None:
+                continue
+            lessons = [(int(user_id), int(lesson_id))] + [tuple(pair) for pair in shared_lessons.get(cache_key, [])]
+            results.append((cache_key, summary, lessons))
+            generated[cache_key] = {"cache_key": cache_key, "summary_text": summary}
+
+        latest = get_latest_summary_keys(lesson for _, _, lessons in results for lesson in lessons)
+        with LessonSummaryWriter(batch_size=SUMMARY_WRITE_BATCH_SIZE) as writer:
+            for cache_key, summary, lessons in results:
+                for user_id, lesson_id in lessons:
+                    # A later batch was submitted for this lesson with another
+                    # prompt: its summary is newer, whichever batch ends first.
+                    if latest.get((user_id, lesson_id), cache_key) != cache_key:
+                        superseded += 1
+                        continue
+                    writer.add(user_id, lesson_id, summary, batch["model_version"])
+                    applied += 1
+
+    if generated:
+        put_cached_summaries(generated.values(), model=batch["model"])
+
+    failed = max(0, batch["lesson_count"] - applied - superseded)
+    update_summary_batch(batch["batch_id"], remote.status, finished=True, applied=applied, failed=failed)
+    add_counter("llm_tokens", tokens)
+    stats["tokens"] += tokens
+    stats["applied_batches"] += 1
+    stats["summaries_applied"] += applied
+    stats["summaries_superseded"] += superseded
+    stats["summaries_failed"] += failed
+
+
+def collect_summary_batches() -> Counter:
+    """
+    Poll every pending batch and apply the finished ones: summaries are
+    bulk-written to synonym_ai_lesson_insights and the summary cache, and
+    the batch row is closed, in one transaction per batch. Lessons whose
+    latest submitted prompt is no longer the batch's are skipped as
+    superseded. Batches still running are left for a later run, as are
+    batches whose API calls fail.
+    Returns counts: pending, applied_batches, summaries_applied,
+    summaries_superseded, summaries_failed, errors, tokens.
+    """
+    stats = Counter()
+    client = get_client()
+    if not client:
+        return stats
+
+    for batch in get_pending_summary_batches():
+        try:
+            with transaction():
+                if not claim_summary_batch(batch["batch_id"]):
+                    continue
+                remote = client.batches.retrieve(batch["batch_id"])
+                if remote.status not in FINISHED_STATUSES:
+                    if remote.status != batch["status"]:
+                        update_summary_batch(batch["batch_id"], remote.status)
+                    stats["pending"] += 1
+                    continue
+                _apply_batch(client, batch, remote, stats)
+        except openai.OpenAIError as exc:
+            stats["errors"] += 1
+            print(f"Summary batch {batch['batch_id']}: {exc}; retrying on the next run", file=sys.stderr)
+
+    print(
+        "Summary batches: "
+        f"{stats['applied_batches']} applied "
+        f"({stats['summaries_applied']} summaries, {stats['summaries_superseded']} superseded, "
+        f"{stats['summaries_failed']} failed), "
+        f"{stats['pending']} still running, "
+        f"{stats['errors']} errors"
+    )
+
+    return stats
+
+
+def main():
+    """
+    Apply finished summary batches without running a lane (e.g. from cron).
+    """
+    try:
+        with borrowed_connection():
+            collect_summary_batches()
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
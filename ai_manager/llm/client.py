@@ -1,13 +1,87 @@
+import hashlib
+import json
 import os
+from typing import NamedTuple
 
+import openai
 from openai import OpenAI
 
+from ai_manager.logging.metrics import add_counter, instrumented
+
 OPENAI_MODEL = os.getenv("AI_SUMMARY_MODEL", "gpt-4o-mini")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Any OpenAI-compatible endpoint, e.g. a local stand-in (ai_manager.bench.llm_stub).
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+SYSTEM_PROMPT = "You summarise learning performance clearly and neutrally."
+SUMMARY_TEMPERATURE = 0.2
+SUMMARY_MAX_TOKENS = 120
 
 _client = None
 
 
+class RetryableSummaryError(Exception):
+    """
+    The request may succeed if retried (throttling or a transient server fault).
+    """
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class SummaryThrottled(RetryableSummaryError):
+    """
+    The API answered 429.
+    """
+
+
+class SummaryUnavailable(RetryableSummaryError):
+    """
+    The API answered 5xx, timed out or could not be reached.
+    """
+
+
+class SummaryResult(NamedTuple):
+    text: str | None
+    total_tokens: int
+
+
+def summary_cache_key(prompt: str, batched: bool = False) -> str:
+    """
+    Content address of a summary: everything that determines the completion.
+    batched=True addresses the lesson's item of a multi-lesson JSON reply,
+    which was not generated from `prompt` itself and so gets its own key.
+    """
+    fields = {
+        "model": OPENAI_MODEL,
+        "system": SYSTEM_PROMPT,
+        "prompt": prompt,
+        "temperature": SUMMARY_TEMPERATURE,
+        "max_tokens": SUMMARY_MAX_TOKENS,
+    }
+    if batched:
+        fields["batched"] = True
+    material = json.dumps(fields, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def summary_request_body(prompt: str, max_tokens: int = SUMMARY_MAX_TOKENS) -> dict:
+    """
+    Chat-completion parameters for one prompt; also the body of a Batch API
+    request line, so batched and direct summaries are generated alike.
+    """
+    return {
+        "model": OPENAI_MODEL,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": SUMMARY_TEMPERATURE,
+        "max_tokens": max_tokens,
+    }
+
+
 def get_client():
     global _client
 
@@ -15,30 +89,54 @@ def get_client():
         return None
 
     if _client is None:
-        _client = OpenAI(api_key=OPENAI_API_KEY)
+        # Retries are handled by the summariser so throttling stays visible.
+        _client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0)
 
     return _client
 
 
-def generate_summary(prompt: str) -> str | None:
+def _retry_after(exc) -> float | None:
+    response = getattr(exc, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+@instrumented()
+def request_summary(prompt: str, max_tokens: int = SUMMARY_MAX_TOKENS, json_response: bool = False) -> SummaryResult:
+    """
+    One chat completion (a JSON object when json_response is set). Raises
+    SummaryThrottled / SummaryUnavailable for retryable failures; anything
+    else propagates as-is.
+    """
     client = get_client()
     if not client:
-        return None
+        return SummaryResult(None, 0)
 
+    extra = {"response_format": {"type": "json_object"}} if json_response else {}
+
+    try:
+        resp = client.chat.completions.create(**summary_request_body(prompt, max_tokens), **extra)
+    except openai.RateLimitError as e:
+        raise SummaryThrottled(str(e), _retry_after(e)) from e
+    except openai.APIStatusError as e:
+        if e.status_code >= 500:
+            raise SummaryUnavailable(str(e), _retry_after(e)) from e
+        raise
+    except openai.APIConnectionError as e:
+        raise SummaryUnavailable(str(e)) from e
+
+    content = resp.choices[0].message.content
+    total_tokens = resp.usage.total_tokens if resp.usage else 0
+    add_counter("llm_requests")
+    add_counter("llm_tokens", total_tokens)
+    return SummaryResult(content.strip() if content else None, total_tokens)
+
+
+def generate_summary(prompt: str) -> str | None:
     try:
-        resp = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You summarise learning performance clearly and neutrally.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.2,
-            max_tokens=120,
-        )
-        content = resp.choices[0].message.content
-        return content.strip() if content else None
+        return request_summary(prompt).text
     except Exception:
         return None
@@ -1,21 +1,103 @@
+import json
+
+# Longest batch summary accepted; longer items are retried one by one.
+BATCH_SUMMARY_MAX_CHARS = 600
+
+RULES = """
+Rules:
+- Do NOT give advice
+- Do NOT predict future performance
+- Use calm, factual language
+- 1–2 sentences only
+""".strip()
+
+
+def _lesson_stats(lesson_row: dict) -> str:
+    focus_words = lesson_row.get("top_weak_headwords") or lesson_row.get("top_weak_word_ids") or []
+    focus_words = [str(w) for w in focus_words if w is not None]
+    avg_response_ms = lesson_row["avg_response_ms"]
+    response_time = f"{int(avg_response_ms)} ms" if avg_response_ms is not None else "n/a"
+
+    return f"""
+- Total attempts: {lesson_row['attempts_total']}
+- Accuracy rate: {round(float(lesson_row['accuracy_rate']) * 100)}%
+- Average response time: {response_time}
+- Focus words: {", ".join(focus_words)}
+""".strip()
+
+
 def lesson_summary_prompt(lesson_row: dict) -> str:
     """
     Build a compact, App-Store-safe prompt.
     """
-    focus_words = lesson_row.get("top_weak_word_ids") or lesson_row.get("top_weak_headwords") or []
-
     return f"""
 Summarise this learner’s performance in neutral, parent-friendly language.
 
 Lesson performance:
-- Total attempts: {lesson_row['attempts_total']}
-- Accuracy rate: {round(float(lesson_row['accuracy_rate']) * 100)}%
-- Average response time: {int(lesson_row['avg_response_ms'])} ms
-- Focus words: {", ".join(focus_words)}
+{_lesson_stats(lesson_row)}
 
-Rules:
-- Do NOT give advice
-- Do NOT predict future performance
-- Use calm, factual language
-- 1–2 sentences only
+{RULES}
 """.strip()
+
+
+def batch_summary_prompt(lesson_rows: list) -> str:
+    """
+    One prompt for several lessons, asking for a JSON object with one
+    summary per (user_id, lesson_id). Same rules as lesson_summary_prompt.
+    """
+    lessons = "\n\n".join(
+        f"Lesson performance (user_id {row['user_id']}, lesson_id {row['lesson_id']}):\n{_lesson_stats(row)}"
+        for row in lesson_rows
+    )
+
+    return f"""
+Summarise each learner’s performance below in neutral, parent-friendly language, one summary per lesson.
+
+{lessons}
+
+{RULES}
+
+Reply with JSON only, one entry per lesson above:
+{{"summaries": [{{"user_id": <user_id>, "lesson_id": <lesson_id>, "summary": "<summary>"}}]}}
+""".strip()
+
+
+def parse_batch_summaries(text: str, lesson_rows: list) -> dict:
+    """
+    Valid summaries of a batch completion, keyed by (user_id, lesson_id) as
+    in lesson_rows. Drops anything that is not JSON of the requested shape,
+    names a lesson not in the batch (or twice), or has an empty or overlong
+    summary; the caller retries those lessons one by one.
+    """
+    try:
+        payload = json.loads(text)
+    except (TypeError, ValueError):
+        return {}
+
+    items = payload.get("summaries") if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        return {}
+
+    # Match on text so 12 and "12" are the same id.
+    requested = {(str(row["user_id"]), str(row["lesson_id"])): (row["user_id"], row["lesson_id"]) for row in lesson_rows}
+    summaries = {}
+    duplicates = set()
+
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        key = requested.get((str(item.get("user_id")), str(item.get("lesson_id"))))
+        summary = item.get("summary")
+        if key is None or not isinstance(summary, str):
+            continue
+        summary = summary.strip()
+        if not summary or len(summary) > BATCH_SUMMARY_MAX_CHARS:
+            continue
+        if key in summaries:
+            duplicates.add(key)
+        summaries[key] = summary
+
+    for key in duplicates:
+        del summaries[key]
+
+    return summaries
@@ -0,0 +1,197 @@
+import random
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable
+
+from ai_manager.config import (
+    SUMMARY_BATCH_SIZE,
+    SUMMARY_CONCURRENCY,
+    SUMMARY_DEADLINE_SECONDS,
+    SUMMARY_MAX_ATTEMPTS,
+    SUMMARY_REQUESTS_PER_MINUTE,
+    SUMMARY_TOKENS_PER_MINUTE,
+)
+from ai_manager.llm.client import (
+    SUMMARY_MAX_TOKENS,
+    RetryableSummaryError,
+    SummaryThrottled,
+    request_summary,
+)
+from ai_manager.llm.prompts import batch_summary_prompt, lesson_summary_prompt, parse_batch_summaries
+from ai_manager.llm.ratelimit import TokenBucket
+from ai_manager.logging.metrics import propagate
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_CAP_SECONDS = 30.0
+# Completion tokens per lesson in a batch on top of its summary: JSON keys and ids.
+BATCH_ITEM_OVERHEAD_TOKENS = 30
+
+
+def _estimate_tokens(prompt: str, max_tokens: int = SUMMARY_MAX_TOKENS) -> int:
+    # ~4 characters per token, plus the completion budget.
+    return len(prompt) // 4 + max_tokens
+
+
+def _backoff(attempt: int, retry_after: float = None) -> float:
+    if retry_after is not None:
+        return retry_after + random.uniform(0, BACKOFF_BASE_SECONDS)
+    return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def _request(
+    prompt: str,
+    requests: TokenBucket,
+    tokens: TokenBucket,
+    deadline: float,
+    max_attempts: int,
+    max_tokens: int = SUMMARY_MAX_TOKENS,
+    json_response: bool = False,
+):
+    """
+    Returns (SummaryResult, counts, None) or, when no completion came back,
+    (None, counts, "failed" / "exhausted" / "deadline").
+    """
+    counts = Counter()
+    estimate = _estimate_tokens(prompt, max_tokens)
+
+    for attempt in range(max_attempts):
+        if not requests.acquire(1, deadline) or not tokens.acquire(estimate, deadline):
+            return None, counts, "deadline"
+
+        try:
+            result = request_summary(prompt, max_tokens=max_tokens, json_response=json_response)
+        except RetryableSummaryError as e:
+            counts["throttled" if isinstance(e, SummaryThrottled) else "server_errors"] += 1
+            delay = _backoff(attempt, e.retry_after)
+            if time.monotonic() + delay > deadline:
+                return None, counts, "deadline"
+            time.sleep(delay)
+            continue
+        except Exception:
+            return None, counts, "failed"
+
+        counts["tokens"] += result.total_tokens
+        return result, counts, None
+
+    return None, counts, "exhausted"
+
+
+def _summarise_one(prompt: str, requests: TokenBucket, tokens: TokenBucket, deadline: float, max_attempts: int):
+    """
+    Returns (summary, outcome counts) for one prompt.
+    """
+    result, counts, failure = _request(prompt, requests, tokens, deadline, max_attempts)
+    if failure:
+        counts[failure] += 1
+        return None, counts
+
+    counts["succeeded" if result.text else "empty"] += 1
+    return result.text, counts
+
+
+def _summarise_batch(rows, requests: TokenBucket, tokens: TokenBucket, deadline: float, max_attempts: int):
+    """
+    Returns ({(user_id, lesson_id): summary}, request counts) for one
+    multi-lesson prompt; only valid items are returned. Per-lesson outcomes
+    are left to the caller, which retries missing lessons one by one.
+    """
+    result, counts, failure = _request(
+        batch_summary_prompt(rows),
+        requests,
+        tokens,
+        deadline,
+        max_attempts,
+        max_tokens=len(rows) * (SUMMARY_MAX_TOKENS + BATCH_ITEM_OVERHEAD_TOKENS),
+        json_response=True,
+    )
+    counts["batch_requests"] += 1
+    if failure:
+        counts[f"batch_{failure}"] += 1
+        return {}, counts
+
+    return parse_batch_summaries(result.text, rows), counts
+
+
+def summarise_lessons(
+    lesson_rows: Iterable[Dict],
+    on_summary: Callable[[Dict, str, bool], None],
+    concurrency: int = SUMMARY_CONCURRENCY,
+    requests_per_minute: int = SUMMARY_REQUESTS_PER_MINUTE,
+    tokens_per_minute: int = SUMMARY_TOKENS_PER_MINUTE,
+    max_attempts: int = SUMMARY_MAX_ATTEMPTS,
+    deadline_seconds: float = SUMMARY_DEADLINE_SECONDS,
+    batch_size: int = SUMMARY_BATCH_SIZE,
+) -> Counter:
+    """
+    Generate lesson summaries on a bounded thread pool under request and
+    token per-minute budgets. 429 and 5xx responses are retried with
+    jittered backoff until max_attempts or the run deadline.
+
+    With batch_size > 1, lessons are sent batch_size to a request and the
+    JSON reply is validated per lesson; lessons missing from it (or the
+    whole batch, if the request fails) fall back to single-lesson requests.
+
+    on_summary(row, summary, batched) is called on the calling thread as
+    each summary completes, so writes stay on the lane's connection;
+    batched tells whether it came from a multi-lesson reply.
+    Returns counts: requested, succeeded, throttled, server_errors,
+    failed, exhausted, deadline, empty, tokens, batch_requests, fallbacks.
+    """
+    deadline = time.monotonic() + deadline_seconds
+    requests = TokenBucket(requests_per_minute)
+    tokens = TokenBucket(tokens_per_minute)
+    stats = Counter()
+    lesson_rows = list(lesson_rows)
+    stats["requested"] = len(lesson_rows)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        futures = {}  # future -> row, or list of rows for a batch
+        summarise_one = propagate(_summarise_one)
+        summarise_batch = propagate(_summarise_batch)
+
+        def submit_one(row):
+            prompt = lesson_summary_prompt(row)
+            futures[executor.submit(summarise_one, prompt, requests, tokens, deadline, max_attempts)] = row
+
+        batch_size = max(1, batch_size)
+        for start in range(0, len(lesson_rows), batch_size):
+            batch = lesson_rows[start:start + batch_size]
+            if len(batch) == 1:
+                submit_one(batch[0])
+            else:
+                futures[executor.submit(summarise_batch, batch, requests, tokens, deadline, max_attempts)] = batch
+
+        while futures:
+            done, _ = wait(
+                futures,
+                timeout=max(0.0, deadline - time.monotonic()) + 1,
+                return_when=FIRST_COMPLETED,
+            )
+            if not done:
+                stats["deadline"] += sum(len(t) if isinstance(t, list) else 1 for t in futures.values())
+                break
+
+            for future in done:
+                target = futures.pop(future)
+                if isinstance(target, list):
+                    summaries, counts = future.result()
+                    stats.update(counts)
+                    for row in target:
+                        summary = summaries.get((row["user_id"], row["lesson_id"]))
+                        if summary:
+                            stats["succeeded"] += 1
+                            on_summary(row, summary, True)
+                        else:
+                            stats["fallbacks"] += 1
+                            submit_one(row)
+                else:
+                    summary, counts = future.result()
+                    stats.update(counts)
+                    if summary:
+                        on_summary(target, summary, False)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return stats
@@ -1,5 +1,8 @@
 import uuid
 
+import psycopg2
+from psycopg2.extras import Json
+
 from ai_manager.db import get_connection
 
 
@@ -39,7 +42,12 @@ def finish_job(
     processed_lessons: int = 0,
     processed_attempts: int = 0,
     model_version: str = "phase1-v1",
+    metrics: dict = None,
 ):
+    """
+    metrics is the run's RunMetrics snapshot, stored as JSON when the
+    metrics column exists (ai_manager/sql/platform_ai_job_runs_metrics.sql).
+    """
     sql = """
         UPDATE public.platform_ai_job_runs
         SET status = %s,
@@ -51,18 +59,30 @@ def finish_job(
             model_version = %s
         WHERE id = %s
     """
+    params = (
+        status,
+        error_message,
+        processed_users,
+        processed_lessons,
+        processed_attempts,
+        model_version or "phase1-v1",
+        job_id,
+    )
+
     with get_connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                sql,
-                (
-                    status,
-                    error_message,
-                    processed_users,
-                    processed_lessons,
-                    processed_attempts,
-                    model_version or "phase1-v1",
-                    job_id,
-                ),
-            )
+            cur.execute(sql, params)
         conn.commit()
+
+        if metrics is not None:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "UPDATE public.platform_ai_job_runs SET metrics = %s WHERE id = %s",
+                        (Json(metrics), job_id),
+                    )
+                conn.commit()
+            except psycopg2.errors.UndefinedColumn:
+                # Schema predates the metrics column -> keep the run row as is
+                conn.rollback()
+                print("platform_ai_job_runs.metrics is missing; run metrics not stored")
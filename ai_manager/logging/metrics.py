@@ -0,0 +1,283 @@
+import inspect
+import os
+import random
+import re
+import resource
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+from ai_manager.config import METRICS_TEXTFILE_DIR
+from ai_manager.logging.plans import PlanProfile, profiling_enabled
+
+# Latency samples kept per stage; beyond this a uniform reservoir is kept.
+MAX_LATENCY_SAMPLES = 10000
+PERCENTILES = (50, 90, 99)
+
+_local = threading.local()
+
+
+class StageStats:
+    __slots__ = ("calls", "seconds", "rows_in", "rows_out", "round_trips", "samples")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.round_trips = 0
+        self.samples = []
+
+
+def _percentile(ordered, pct):
+    # Nearest-rank on a sorted list.
+    return ordered[max(0, -(-len(ordered) * pct // 100) - 1)]
+
+
+class RunMetrics:
+    """
+    Per-run collector. Stages are keyed by name (the instrumented function's
+    name by default); counters hold run totals such as DB round-trips and
+    LLM tokens. Safe to share between a lane's threads. With profiling
+    enabled (logging.plans) it also carries the run's PlanProfile.
+    """
+
+    def __init__(self, plans: PlanProfile = None):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = Counter()
+        self.plans = plans if plans is not None else PlanProfile() if profiling_enabled() else None
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float, rows_in=None, rows_out=None, round_trips: int = 0):
+        with self._lock:
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.rows_in += rows_in or 0
+            stats.rows_out += rows_out or 0
+            stats.round_trips += round_trips
+            if len(stats.samples) < MAX_LATENCY_SAMPLES:
+                stats.samples.append(seconds)
+            else:
+                slot = random.randrange(stats.calls)
+                if slot < MAX_LATENCY_SAMPLES:
+                    stats.samples[slot] = seconds
+
+    def add(self, counter: str, amount: int = 1):
+        with self._lock:
+            self.counters[counter] += amount
+
+    def to_dict(self, **extra) -> dict:
+        """
+        JSON-ready snapshot: totals, counters, per-stage figures with
+        p50/p90/p99 latency (ms), the process's peak RSS, and the profiled
+        statements (with their slowest plans) when profiling.
+        """
+        with self._lock:
+            stages = {}
+            for name, stats in sorted(self.stages.items()):
+                ordered = sorted(stats.samples)
+                stages[name] = {
+                    "calls": stats.calls,
+                    "seconds": round(stats.seconds, 4),
+                    "rows_in": stats.rows_in,
+                    "rows_out": stats.rows_out,
+                    "round_trips": stats.round_trips,
+                    **{f"p{pct}_ms": round(1000 * _percentile(ordered, pct), 2) for pct in PERCENTILES},
+                }
+            counters = dict(self.counters)
+
+        return {
+            "wall_seconds": round(time.perf_counter() - self.started, 3),
+            # Linux reports ru_maxrss in KiB. Lanes on threads share one process.
+            "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+            "counters": counters,
+            "stages": stages,
+            **({"plans": self.plans.to_dict()} if self.plans is not None else {}),
+            **extra,
+        }
+
+
+def current_metrics():
+    return getattr(_local, "metrics", None)
+
+
+def current_plans():
+    metrics = getattr(_local, "metrics", None)
+    return metrics.plans if metrics is not None else None
+
+
+@contextmanager
+def bind_metrics(metrics: RunMetrics = None):
+    """
+    Collect into `metrics` (a fresh RunMetrics by default) on this thread
+    for the duration of the block. Usable as a decorator.
+    """
+    previous = getattr(_local, "metrics", None)
+    _local.metrics = metrics if metrics is not None else RunMetrics()
+    try:
+        yield _local.metrics
+    finally:
+        _local.metrics = previous
+
+
+def propagate(fn):
+    """
+    Wrap fn so it collects into the caller's metrics when run on another
+    thread (pipeline stages, summariser workers).
+    """
+    metrics = current_metrics()
+    if metrics is None:
+        return fn
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        with bind_metrics(metrics):
+            return fn(*args, **kwargs)
+
+    return wrapper
+
+
+def count_round_trip():
+    """
+    Called by the pooled connections' cursors for every statement sent.
+    """
+    _local.round_trips = getattr(_local, "round_trips", 0) + 1
+    metrics = getattr(_local, "metrics", None)
+    if metrics is not None:
+        metrics.add("db_round_trips")
+
+
+def add_counter(counter: str, amount: int = 1):
+    metrics = getattr(_local, "metrics", None)
+    if metrics is not None:
+        metrics.add(counter, amount)
+
+
+def record_stage(stage: str, seconds: float, rows_in=None, rows_out=None):
+    metrics = getattr(_local, "metrics", None)
+    if metrics is not None:
+        metrics.record(stage, seconds, rows_in, rows_out)
+
+
+def _row_count(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, (list, dict, set, frozenset)):
+        return len(value)
+    return None
+
+
+def instrumented(stage: str = None, rows_in: str = None):
+    """
+    Record wall time, DB round-trips and row counts of every call into the
+    thread's bound metrics (no-op when none is bound).
+    rows_in names the argument holding the input rows; rows out are taken
+    from a list/dict result or an int written/updated count.
+    """
+
+    def decorate(fn):
+        name = stage or fn.__name__
+        position = list(inspect.signature(fn).parameters).index(rows_in) if rows_in else None
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            metrics = getattr(_local, "metrics", None)
+            if metrics is None:
+                return fn(*args, **kwargs)
+
+            rows = None
+            if rows_in:
+                source = kwargs[rows_in] if rows_in in kwargs else args[position] if position < len(args) else None
+                rows = len(source) if hasattr(source, "__len__") else None
+
+            trips = getattr(_local, "round_trips", 0)
+            started = time.perf_counter()
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+                return result
+            finally:
+                # Failed calls are timed too (e.g. throttled LLM requests).
+                metrics.record(
+                    name,
+                    time.perf_counter() - started,
+                    rows_in=rows,
+                    rows_out=_row_count(result),
+                    round_trips=getattr(_local, "round_trips", 0) - trips,
+                )
+
+        return wrapper
+
+    return decorate
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_textfile(lane: str, snapshot: dict, directory: str = METRICS_TEXTFILE_DIR):
+    """
+    Write a run snapshot as a Prometheus node_exporter textfile
+    (<directory>/ai_manager_<lane>.prom), replaced atomically.
+    No-op unless AI_METRICS_TEXTFILE_DIR is set.
+    """
+    if not directory:
+        return
+
+    lane_label = f'lane="{_label(lane)}"'
+    lines = [
+        "# TYPE ai_job_last_run_timestamp_seconds gauge",
+        f"ai_job_last_run_timestamp_seconds{{{lane_label},status=\"{_label(snapshot.get('status', ''))}\"}} {time.time():.0f}",
+        "# TYPE ai_job_wall_seconds gauge",
+        f"ai_job_wall_seconds{{{lane_label}}} {snapshot['wall_seconds']}",
+        "# TYPE ai_job_peak_rss_bytes gauge",
+        f"ai_job_peak_rss_bytes{{{lane_label}}} {snapshot['peak_rss_bytes']}",
+    ]
+
+    processed = {k: snapshot[k] for k in ("processed_attempts", "processed_users", "processed_lessons") if k in snapshot}
+    if processed:
+        lines.append("# TYPE ai_job_processed gauge")
+        lines.extend(f'ai_job_processed{{{lane_label},kind="{k[len("processed_"):]}"}} {v}' for k, v in processed.items())
+
+    if snapshot["counters"]:
+        lines.append("# TYPE ai_job_counter gauge")
+        lines.extend(
+            f'ai_job_counter{{{lane_label},counter="{_label(k)}"}} {v}'
+            for k, v in sorted(snapshot["counters"].items())
+        )
+
+    stage_series = (
+        ("ai_job_stage_seconds", "seconds"),
+        ("ai_job_stage_calls", "calls"),
+        ("ai_job_stage_rows_in", "rows_in"),
+        ("ai_job_stage_rows_out", "rows_out"),
+        ("ai_job_stage_round_trips", "round_trips"),
+    )
+    for metric, field in stage_series:
+        lines.append(f"# TYPE {metric} gauge")
+        lines.extend(
+            f'{metric}{{{lane_label},stage="{_label(name)}"}} {stats[field]}'
+            for name, stats in snapshot["stages"].items()
+        )
+
+    lines.append("# TYPE ai_job_stage_latency_seconds gauge")
+    for name, stats in snapshot["stages"].items():
+        for pct in PERCENTILES:
+            lines.append(
+                f'ai_job_stage_latency_seconds{{{lane_label},stage="{_label(name)}",quantile="0.{pct}"}} '
+                f"{stats[f'p{pct}_ms'] / 1000}"
+            )
+
+    path = os.path.join(directory, f"ai_manager_{re.sub(r'[^A-Za-z0-9_.-]', '_', lane)}.prom")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp, path)
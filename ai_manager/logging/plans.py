@@ -0,0 +1,220 @@
+import json
+import os
+import re
+import sys
+import threading
+
+import psycopg2
+from psycopg2 import extensions
+
+from ai_manager.config import PROFILE_DIR, PROFILE_PLANS
+
+# Statements are attributed to the first caller in one of these modules;
+# bulk/keyset/streaming/rollups helpers are attributed to the repo that
+# called them. Statements from anywhere else are not profiled.
+PROFILED_MODULES = (
+    "ai_manager.repo.backfill_repo",
+    "ai_manager.repo.math_repo",
+    "ai_manager.repo.spelling_repo",
+    "ai_manager.repo.synonym_repo",
+    "ai_manager.repo.summary_batch_repo",
+    "ai_manager.repo.summary_cache_repo",
+    "ai_manager.repo.word_resolver",
+    "ai_manager.state.checkpoints",
+    "ai_manager.logging.job_runs",
+)
+ATTEMPT_TABLES = ("attempts", "spelling_attempts", "math_attempts")
+
+# Flag a node whose actual rows differ from the planner's estimate by at
+# least this factor (either way), when either side has at least MIN rows.
+ROW_ESTIMATE_FACTOR = 10
+ROW_ESTIMATE_MIN_ROWS = 100
+
+_EXPLAINABLE = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH|VALUES)\b", re.IGNORECASE)
+
+_profiling = PROFILE_PLANS
+
+
+def enable_profiling(enabled: bool = True):
+    """
+    Profile every run started after this call (see RunMetrics.plans).
+    """
+    global _profiling
+    _profiling = enabled
+
+
+def profiling_enabled() -> bool:
+    return _profiling
+
+
+def _caller():
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__")
+        if module in PROFILED_MODULES:
+            return f"{module.rsplit('.', 1)[1]}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return None
+
+
+def _nodes(node, limited=False):
+    """
+    (node, limited) for every plan node; limited = below a Limit, which
+    stops its input early, so actual rows there undercount by design.
+    """
+    yield node, limited
+    limited = limited or node["Node Type"] == "Limit"
+    for child in node.get("Plans", ()):
+        yield from _nodes(child, limited)
+
+
+def plan_flags(plan: dict) -> list:
+    """
+    Warnings for one EXPLAIN (ANALYZE, FORMAT JSON) plan: sequential scans
+    of the attempts tables, sorts / hashes spilling to disk, and row
+    estimates off by ROW_ESTIMATE_FACTOR in plans that read attempts.
+    """
+    nodes = list(_nodes(plan["Plan"]))
+    reads_attempts = any(n.get("Relation Name") in ATTEMPT_TABLES for n, _ in nodes)
+    flags = []
+
+    for node, limited in nodes:
+        relation = node.get("Relation Name")
+        if node["Node Type"] == "Seq Scan" and relation in ATTEMPT_TABLES:
+            flags.append(f"seq_scan:{relation}")
+        if node.get("Sort Space Type") == "Disk":
+            flags.append(f"sort_spill:{node.get('Sort Space Used', 0)}kB")
+        if node.get("Hash Batches", 1) > 1:
+            flags.append(f"hash_spill:{node['Hash Batches']} batches")
+        if reads_attempts and not limited and node.get("Actual Loops"):
+            estimated = node["Plan Rows"]
+            actual = node["Actual Rows"]
+            if max(estimated, actual) >= ROW_ESTIMATE_MIN_ROWS and (
+                actual >= estimated * ROW_ESTIMATE_FACTOR or estimated >= actual * ROW_ESTIMATE_FACTOR
+            ):
+                target = f" on {relation}" if relation else ""
+                flags.append(f"row_estimate:{node['Node Type']}{target} est {estimated} actual {actual}")
+
+    return sorted(set(flags))
+
+
+class PlanProfile:
+    """
+    Plans and timings of a run's profiled statements, grouped by caller and
+    statement text. Keeps the slowest plan of each. Safe to share between a
+    lane's threads.
+    """
+
+    def __init__(self):
+        self.statements = {}
+        self._lock = threading.Lock()
+
+    def explain(self, cursor, query, vars=None):
+        """
+        EXPLAIN (ANALYZE, BUFFERS) `query` on the cursor's connection inside
+        a savepoint that is rolled back, so writes are undone before the
+        caller runs the statement for real. Skips statements that cannot be
+        explained or come from outside PROFILED_MODULES.
+        """
+        text = query.decode() if isinstance(query, bytes) else str(query)
+        if not _EXPLAINABLE.match(text):
+            return
+        caller = _caller()
+        if caller is None:
+            return
+
+        conn = cursor.connection
+        # A plain cursor, so the EXPLAIN is not itself counted or profiled.
+        with extensions.cursor(conn) as cur:
+            sql = cur.mogrify(query, vars)
+            cur.execute("SAVEPOINT ai_explain")
+            try:
+                cur.execute(b"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql)
+                plan = cur.fetchone()[0][0]
+            except psycopg2.Error as exc:
+                plan = None
+                error = str(exc).strip().splitlines()[0]
+            cur.execute("ROLLBACK TO SAVEPOINT ai_explain")
+            cur.execute("RELEASE SAVEPOINT ai_explain")
+
+        key = (caller, " ".join(text.split()))
+        with self._lock:
+            entry = self.statements.get(key)
+            if entry is None:
+                entry = self.statements[key] = {
+                    "caller": caller,
+                    "statement": key[1],
+                    "calls": 0,
+                    "execution_ms": 0.0,
+                    "max_execution_ms": 0.0,
+                    "planning_ms": 0.0,
+                    "shared_hit_blocks": 0,
+                    "shared_read_blocks": 0,
+                    "temp_written_blocks": 0,
+                    "flags": [],
+                    "errors": [],
+                    "plan": None,
+                }
+            entry["calls"] += 1
+
+            if plan is None:
+                if error not in entry["errors"]:
+                    entry["errors"].append(error)
+                return
+
+            root = plan["Plan"]
+            execution_ms = plan.get("Execution Time", 0.0)
+            entry["execution_ms"] += execution_ms
+            entry["planning_ms"] += plan.get("Planning Time", 0.0)
+            entry["shared_hit_blocks"] += root.get("Shared Hit Blocks", 0)
+            entry["shared_read_blocks"] += root.get("Shared Read Blocks", 0)
+            entry["temp_written_blocks"] += root.get("Temp Written Blocks", 0)
+            entry["flags"] = sorted(set(entry["flags"]) | set(plan_flags(plan)))
+            if entry["plan"] is None or execution_ms >= entry["max_execution_ms"]:
+                entry["max_execution_ms"] = execution_ms
+                entry["plan"] = plan
+
+    def to_dict(self, include_plans: bool = True) -> list:
+        """
+        Statements, slowest first, with timings rounded to the microsecond.
+        """
+        with self._lock:
+            entries = sorted(self.statements.values(), key=lambda e: e["execution_ms"], reverse=True)
+            return [
+                {
+                    **entry,
+                    "execution_ms": round(entry["execution_ms"], 3),
+                    "max_execution_ms": round(entry["max_execution_ms"], 3),
+                    "planning_ms": round(entry["planning_ms"], 3),
+                    "plan": entry["plan"] if include_plans else None,
+                }
+                for entry in entries
+            ]
+
+
+def write_plan_report(name: str, job_run_id: str, profile: PlanProfile, directory: str = PROFILE_DIR):
+    """
+    Print the flagged statements of a profiled run and, when
+    AI_PROFILE_DIR is set, write the full report (with plans) to
+    <directory>/<name>.<job_run_id>.plans.json. No-op without a profile.
+    """
+    if profile is None:
+        return
+
+    statements = profile.to_dict()
+    for entry in statements:
+        if entry["flags"] or entry["errors"]:
+            print(
+                f"Plan warning [{name}] {entry['caller']} "
+                f"({entry['calls']} calls, {entry['execution_ms']:.1f} ms): "
+                f"{'; '.join(entry['flags'] + entry['errors'])}"
+            )
+
+    if not directory:
+        return
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}.{job_run_id}.plans.json")
+    with open(path, "w") as f:
+        json.dump({"name": name, "job_run_id": job_run_id, "statements": statements}, f, indent=2, default=str)
+    print(f"Wrote query plans to {path}")
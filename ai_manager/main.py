@@ -1,12 +1,151 @@
+import argparse
+import multiprocessing
+import random
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+from ai_manager.config import DRY_RUN, LANE_EXECUTOR, LANE_SHARDS, LANE_WORKERS, PIPELINE_QUEUE_SIZE, PROFILE_PLANS
+from ai_manager.db import DB_POOL_MAX, dry_run, set_dry_run
 from ai_manager.jobs.math_job import run_math_lane
 from ai_manager.jobs.spelling_job import run_spelling_lane
 from ai_manager.jobs.synonym_job import run_synonym_lane
+from ai_manager.logging.plans import enable_profiling, profiling_enabled
+
+LANES = {
+    "synonym": run_synonym_lane,
+    "spelling": run_spelling_lane,
+    "math": run_math_lane,
+}
+
+# Pipeline stage threads per lane task; each borrows a pooled connection
+# next to the one the lane pins (none when the stages run inline).
+LANE_STAGE_THREADS = {
+    "synonym": 2,  # fetch, resolve
+    "spelling": 1,  # fetch
+    "math": 1,  # fetch
+}
+
+
+def lane_tasks(lane_names, shards: int = LANE_SHARDS):
+    """
+    (lane, shard) tasks for the given lanes; shard is None when unsharded.
+    """
+    if shards <= 1:
+        return [(name, None) for name in lane_names]
+
+    # Start at a random shard so concurrent workers spread out.
+    offset = random.randrange(shards)
+    return [
+        (name, ((offset + i) % shards, shards))
+        for i in range(shards)
+        for name in lane_names
+    ]
+
+
+def task_label(name: str, shard=None) -> str:
+    return name if shard is None else f"{name} shard {shard[0]}/{shard[1]}"
+
+
+def task_connections(name: str, queue_size: int = PIPELINE_QUEUE_SIZE) -> int:
+    return 1 + (LANE_STAGE_THREADS[name] if queue_size > 0 else 0)
+
+
+def check_pool_size(tasks, workers: int, executor: str = "thread", reserved: int = 0):
+    """
+    Refuse to start when the busiest mix of tasks running at once (plus
+    `reserved` connections the caller holds besides) needs more pooled
+    connections than DB_POOL_MAX, instead of timing out mid-run.
+    A process executor gives every worker its own pool.
+    """
+    per_task = sorted((task_connections(name) for name, _ in tasks), reverse=True)
+    running = 1 if executor == "process" else max(1, min(workers, len(per_task)))
+    needed = sum(per_task[:running]) + reserved
+    if needed > DB_POOL_MAX:
+        raise RuntimeError(
+            f"{running} lane task(s) at once need up to {needed} pooled connections "
+            f"but DB_POOL_MAX is {DB_POOL_MAX}; raise DB_POOL_MAX or lower the workers"
+        )
+
+
+def _init_worker(dry_run_enabled: bool, profile: bool):
+    # Process workers that re-import the modules (spawn / forkserver) would
+    # read the flags from the environment, not from the command line.
+    set_dry_run(dry_run_enabled)
+    enable_profiling(profile)
+
+
+def run_lanes(
+    lane_names=None,
+    workers: int = LANE_WORKERS,
+    executor: str = LANE_EXECUTOR,
+    shards: int = LANE_SHARDS,
+) -> int:
+    """
+    Run lanes concurrently. Lanes read disjoint source tables and write
+    disjoint *_ai_* tables, so a failing lane never stops the others.
+    With shards > 1 every (lane, shard) is a separate task; shards already
+    held by another worker (here or on another host) are skipped.
+    Raises before starting when DB_POOL_MAX cannot serve `workers` tasks.
+    Returns 0 when every lane succeeded, 1 otherwise.
+    """
+    lane_names = list(lane_names or LANES)
+    failed = []
+
+    tasks = lane_tasks(lane_names, shards)
+    check_pool_size(tasks, workers, executor)
+
+    max_workers = max(1, min(workers, len(tasks)))
+    if executor == "process":
+        # Workers inherit the run's dry-run and profiling switches.
+        pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+            initargs=(dry_run(), profiling_enabled()),
+        )
+    else:
+        pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    with pool:
+        futures = {pool.submit(LANES[name], shard): (name, shard) for name, shard in tasks}
+
+        for future in as_completed(futures):
+            label = task_label(*futures[future])
+            try:
+                future.result()
+            except Exception:
+                failed.append(label)
+                print(f"{label} lane FAILED", file=sys.stderr)
+                traceback.print_exc()
+
+    if failed:
+        print(f"Lanes failed: {', '.join(sorted(failed))}", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run AI insight lanes.")
+    parser.add_argument("lanes", nargs="*", help=f"Lanes to run: {', '.join(LANES)} (default: all)")
+    parser.add_argument("--workers", type=int, default=LANE_WORKERS)
+    parser.add_argument("--executor", choices=["thread", "process"], default=LANE_EXECUTOR)
+    parser.add_argument("--shards", type=int, default=LANE_SHARDS, help="hash-partition learners into N shards")
+    parser.add_argument("--profile", action="store_true", default=PROFILE_PLANS, help="EXPLAIN ANALYZE every repo statement")
+    parser.add_argument("--dry-run", action="store_true", default=DRY_RUN, help="roll back every write")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.lanes if name not in LANES]
+    if unknown:
+        parser.error(f"unknown lanes: {', '.join(unknown)}")
 
+    enable_profiling(args.profile)
+    set_dry_run(args.dry_run)
+    if args.dry_run:
+        print("Dry run: every commit is rolled back; nothing is written")
 
-def main():
-    run_synonym_lane()
-    run_spelling_lane()
-    run_math_lane()
+    sys.exit(run_lanes(args.lanes, workers=args.workers, executor=args.executor, shards=args.shards))
 
 
 if __name__ == "__main__":
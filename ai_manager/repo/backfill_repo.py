@@ -0,0 +1,130 @@
+from typing import List, Optional, Sequence, Tuple
+
+from ai_manager.db import get_connection
+from ai_manager.logging.metrics import instrumented
+
+BACKFILL_RANGES_TABLE = "public.platform_ai_backfill_ranges"
+
+_RANGE_COLUMNS = "range_index, user_from, user_to, model_version, finished_at, attempts, rows_written"
+
+
+@instrumented()
+def get_backfill_ranges(backfill_name: str, lane: str, pending_only: bool = False) -> List[dict]:
+    """
+    Planned user_id ranges of a lane's backfill, in range order (optionally
+    only those not finished yet).
+    """
+    sql = f"""
+        SELECT {_RANGE_COLUMNS}
+        FROM {BACKFILL_RANGES_TABLE}
+        WHERE backfill_name = %(backfill_name)s
+          AND lane = %(lane)s
+          AND (NOT %(pending_only)s OR finished_at IS NULL)
+        ORDER BY range_index
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, {"backfill_name": backfill_name, "lane": lane, "pending_only": pending_only})
+            cols = [desc[0] for desc in cur.description]
+            return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+
+@instrumented()
+def plan_backfill_ranges(
+    backfill_name: str,
+    lane: str,
+    model_version: str,
+    ranges: Sequence[Tuple[int, int]],
+) -> List[dict]:
+    """
+    Record a lane's (user_from, user_to) ranges unless the backfill already
+    has ranges for it (e.g. planned concurrently on another host), and
+    return the stored ranges.
+    """
+    sql = f"""
+        INSERT INTO {BACKFILL_RANGES_TABLE}
+            (backfill_name, lane, range_index, user_from, user_to, model_version)
+        SELECT %(backfill_name)s, %(lane)s, r.n - 1, r.user_from, r.user_to, %(model_version)s
+        FROM unnest(%(user_from)s::bigint[], %(user_to)s::bigint[]) WITH ORDINALITY AS r(user_from, user_to, n)
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM {BACKFILL_RANGES_TABLE}
+            WHERE backfill_name = %(backfill_name)s
+              AND lane = %(lane)s
+        )
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            # Serialise planners of the same backfill lane until commit.
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"{backfill_name}:{lane}",))
+            cur.execute(
+                sql,
+                {
+                    "backfill_name": backfill_name,
+                    "lane": lane,
+                    "model_version": model_version,
+                    "user_from": [user_from for user_from, _ in ranges],
+                    "user_to": [user_to for _, user_to in ranges],
+                },
+            )
+        conn.commit()
+
+    return get_backfill_ranges(backfill_name, lane)
+
+
+@instrumented()
+def get_backfill_range(backfill_name: str, lane: str, range_index: int) -> Optional[dict]:
+    sql = f"""
+        SELECT {_RANGE_COLUMNS}
+        FROM {BACKFILL_RANGES_TABLE}
+        WHERE backfill_name = %(backfill_name)s
+          AND lane = %(lane)s
+          AND range_index = %(range_index)s
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, {"backfill_name": backfill_name, "lane": lane, "range_index": range_index})
+            row = cur.fetchone()
+            return dict(zip([desc[0] for desc in cur.description], row)) if row else None
+
+
+@instrumented()
+def finish_backfill_range(
+    backfill_name: str,
+    lane: str,
+    range_index: int,
+    attempts: int,
+    rows_written: int,
+    job_run_id: str = None,
+):
+    """
+    Mark a range done, so resuming the backfill skips it.
+    """
+    sql = f"""
+        UPDATE {BACKFILL_RANGES_TABLE}
+        SET finished_at = NOW(),
+            attempts = %(attempts)s,
+            rows_written = %(rows_written)s,
+            job_run_id = %(job_run_id)s
+        WHERE backfill_name = %(backfill_name)s
+          AND lane = %(lane)s
+          AND range_index = %(range_index)s
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                sql,
+                {
+                    "backfill_name": backfill_name,
+                    "lane": lane,
+                    "range_index": range_index,
+                    "attempts": attempts,
+                    "rows_written": rows_written,
+                    "job_run_id": job_run_id,
+                },
+            )
+        conn.commit()
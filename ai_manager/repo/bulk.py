@@ -0,0 +1,278 @@
+import io
+import itertools
+import operator
+import time
+from datetime import date, datetime
+from typing import Iterable, List, Mapping, Optional, Sequence
+
+from psycopg2.extras import execute_values
+
+from ai_manager.config import BULK_PAGE_SIZE, BULK_WRITE_METHOD
+from ai_manager.logging.metrics import add_counter
+
+STAGE_TABLE = "_ai_bulk_stage"
+
+
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (datetime, date)):
+        text = value.isoformat()
+    else:
+        text = str(value)
+    return (
+        text.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _row_reader(row, columns: Sequence[str]):
+    """
+    Value-tuple reader for rows shaped like `row`: mappings are read by
+    column name, records (namedtuples, see streaming.iter_records) by
+    attribute, and plain tuples are taken as already being in column order.
+    """
+    if isinstance(row, Mapping):
+        getter = operator.itemgetter(*columns)
+    elif hasattr(row, "_fields"):
+        if tuple(row._fields) == tuple(columns):
+            return tuple
+        getter = operator.attrgetter(*columns)
+    else:
+        return tuple
+    if len(columns) == 1:
+        return lambda r: (getter(r),)
+    return getter
+
+
+def _pages(values: Iterable[tuple], page_size: int):
+    values = iter(values)
+    while True:
+        page = list(itertools.islice(values, page_size))
+        if not page:
+            return
+        yield page
+
+
+def _stage_rows(cur, columns: Sequence[str], values: Iterable[tuple], method: str, page_size: int) -> int:
+    """
+    Load value tuples into the staging table, one page per round-trip.
+    Returns the number of rows staged.
+    """
+    column_list = ", ".join(columns)
+    staged = 0
+
+    for page in _pages(values, page_size):
+        if method == "values":
+            execute_values(
+                cur,
+                f"INSERT INTO {STAGE_TABLE} ({column_list}) VALUES %s",
+                page,
+                page_size=len(page),
+            )
+        else:
+            buf = io.StringIO()
+            for row in page:
+                buf.write("\t".join(_copy_value(v) for v in row))
+                buf.write("\n")
+            buf.seek(0)
+            cur.copy_expert(f"COPY {STAGE_TABLE} ({column_list}) FROM STDIN", buf)
+
+        staged += len(page)
+
+    return staged
+
+
+def _create_stage(cur, table: str, columns: Sequence[str]):
+    """
+    Temp staging table with the target's column types, so staged text is
+    parsed exactly as the target would parse it.
+    """
+    cur.execute(f"DROP TABLE IF EXISTS {STAGE_TABLE}")
+    cur.execute(
+        f"""
+        CREATE TEMP TABLE {STAGE_TABLE} ON COMMIT DROP AS
+        SELECT {", ".join(columns)} FROM {table} WITH NO DATA
+        """
+    )
+
+
+def _report(action: str, table: str, rows: int, started: float, skipped: int = None):
+    elapsed = time.perf_counter() - started
+    rate = rows / elapsed if elapsed > 0 else float(rows)
+    if skipped is None:
+        print(f"Bulk {action} {table}: {rows} rows in {elapsed:.2f}s ({rate:.0f} rows/s)")
+        return
+
+    add_counter("rows_written", rows - skipped)
+    add_counter("rows_skipped", skipped)
+    print(
+        f"Bulk {action} {table}: {rows} rows in {elapsed:.2f}s ({rate:.0f} rows/s), "
+        f"{rows - skipped} written, {skipped} unchanged"
+    )
+
+
+def changed(columns: Sequence[str], source: str = "EXCLUDED") -> str:
+    """
+    Condition that some of `columns` differ between the target row (`t`)
+    and `source`, NULL-safe. Appended as WHERE to an ON CONFLICT DO UPDATE,
+    it leaves unchanged rows alone instead of writing an identical version
+    (no dead tuple, no WAL, no bumped evaluated_at).
+    """
+    return (
+        f"({', '.join(f't.{c}' for c in columns)}) "
+        f"IS DISTINCT FROM ({', '.join(f'{source}.{c}' for c in columns)})"
+    )
+
+
+def bulk_upsert(
+    conn,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable,
+    conflict: str,
+    constants: Optional[Mapping] = None,
+    expressions: Optional[Mapping[str, str]] = None,
+    method: str = BULK_WRITE_METHOD,
+    page_size: int = BULK_PAGE_SIZE,
+) -> int:
+    """
+    Stream rows into a temp staging table (COPY or multi-row VALUES pages),
+    then apply them with one INSERT ... SELECT ... ON CONFLICT.
+
+    columns:     target columns; mapping rows are read by these keys and
+                 records by these attributes, plain tuple rows must
+                 already be in this order
+    constants:   column -> value shared by every row (e.g. model_version)
+    expressions: column -> SQL expression evaluated by the INSERT (e.g. NOW())
+    conflict:    everything after ON CONFLICT; the target is aliased `t`.
+                 A DO UPDATE guarded by WHERE changed(...) skips rows that
+                 would not change.
+    Does not commit. Returns the number of rows inserted or updated.
+    """
+    constants = dict(constants or {})
+    expressions = dict(expressions or {})
+
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return 0
+
+    started = time.perf_counter()
+    staged_columns = [*columns, *constants]
+    tail = tuple(constants.values())
+    read = _row_reader(first, columns)
+    values = (read(row) + tail for row in itertools.chain((first,), rows))
+
+    insert_columns = ", ".join([*staged_columns, *expressions])
+    select_list = ", ".join([*staged_columns, *expressions.values()])
+
+    with conn.cursor() as cur:
+        _create_stage(cur, table, staged_columns)
+        staged = _stage_rows(cur, staged_columns, values, method, page_size)
+        cur.execute(
+            f"""
+            INSERT INTO {table} AS t ({insert_columns})
+            SELECT {select_list} FROM {STAGE_TABLE}
+            ON CONFLICT {conflict}
+            """
+        )
+        written = cur.rowcount
+        cur.execute(f"DROP TABLE {STAGE_TABLE}")
+
+    _report("upsert", table, staged, started, skipped=staged - written)
+    return written
+
+
+def bulk_merge(
+    conn,
+    table: str,
+    columns: Sequence[str],
+    rows: Iterable,
+    statements: Sequence[str],
+    params: Optional[Mapping] = None,
+    method: str = BULK_WRITE_METHOD,
+    page_size: int = BULK_PAGE_SIZE,
+) -> List[int]:
+    """
+    Stream rows into a staging table shaped like `table`'s columns once,
+    then run each statement (which reads from STAGE_TABLE, e.g. to upsert
+    it into several tables at different grains) with `params`.
+    Does not commit. Returns each statement's rowcount ([] for no rows).
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return []
+
+    started = time.perf_counter()
+    read = _row_reader(first, columns)
+    values = (read(row) for row in itertools.chain((first,), rows))
+    counts = []
+
+    with conn.cursor() as cur:
+        _create_stage(cur, table, columns)
+        staged = _stage_rows(cur, columns, values, method, page_size)
+        for statement in statements:
+            cur.execute(statement, params)
+            counts.append(cur.rowcount)
+        cur.execute(f"DROP TABLE {STAGE_TABLE}")
+
+    _report("merge", table, staged, started)
+    return counts
+
+
+def bulk_update(
+    conn,
+    table: str,
+    key_columns: Sequence[str],
+    columns: Sequence[str],
+    rows: Iterable,
+    expressions: Optional[Mapping[str, str]] = None,
+    method: str = BULK_WRITE_METHOD,
+    page_size: int = BULK_PAGE_SIZE,
+) -> int:
+    """
+    Stream rows (key_columns + columns) into a staging table, then apply
+    them with one UPDATE ... FROM staging joined on key_columns. Target rows
+    whose columns already hold the staged values are left alone.
+    Does not commit. Returns the number of target rows updated.
+    """
+    expressions = dict(expressions or {})
+
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return 0
+
+    started = time.perf_counter()
+    staged_columns = [*key_columns, *columns]
+    read = _row_reader(first, staged_columns)
+    values = (read(row) for row in itertools.chain((first,), rows))
+
+    assignments = ", ".join(
+        [f"{c} = s.{c}" for c in columns] + [f"{c} = {expr}" for c, expr in expressions.items()]
+    )
+    join = " AND ".join(f"t.{c} = s.{c}" for c in key_columns)
+
+    with conn.cursor() as cur:
+        _create_stage(cur, table, staged_columns)
+        staged = _stage_rows(cur, staged_columns, values, method, page_size)
+        cur.execute(
+            f"""
+            UPDATE {table} AS t
+            SET {assignments}
+            FROM {STAGE_TABLE} s
+            WHERE {join}
+              AND {changed(columns, source="s")}
+            """
+        )
+        updated = cur.rowcount
+        cur.execute(f"DROP TABLE {STAGE_TABLE}")
+
+    _report("update", table, staged, started, skipped=staged - updated)
+    return updated
@@ -0,0 +1,192 @@
+from typing import Iterable, List, Optional, Tuple
+
+from ai_manager.db import get_connection
+
+
+def keyset_params(after_key, until_key=None) -> dict:
+    """
+    Expand (ts, id) keys into the named parameters used by keyset filters.
+    A key with id None (legacy ts-only checkpoint) excludes every row at that ts.
+    """
+    after_ts, after_id = after_key or (None, None)
+    params = {"after_ts": after_ts, "after_id": after_id}
+    if until_key is not None:
+        params["until_ts"], params["until_id"] = until_key
+    return params
+
+
+# Learners are hash-partitioned into shards by a hash Postgres computes the
+# same way on every host. A NULL shard_count disables the filter.
+SHARD_PREDICATE = (
+    "(%(shard_count)s::int IS NULL"
+    " OR mod(hashtext(user_id::text) & 2147483647, %(shard_count)s) = %(shard_index)s)"
+)
+
+
+def shard_params(shard: Optional[Tuple[int, int]] = None) -> dict:
+    """
+    Query params for SHARD_PREDICATE; shard is (index, count) or None.
+    """
+    if not shard or shard[1] <= 1:
+        return {"shard_index": None, "shard_count": None}
+    return {"shard_index": shard[0], "shard_count": shard[1]}
+
+
+# Inclusive user_id range of a backfill, optionally narrowed to listed
+# learners and/or skipping listed learners; NULL bounds / list disable it.
+USER_RANGE_PREDICATE = (
+    "(%(user_from)s::bigint IS NULL OR user_id BETWEEN %(user_from)s AND %(user_to)s)"
+    " AND (%(user_ids)s::bigint[] IS NULL OR user_id = ANY(%(user_ids)s))"
+    " AND user_id <> ALL(%(skip_user_ids)s::bigint[])"
+)
+
+
+def user_range_params(
+    users: Optional[Tuple[int, int]] = None,
+    user_ids: Optional[Iterable[int]] = None,
+    skip_user_ids: Iterable[int] = (),
+) -> dict:
+    """
+    Query params for USER_RANGE_PREDICATE; users is (first, last) or None,
+    user_ids the only learners to keep (None = all), skip_user_ids learners
+    to leave out.
+    """
+    user_from, user_to = users or (None, None)
+    return {
+        "user_from": user_from,
+        "user_to": user_to,
+        "user_ids": list(user_ids) if user_ids is not None else None,
+        "skip_user_ids": list(skip_user_ids),
+    }
+
+
+def next_chunk_bound(
+    table: str,
+    after_key,
+    until_ts,
+    chunk_size: int,
+    where: str = "TRUE",
+    params: Optional[dict] = None,
+) -> Optional[Tuple]:
+    """
+    Find the last (ts, id) of the next keyset chunk of `table` (aliased `a`).
+    Returns (ts, id, attempts) or None when there is nothing left up to until_ts.
+    """
+    sql = f"""
+        SELECT ts, id, COUNT(*) OVER () AS attempts
+        FROM (
+            SELECT a.ts, a.id
+            FROM {table} a
+            WHERE (%(after_ts)s IS NULL OR (a.ts, a.id) > (%(after_ts)s, %(after_id)s))
+              AND a.ts <= %(until_ts)s
+              AND {where}
+            ORDER BY a.ts, a.id
+            LIMIT %(chunk_size)s
+        ) chunk
+        ORDER BY ts DESC, id DESC
+        LIMIT 1;
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                sql,
+                {
+                    **keyset_params(after_key),
+                    **(params or {}),
+                    "until_ts": until_ts,
+                    "chunk_size": chunk_size,
+                },
+            )
+            row = cur.fetchone()
+
+    return tuple(row) if row else None
+
+
+def latest_key(
+    table: str,
+    until_ts,
+    where: str = "TRUE",
+    params: Optional[dict] = None,
+) -> Optional[Tuple]:
+    """
+    The newest (ts, id) of `table` (aliased `a`) at or before until_ts, or
+    None when it has no such rows. One backward step on the (ts, id) index,
+    cheap enough to poll.
+    """
+    sql = f"""
+        SELECT a.ts, a.id
+        FROM {table} a
+        WHERE a.ts <= %(until_ts)s
+          AND {where}
+        ORDER BY a.ts DESC, a.id DESC
+        LIMIT 1;
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, {**(params or {}), "until_ts": until_ts})
+            row = cur.fetchone()
+
+    return tuple(row) if row else None
+
+
+def user_range_bounds(
+    table: str,
+    ranges: int,
+    where: str = "TRUE",
+    params: Optional[dict] = None,
+) -> List[int]:
+    """
+    Upper user_id bounds splitting the attempts of `table` (aliased `a`)
+    into about `ranges` user_id ranges of similar attempt counts: the
+    distinct user_id percentiles at 1/ranges, 2/ranges, ... One full scan.
+    """
+    if ranges <= 1:
+        return []
+
+    sql = f"""
+        SELECT ARRAY(
+            SELECT DISTINCT b
+            FROM unnest(
+                percentile_disc(%(fractions)s::float8[]) WITHIN GROUP (ORDER BY a.user_id)
+            ) AS b
+            WHERE b IS NOT NULL
+            ORDER BY b
+        )
+        FROM {table} a
+        WHERE {where}
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                sql,
+                {**(params or {}), "fractions": [i / ranges for i in range(1, ranges)]},
+            )
+            return list(cur.fetchone()[0] or [])
+
+
+def users_active_after(
+    table: str,
+    after_key,
+    users: Tuple[int, int],
+    where: str = "TRUE",
+    params: Optional[dict] = None,
+) -> List[int]:
+    """
+    Learners of an inclusive (first, last) user_id range with rows of
+    `table` (aliased `a`) past the keyset position after_key.
+    """
+    sql = f"""
+        SELECT DISTINCT a.user_id
+        FROM {table} a
+        WHERE (%(after_ts)s IS NULL OR (a.ts, a.id) > (%(after_ts)s, %(after_id)s))
+          AND a.user_id BETWEEN %(user_from)s AND %(user_to)s
+          AND {where}
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, {**(params or {}), **keyset_params(after_key), **user_range_params(users)})
+            return [user_id for (user_id,) in cur.fetchall()]
@@ -1,98 +1,297 @@
-from typing import Dict, List
+import json
+from typing import Dict, Iterable, List, Tuple
 
 from ai_manager.db import get_connection
+from ai_manager.logging.metrics import instrumented
+from ai_manager.repo.bulk import bulk_merge, bulk_update, bulk_upsert, changed
+from ai_manager.repo.keyset import (
+    SHARD_PREDICATE,
+    USER_RANGE_PREDICATE,
+    keyset_params,
+    latest_key,
+    next_chunk_bound,
+    shard_params,
+    user_range_bounds,
+    user_range_params,
+    users_active_after,
+)
+from ai_manager.repo.rollups import (
+    daily_columns,
+    fetch_lesson_rollups,
+    lesson_rollups_sql,
+    merge_daily_sql,
+    merge_insights_sql,
+)
+from ai_manager.repo.streaming import fetch_records, iter_batches_for_keys, iter_records
 
+MATH_ATTEMPTS_TABLE = "math_attempts"
+LESSON_TOP_WEAK_QUESTIONS = 5
 
-def get_math_question_aggregates(limit: int = 500, since_ts=None) -> List[Dict]:
+MATH_QUESTION_KEY = ("user_id", "lesson_id", "question_id")
+MATH_QUESTION_DAILY_COLUMNS = daily_columns(MATH_QUESTION_KEY)
+
+MATH_LESSON_INSIGHT_COLUMNS = (
+    "user_id",
+    "lesson_id",
+    "attempts_total",
+    "accuracy_rate",
+    "avg_response_ms",
+    "last_attempt_at",
+    "top_weak_question_ids",
+)
+
+MATH_LESSON_ROLLUPS_SQL = lesson_rollups_sql(
+    "public.math_ai_question_insights",
+    "question_id",
+    {"top_weak_question_ids": "ARRAY_AGG(top.question_id ORDER BY {order})"},
+)
+
+
+@instrumented()
+def get_math_attempt_chunk_bound(after_key, until_ts, chunk_size: int, shard=None):
+    """
+    Last (ts, id, attempts) of the next keyset chunk of math_attempts
+    (restricted to one user shard when shard=(index, count) is given).
+    """
+    return next_chunk_bound(
+        MATH_ATTEMPTS_TABLE,
+        after_key,
+        until_ts,
+        chunk_size,
+        where=SHARD_PREDICATE,
+        params=shard_params(shard),
+    )
+
+
+@instrumented()
+def get_math_latest_attempt_key(until_ts, shard=None):
+    """
+    Newest (ts, id) of math_attempts at or before until_ts (scheduler probe),
+    restricted to one user shard when shard=(index, count) is given.
+    """
+    return latest_key(
+        MATH_ATTEMPTS_TABLE,
+        until_ts,
+        where=SHARD_PREDICATE,
+        params=shard_params(shard),
+    )
+
+
+@instrumented()
+def get_math_user_range_bounds(ranges: int) -> List[int]:
+    """
+    user_id bounds splitting math attempts into about `ranges` backfill ranges.
+    """
+    return user_range_bounds(MATH_ATTEMPTS_TABLE, ranges)
+
+
+@instrumented()
+def get_math_active_users(after_key, users: Tuple[int, int], shard=None) -> List[int]:
+    """
+    Learners of a backfill's user_id range (and shard) with maths attempts
+    past the keyset position after_key.
     """
-    Aggregate maths attempts at question level.
+    return users_active_after(MATH_ATTEMPTS_TABLE, after_key, users, where=SHARD_PREDICATE, params=shard_params(shard))
+
+
+@instrumented()
+def get_math_question_aggregates(
+    after_key,
+    until_key,
+    shard=None,
+    users=None,
+    user_ids=None,
+    skip_user_ids=(),
+    stream: bool = False,
+):
+    """
+    Aggregate maths attempts per question and UTC day, as records
+    (streaming.iter_records) in MATH_QUESTION_DAILY_COLUMNS order.
     Reads ONLY from math_attempts.
+    Covers attempts with after_key < (ts, id) <= until_key, optionally
+    restricted to one user shard and/or an inclusive (first, last) user_id
+    range (backfill), narrowed to user_ids / without skip_user_ids.
+    stream=True yields the records from a server-side cursor instead of a
+    list; consume them before the caller's transaction ends.
     """
-    sql = """
+    sql = f"""
         SELECT
             user_id,
             lesson_id,
-            question_id::text AS headword,
+            question_id::text AS question_id,
+            (ts AT TIME ZONE 'UTC')::date AS day,
             COUNT(*) AS attempts_total,
             COUNT(*) FILTER (WHERE is_correct = FALSE) AS attempts_incorrect,
-            AVG(CASE WHEN is_correct THEN 1 ELSE 0 END) AS accuracy_rate,
-            AVG(response_ms) AS avg_response_ms,
+            SUM(response_ms) AS response_ms_sum,
+            COUNT(response_ms) AS response_ms_count,
             MAX(ts) AS last_attempt_at,
-            MAX(ts) FILTER (WHERE is_correct = FALSE) AS last_incorrect_at,
-            (
-                AVG(CASE WHEN is_correct THEN 1 ELSE 0 END) * 0.7
-                + (1 - AVG(CASE WHEN is_correct THEN 1 ELSE 0 END)) * 0.3
-            ) AS weakness_score
+            MAX(ts) FILTER (WHERE is_correct = FALSE) AS last_incorrect_at
         FROM math_attempts
-        WHERE (%(since_ts)s IS NULL OR ts > %(since_ts)s)
-        GROUP BY user_id, lesson_id, question_id
-        ORDER BY last_attempt_at DESC
-        LIMIT %(limit)s
+        WHERE (%(after_ts)s IS NULL OR (ts, id) > (%(after_ts)s, %(after_id)s))
+          AND (ts, id) <= (%(until_ts)s, %(until_id)s)
+          AND {SHARD_PREDICATE}
+          AND {USER_RANGE_PREDICATE}
+        GROUP BY user_id, lesson_id, question_id, (ts AT TIME ZONE 'UTC')::date
     """
 
+    return (iter_records if stream else fetch_records)(
+        sql,
+        {
+            **keyset_params(after_key, until_key),
+            **shard_params(shard),
+            **user_range_params(users, user_ids, skip_user_ids),
+        },
+    )
+
+
+@instrumented(rows_in="rows")
+def upsert_math_question_insights(rows: Iterable[Tuple], model_version: str = "phase1-v1") -> int:
+    """
+    Merge per-(question, day) deltas into math_ai_question_daily and, summed
+    per question, into math_ai_question_insights, from one staging pass.
+    Counts and response-time sums are added to the stored state, and the
+    derived rates are recomputed from the totals.
+    Returns the number of question rows written.
+    """
+    with get_connection() as conn:
+        counts = bulk_merge(
+            conn,
+            "public.math_ai_question_daily",
+            MATH_QUESTION_DAILY_COLUMNS,
+            rows,
+            [
+                merge_daily_sql("public.math_ai_question_daily", MATH_QUESTION_KEY),
+                merge_insights_sql("public.math_ai_question_insights", MATH_QUESTION_KEY),
+            ],
+            params={"model_version": model_version},
+        )
+        conn.commit()
+
+    return counts[-1] if counts else 0
+
+
+@instrumented()
+def delete_math_question_state(users: Tuple[int, int], user_ids=None, skip_user_ids=()) -> int:
+    """
+    Delete the math_ai_question_daily and math_ai_question_insights rows of an
+    inclusive (first, last) user_id range (narrowed to user_ids / without
+    skip_user_ids), before a backfill rebuilds them.
+    Returns the number of question rows deleted.
+    """
+    params = user_range_params(users, user_ids, skip_user_ids)
     with get_connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(sql, {"since_ts": since_ts, "limit": limit})
-            rows = cur.fetchall()
-            cols = [d[0] for d in cur.description]
+            cur.execute(f"DELETE FROM public.math_ai_question_daily WHERE {USER_RANGE_PREDICATE}", params)
+            cur.execute(f"DELETE FROM public.math_ai_question_insights WHERE {USER_RANGE_PREDICATE}", params)
+            deleted = cur.rowcount
+        conn.commit()
 
-    return [dict(zip(cols, r)) for r in rows]
+    return deleted
 
 
-def upsert_math_question_insights(rows: List[Dict], model_version: str = "phase1-v1") -> int:
+def iter_math_question_attempts(question_keys: Iterable[Tuple]):
     """
-    Upsert into math_ai_question_insights.
+    Stream the full attempt history of the given (user_id, lesson_id, question_id)
+    keys as batches of (user_id, lesson_id, question_id, epoch_seconds, is_correct, response_ms).
     """
     sql = """
-        INSERT INTO public.math_ai_question_insights (
+        SELECT
             user_id,
             lesson_id,
-            question_id,
-            attempts_total,
-            attempts_incorrect,
-            accuracy_rate,
-            avg_response_ms,
-            last_attempt_at,
-            last_incorrect_at,
-            weakness_score,
-            evaluated_at,
-            model_version
-        )
-        VALUES (
-            %(user_id)s,
-            %(lesson_id)s,
-            %(headword)s,
-            %(attempts_total)s,
-            %(attempts_incorrect)s,
-            %(accuracy_rate)s,
-            %(avg_response_ms)s,
-            %(last_attempt_at)s,
-            %(last_incorrect_at)s,
-            %(weakness_score)s,
-            NOW(),
-            %(model_version)s
-        )
-        ON CONFLICT (user_id, lesson_id, question_id)
-        DO UPDATE SET
-            attempts_total     = EXCLUDED.attempts_total,
-            attempts_incorrect = EXCLUDED.attempts_incorrect,
-            accuracy_rate      = EXCLUDED.accuracy_rate,
-            avg_response_ms    = EXCLUDED.avg_response_ms,
-            last_attempt_at    = EXCLUDED.last_attempt_at,
-            last_incorrect_at  = EXCLUDED.last_incorrect_at,
-            weakness_score     = EXCLUDED.weakness_score,
-            evaluated_at       = NOW(),
-            model_version      = EXCLUDED.model_version;
+            question_id::text,
+            EXTRACT(EPOCH FROM ts)::float8,
+            is_correct::int,
+            response_ms
+        FROM math_attempts
+        WHERE (user_id, lesson_id, question_id::text) IN %(keys)s
     """
+    return iter_batches_for_keys(sql, question_keys)
 
-    payload = [{**r, "model_version": model_version} for r in rows]
 
-    if not payload:
-        return 0
+@instrumented(rows_in="user_ids")
+def get_math_response_baselines(user_ids: Iterable[int]) -> Dict[int, Tuple]:
+    """
+    Each learner's response-time baseline over all their maths attempts:
+    {user_id: (count, sum, sum_sq)} of response_ms (see scoring.stage).
+    """
+    sql = """
+        SELECT
+            user_id,
+            COUNT(response_ms)::float8,
+            COALESCE(SUM(response_ms), 0)::float8,
+            COALESCE(SUM(response_ms::float8 * response_ms), 0)
+        FROM math_attempts
+        WHERE user_id = ANY(%(user_ids)s::bigint[])
+        GROUP BY user_id
+    """
 
     with get_connection() as conn:
         with conn.cursor() as cur:
-            cur.executemany(sql, payload)
+            cur.execute(sql, {"user_ids": list(user_ids)})
+            return {user_id: tuple(state) for user_id, *state in cur.fetchall()}
+
+
+@instrumented()
+def update_math_question_scores(rows: Iterable[Tuple]) -> int:
+    """
+    Apply (user_id, lesson_id, question_id, weakness_score, model_version) tuples.
+    """
+    with get_connection() as conn:
+        updated = bulk_update(
+            conn,
+            "public.math_ai_question_insights",
+            ("user_id", "lesson_id", "question_id"),
+            ("weakness_score", "model_version"),
+            rows,
+        )
+        conn.commit()
+
+    return updated
+
+
+@instrumented(rows_in="lesson_keys")
+def get_math_lesson_rollups(lesson_keys: Iterable[Tuple], batch_size: int = 1000) -> List[Dict]:
+    """
+    Build lesson-level rollups for the given (user_id, lesson_id) pairs only,
+    derived from math_ai_question_insights, with each lesson's LESSON_TOP_WEAK_QUESTIONS
+    weakest questions.
+    """
+    return fetch_lesson_rollups(MATH_LESSON_ROLLUPS_SQL, lesson_keys, LESSON_TOP_WEAK_QUESTIONS, batch_size)
+
+
+@instrumented(rows_in="rows")
+def upsert_math_lesson_insights(rows: List[Dict], model_version: str = "phase1-v1") -> int:
+    """
+    Controlled upsert into math_ai_lesson_insights from get_math_lesson_rollups.
+    """
+    conflict = f"""
+        (user_id, lesson_id)
+        DO UPDATE SET
+            attempts_total        = EXCLUDED.attempts_total,
+            accuracy_rate         = EXCLUDED.accuracy_rate,
+            avg_response_ms       = EXCLUDED.avg_response_ms,
+            last_attempt_at       = EXCLUDED.last_attempt_at,
+            top_weak_question_ids = EXCLUDED.top_weak_question_ids,
+            evaluated_at          = NOW(),
+            model_version         = EXCLUDED.model_version
+        WHERE {changed(MATH_LESSON_INSIGHT_COLUMNS[2:] + ("model_version",))}
+    """
+
+    payload = (
+        {**row, "top_weak_question_ids": json.dumps(row["top_weak_question_ids"])}
+        for row in rows
+    )
+
+    with get_connection() as conn:
+        written = bulk_upsert(
+            conn,
+            "public.math_ai_lesson_insights",
+            MATH_LESSON_INSIGHT_COLUMNS,
+            payload,
+            conflict,
+            constants={"model_version": model_version},
+            expressions={"evaluated_at": "NOW()"},
+        )
         conn.commit()
 
-    return len(payload)
+    return written
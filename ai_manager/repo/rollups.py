@@ -0,0 +1,228 @@
+from typing import Sequence
+
+from ai_manager.db import get_connection
+from ai_manager.repo.bulk import STAGE_TABLE
+
+# Additive per-day state of one item, after its key columns.
+DAILY_STATE_COLUMNS = (
+    "day",
+    "attempts_total",
+    "attempts_incorrect",
+    "response_ms_sum",
+    "response_ms_count",
+    "last_attempt_at",
+    "last_incorrect_at",
+)
+
+# phase1-v1 weakness from an accuracy expression.
+_WEAKNESS = "({accuracy}) * 0.7 + (1 - ({accuracy})) * 0.3"
+
+
+def daily_columns(key_columns: Sequence[str], carried: Sequence[str] = ()) -> tuple:
+    """
+    Columns of a daily rollup delta row (and of its staging table).
+    carried: non-key columns stored alongside, e.g. course_id.
+    """
+    return (*key_columns, *carried, *DAILY_STATE_COLUMNS)
+
+
+def _summed_state(key_columns: Sequence[str], carried: Sequence[str]) -> str:
+    return ",\n".join(
+        [
+            *key_columns,
+            *(f"MAX({c}) AS {c}" for c in carried),
+            "SUM(attempts_total) AS attempts_total",
+            "SUM(attempts_incorrect) AS attempts_incorrect",
+            "SUM(response_ms_sum) AS response_ms_sum",
+            "SUM(response_ms_count) AS response_ms_count",
+            "MAX(last_attempt_at) AS last_attempt_at",
+            "MAX(last_incorrect_at) AS last_incorrect_at",
+        ]
+    )
+
+
+def _merged_state() -> str:
+    total = "(t.attempts_total + EXCLUDED.attempts_total)"
+    incorrect = "(t.attempts_incorrect + EXCLUDED.attempts_incorrect)"
+    ms_sum = "(COALESCE(t.response_ms_sum, 0) + COALESCE(EXCLUDED.response_ms_sum, 0))"
+    ms_count = "(COALESCE(t.response_ms_count, 0) + COALESCE(EXCLUDED.response_ms_count, 0))"
+    accuracy = f"1 - {incorrect}::numeric / NULLIF({total}, 0)"
+    return f"""
+        attempts_total     = {total},
+        attempts_incorrect = {incorrect},
+        response_ms_sum    = {ms_sum},
+        response_ms_count  = {ms_count},
+        accuracy_rate      = {accuracy},
+        avg_response_ms    = {ms_sum} / NULLIF({ms_count}, 0),
+        last_attempt_at    = GREATEST(t.last_attempt_at, EXCLUDED.last_attempt_at),
+        last_incorrect_at  = GREATEST(t.last_incorrect_at, EXCLUDED.last_incorrect_at),
+        weakness_score     = {_WEAKNESS.format(accuracy=accuracy)}"""
+
+
+def merge_daily_sql(table: str, key_columns: Sequence[str], carried: Sequence[str] = ()) -> str:
+    """
+    Add the staged per-day deltas (collapsed per key and day) into a daily
+    rollup table keyed on (*key_columns, day).
+    """
+    keys = [*key_columns, "day"]
+    columns = ", ".join([*keys, *carried, *DAILY_STATE_COLUMNS[1:]])
+    return f"""
+        INSERT INTO {table} AS t ({columns})
+        SELECT {_summed_state(keys, carried)}
+        FROM {STAGE_TABLE}
+        GROUP BY {", ".join(keys)}
+        ON CONFLICT ({", ".join(keys)})
+        DO UPDATE SET
+            attempts_total     = t.attempts_total + EXCLUDED.attempts_total,
+            attempts_incorrect = t.attempts_incorrect + EXCLUDED.attempts_incorrect,
+            response_ms_sum    = COALESCE(t.response_ms_sum, 0) + COALESCE(EXCLUDED.response_ms_sum, 0),
+            response_ms_count  = COALESCE(t.response_ms_count, 0) + COALESCE(EXCLUDED.response_ms_count, 0),
+            last_attempt_at    = GREATEST(t.last_attempt_at, EXCLUDED.last_attempt_at),
+            last_incorrect_at  = GREATEST(t.last_incorrect_at, EXCLUDED.last_incorrect_at)
+    """
+
+
+def merge_insights_sql(
+    table: str,
+    key_columns: Sequence[str],
+    carried: Sequence[str] = (),
+    constants: Sequence[str] = ("model_version",),
+) -> str:
+    """
+    Merge the staged per-day deltas, summed per item, into an all-time
+    insight table keyed on key_columns: counts and response-time sums are
+    added to the stored state and the rates recomputed from the totals.
+    constants are %(name)s query params written to every row.
+    """
+    accuracy = "1 - attempts_incorrect::numeric / NULLIF(attempts_total, 0)"
+    columns = [
+        *key_columns,
+        *carried,
+        "attempts_total",
+        "attempts_incorrect",
+        "response_ms_sum",
+        "response_ms_count",
+        "last_attempt_at",
+        "last_incorrect_at",
+        "accuracy_rate",
+        "avg_response_ms",
+        "weakness_score",
+        "evaluated_at",
+        *constants,
+    ]
+    select_list = ",\n".join(
+        [
+            *key_columns,
+            *carried,
+            "attempts_total",
+            "attempts_incorrect",
+            "response_ms_sum",
+            "response_ms_count",
+            "last_attempt_at",
+            "last_incorrect_at",
+            accuracy,
+            "response_ms_sum / NULLIF(response_ms_count, 0)",
+            _WEAKNESS.format(accuracy=accuracy),
+            "NOW()",
+            *(f"%({c})s" for c in constants),
+        ]
+    )
+    updates = "".join(f",\n        {c} = EXCLUDED.{c}" for c in ["evaluated_at", *constants])
+    return f"""
+        INSERT INTO {table} AS t ({", ".join(columns)})
+        SELECT {select_list}
+        FROM (
+            SELECT {_summed_state(key_columns, carried)}
+            FROM {STAGE_TABLE}
+            GROUP BY {", ".join(key_columns)}
+        ) delta
+        ON CONFLICT ({", ".join(key_columns)})
+        DO UPDATE SET{_merged_state()}{updates}
+    """
+
+
+def lesson_rollups_sql(
+    table: str,
+    item_column: str,
+    top_columns: dict,
+    top_join: str = "",
+    carried: Sequence[str] = (),
+) -> str:
+    """
+    Lesson rollups of an item insight table (aliased `wi`) for the
+    (user_id, lesson_id) pairs passed as %(user_ids)s / %(lesson_ids)s arrays:
+    totals, rates and the top %(top_k)s weakest items. Each lesson's top
+    items come from its own LIMIT query (a bounded top-N heap over that
+    lesson's rows, reached through the primary key), so no full sort.
+
+    top_columns: output name -> aggregate over the top rows (aliased `top`,
+                 ordered weakest first), e.g. ARRAY_AGG(top.word_id ...)
+    top_join:    joined onto the top rows, e.g. to look up headwords
+    carried:     item columns kept per lesson (MAX), e.g. course_id
+    """
+    order = f"top.weakness_score DESC NULLS LAST, top.{item_column}"
+    top_list = ",\n".join(
+        f"{expr.format(order=order)} AS {name}" for name, expr in top_columns.items()
+    )
+    return f"""
+        SELECT
+            k.user_id,
+            {"".join(f"s.{c}, " for c in carried)}k.lesson_id,
+            s.attempts_total,
+            s.attempts_incorrect,
+            s.accuracy_rate,
+            s.avg_response_ms,
+            s.last_attempt_at,
+            s.last_incorrect_at,
+            {", ".join(f"t.{name}" for name in top_columns)}
+        FROM unnest(%(user_ids)s::bigint[], %(lesson_ids)s::bigint[]) AS k(user_id, lesson_id)
+        CROSS JOIN LATERAL (
+            SELECT
+                {"".join(f"MAX(wi.{c}) AS {c}, " for c in carried)}SUM(wi.attempts_total) AS attempts_total,
+                SUM(wi.attempts_incorrect) AS attempts_incorrect,
+                1 - SUM(wi.attempts_incorrect)::numeric / NULLIF(SUM(wi.attempts_total), 0) AS accuracy_rate,
+                SUM(wi.response_ms_sum) / NULLIF(SUM(wi.response_ms_count), 0) AS avg_response_ms,
+                MAX(wi.last_attempt_at) AS last_attempt_at,
+                MAX(wi.last_incorrect_at) AS last_incorrect_at
+            FROM {table} wi
+            WHERE wi.user_id = k.user_id AND wi.lesson_id = k.lesson_id
+        ) s
+        CROSS JOIN LATERAL (
+            SELECT {top_list}
+            FROM (
+                SELECT wi.{item_column}, wi.weakness_score
+                FROM {table} wi
+                WHERE wi.user_id = k.user_id AND wi.lesson_id = k.lesson_id
+                ORDER BY wi.weakness_score DESC NULLS LAST, wi.{item_column}
+                LIMIT %(top_k)s
+            ) top
+            {top_join}
+        ) t
+        WHERE s.attempts_total IS NOT NULL
+    """
+
+
+def fetch_lesson_rollups(sql: str, lesson_keys, top_k: int, batch_size: int = 1000) -> list:
+    """
+    Run a lesson_rollups_sql() query for (user_id, lesson_id) pairs in
+    batches; returns one dict per lesson that has insight rows.
+    """
+    lesson_keys = list(lesson_keys)
+    result = []
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            for start in range(0, len(lesson_keys), batch_size):
+                batch = lesson_keys[start:start + batch_size]
+                cur.execute(
+                    sql,
+                    {
+                        "user_ids": [user_id for user_id, _ in batch],
+                        "lesson_ids": [lesson_id for _, lesson_id in batch],
+                        "top_k": top_k,
+                    },
+                )
+                cols = [desc[0] for desc in cur.description]
+                result.extend(dict(zip(cols, row)) for row in cur.fetchall())
+
+    return result
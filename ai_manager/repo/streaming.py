@@ -0,0 +1,83 @@
+import itertools
+from collections import namedtuple
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from ai_manager.db import get_connection
+
+STREAM_ITERSIZE = 10000
+
+
+@lru_cache(maxsize=None)
+def record_type(fields: Tuple[str, ...]):
+    """
+    Tuple-backed record class for a result's columns: rows are read by
+    attribute (row.user_id) and carry no per-row dict.
+    """
+    return namedtuple("Record", fields)
+
+
+def iter_records(
+    sql: str,
+    params: Optional[dict] = None,
+    name: str = "ai_record_stream",
+    itersize: int = STREAM_ITERSIZE,
+) -> Iterator[tuple]:
+    """
+    Run `sql` through a named server-side cursor and yield its rows as
+    records, fetching itersize rows per round-trip. Only one batch of raw
+    rows is held at a time; consume it fully before the transaction ends.
+    """
+    with get_connection() as conn:
+        with conn.cursor(name=name) as cur:
+            cur.itersize = itersize
+            cur.execute(sql, params)
+            record = None
+            while True:
+                rows = cur.fetchmany(itersize)
+                if not rows:
+                    return
+                if record is None:
+                    record = record_type(tuple(d[0] for d in cur.description))
+                yield from map(record._make, rows)
+
+
+def fetch_records(
+    sql: str,
+    params: Optional[dict] = None,
+    name: str = "ai_record_stream",
+    itersize: int = STREAM_ITERSIZE,
+) -> List[tuple]:
+    """
+    iter_records() collected into a list (one compact copy of the result).
+    """
+    return list(iter_records(sql, params, name=name, itersize=itersize))
+
+
+def iter_batches_for_keys(
+    sql: str,
+    keys: Iterable[tuple],
+    params: Optional[dict] = None,
+    key_batch_size: int = 1000,
+    itersize: int = STREAM_ITERSIZE,
+):
+    """
+    Run `sql` (which filters on `IN %(keys)s`) for each batch of keys
+    through a named server-side cursor, yielding lists of up to itersize rows.
+    """
+    keys = iter(keys)
+
+    with get_connection() as conn:
+        while True:
+            key_batch = tuple(itertools.islice(keys, key_batch_size))
+            if not key_batch:
+                return
+
+            with conn.cursor(name="ai_keyed_stream") as cur:
+                cur.itersize = itersize
+                cur.execute(sql, {**(params or {}), "keys": key_batch})
+                while True:
+                    rows: List[tuple] = cur.fetchmany(itersize)
+                    if not rows:
+                        break
+                    yield rows
@@ -0,0 +1,183 @@
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ai_manager.db import get_connection
+from ai_manager.logging.metrics import instrumented
+from ai_manager.repo.bulk import bulk_upsert
+
+SUMMARY_BATCH_TABLE = "public.synonym_ai_summary_batches"
+SUMMARY_BATCH_LESSONS_TABLE = "public.synonym_ai_summary_batch_lessons"
+
+
+@instrumented()
+def record_summary_batch(
+    batch_id: str,
+    input_file_id: str,
+    model: str,
+    model_version: str,
+    lesson_count: int,
+    status: str,
+    job_run_id: str = None,
+    shared_lessons: Optional[Dict[str, list]] = None,
+):
+    """
+    Record a submitted batch. shared_lessons maps a line's cache_key to the
+    further [user_id, lesson_id] pairs that get its summary as well.
+    """
+    sql = f"""
+        INSERT INTO {SUMMARY_BATCH_TABLE}
+            (batch_id, input_file_id, model, model_version, lesson_count, status, job_run_id, shared_lessons)
+        VALUES (%(batch_id)s, %(input_file_id)s, %(model)s, %(model_version)s,
+                %(lesson_count)s, %(status)s, %(job_run_id)s, %(shared_lessons)s::jsonb)
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                sql,
+                {
+                    "batch_id": batch_id,
+                    "input_file_id": input_file_id,
+                    "model": model,
+                    "model_version": model_version,
+                    "lesson_count": lesson_count,
+                    "status": status,
+                    "job_run_id": job_run_id,
+                    "shared_lessons": json.dumps(shared_lessons) if shared_lessons else None,
+                },
+            )
+        conn.commit()
+
+
+@instrumented(rows_in="lessons")
+def record_summary_batch_lessons(batch_id: str, lessons: Iterable[Tuple]) -> int:
+    """
+    Make each (user_id, lesson_id, cache_key) the lesson's latest submitted
+    prompt, owned by batch_id.
+    """
+    # One upsert statement cannot update the same lesson twice.
+    lessons = {(user_id, lesson_id): cache_key for user_id, lesson_id, cache_key in lessons}
+    conflict = """
+        (user_id, lesson_id)
+        DO UPDATE SET
+            cache_key = EXCLUDED.cache_key,
+            batch_id  = EXCLUDED.batch_id
+    """
+
+    with get_connection() as conn:
+        written = bulk_upsert(
+            conn,
+            SUMMARY_BATCH_LESSONS_TABLE,
+            ("user_id", "lesson_id", "cache_key"),
+            [(user_id, lesson_id, cache_key) for (user_id, lesson_id), cache_key in lessons.items()],
+            conflict,
+            constants={"batch_id": batch_id},
+        )
+        conn.commit()
+
+    return written
+
+
+@instrumented(rows_in="lessons")
+def get_latest_summary_keys(lessons: Iterable[Tuple]) -> Dict[Tuple, str]:
+    """
+    {(user_id, lesson_id): cache_key} of the latest submitted prompt of the
+    given lessons; lessons never submitted are absent.
+    """
+    lessons = list(lessons)
+    if not lessons:
+        return {}
+
+    sql = f"""
+        SELECT b.user_id, b.lesson_id, b.cache_key
+        FROM {SUMMARY_BATCH_LESSONS_TABLE} b
+        JOIN unnest(%(user_ids)s::bigint[], %(lesson_ids)s::bigint[]) AS k(user_id, lesson_id)
+          ON k.user_id = b.user_id AND k.lesson_id = b.lesson_id
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                sql,
+                {
+                    "user_ids": [user_id for user_id, _ in lessons],
+                    "lesson_ids": [lesson_id for _, lesson_id in lessons],
+                },
+            )
+            return {(user_id, lesson_id): cache_key for user_id, lesson_id, cache_key in cur.fetchall()}
+
+
+@instrumented()
+def get_pending_summary_batches() -> List[dict]:
+    """
+    Submitted batches not applied yet, oldest first.
+    """
+    sql = f"""
+        SELECT batch_id, model, model_version, lesson_count, status, shared_lessons
+        FROM {SUMMARY_BATCH_TABLE}
+        WHERE finished_at IS NULL
+        ORDER BY submitted_at
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql)
+            cols = [desc[0] for desc in cur.description]
+            return [dict(zip(cols, row)) for row in cur.fetchall()]
+
+
+@instrumented()
+def claim_summary_batch(batch_id: str) -> bool:
+    """
+    Lock a pending batch row for the current transaction, so concurrent
+    runs never apply the same batch twice. False if it is already locked
+    or finished.
+    """
+    sql = f"""
+        SELECT 1
+        FROM {SUMMARY_BATCH_TABLE}
+        WHERE batch_id = %(batch_id)s
+          AND finished_at IS NULL
+        FOR UPDATE SKIP LOCKED
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, {"batch_id": batch_id})
+            return cur.fetchone() is not None
+
+
+@instrumented()
+def update_summary_batch(
+    batch_id: str,
+    status: str,
+    finished: bool = False,
+    applied: Optional[int] = None,
+    failed: Optional[int] = None,
+):
+    """
+    Store the batch's latest API status; finished=True closes it with the
+    number of summaries applied and failed.
+    """
+    sql = f"""
+        UPDATE {SUMMARY_BATCH_TABLE}
+        SET status = %(status)s,
+            finished_at = CASE WHEN %(finished)s THEN NOW() END,
+            summaries_applied = %(applied)s,
+            summaries_failed = %(failed)s
+        WHERE batch_id = %(batch_id)s
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                sql,
+                {
+                    "batch_id": batch_id,
+                    "status": status,
+                    "finished": finished,
+                    "applied": applied,
+                    "failed": failed,
+                },
+            )
+        conn.commit()
@@ -0,0 +1,95 @@
+from typing import Dict, Iterable, List
+
+from ai_manager.db import get_connection
+from ai_manager.logging.metrics import instrumented
+from ai_manager.repo.bulk import bulk_upsert
+
+SUMMARY_CACHE_TABLE = "public.synonym_ai_summary_cache"
+
+
+@instrumented(rows_in="cache_keys")
+def get_cached_summaries(cache_keys: List[str], ttl_seconds: int) -> Dict[str, str]:
+    """
+    Look up unexpired summaries and mark them as used (for LRU eviction).
+    Returns {cache_key: summary_text} for the hits.
+    """
+    if not cache_keys:
+        return {}
+
+    sql = f"""
+        UPDATE {SUMMARY_CACHE_TABLE}
+        SET last_used_at = NOW()
+        WHERE cache_key = ANY(%(cache_keys)s)
+          AND created_at > NOW() - make_interval(secs => %(ttl_seconds)s)
+        RETURNING cache_key, summary_text
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(sql, {"cache_keys": list(cache_keys), "ttl_seconds": ttl_seconds})
+            rows = cur.fetchall()
+        conn.commit()
+
+    return dict(rows)
+
+
+@instrumented(rows_in="entries")
+def put_cached_summaries(entries: Iterable[Dict], model: str) -> int:
+    """
+    Store {cache_key, summary_text} entries generated by `model`. Entries
+    repeating a cache_key are collapsed (last one wins), since one upsert
+    statement cannot update the same row twice.
+    """
+    entries = {entry["cache_key"]: entry for entry in entries}.values()
+    conflict = """
+        (cache_key)
+        DO UPDATE SET
+            summary_text = EXCLUDED.summary_text,
+            model        = EXCLUDED.model,
+            created_at   = NOW(),
+            last_used_at = NOW()
+    """
+
+    with get_connection() as conn:
+        written = bulk_upsert(
+            conn,
+            SUMMARY_CACHE_TABLE,
+            ("cache_key", "summary_text"),
+            entries,
+            conflict,
+            constants={"model": model},
+            expressions={"created_at": "NOW()", "last_used_at": "NOW()"},
+        )
+        conn.commit()
+
+    return written
+
+
+@instrumented()
+def evict_summary_cache(ttl_seconds: int, max_entries: int) -> int:
+    """
+    Drop expired entries, then the least recently used beyond max_entries.
+    """
+    expire_sql = f"""
+        DELETE FROM {SUMMARY_CACHE_TABLE}
+        WHERE created_at <= NOW() - make_interval(secs => %(ttl_seconds)s)
+    """
+    overflow_sql = f"""
+        DELETE FROM {SUMMARY_CACHE_TABLE}
+        WHERE cache_key IN (
+            SELECT cache_key
+            FROM {SUMMARY_CACHE_TABLE}
+            ORDER BY last_used_at DESC
+            OFFSET %(max_entries)s
+        )
+    """
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(expire_sql, {"ttl_seconds": ttl_seconds})
+            evicted = cur.rowcount
+            cur.execute(overflow_sql, {"max_entries": max_entries})
+            evicted += cur.rowcount
+        conn.commit()
+
+    return evicted
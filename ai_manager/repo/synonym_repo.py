@@ -1,199 +1,315 @@
 # ai_manager/repo/synonym_repo.py
 import json
-from typing import List, Dict
+from typing import Dict, Iterable, List, Tuple
 from ai_manager.db import get_connection
+from ai_manager.logging.metrics import instrumented
+from ai_manager.repo.bulk import bulk_merge, bulk_update, bulk_upsert, changed
+from ai_manager.repo.keyset import (
+    SHARD_PREDICATE,
+    USER_RANGE_PREDICATE,
+    keyset_params,
+    latest_key,
+    next_chunk_bound,
+    shard_params,
+    user_range_bounds,
+    user_range_params,
+    users_active_after,
+)
+from ai_manager.repo.rollups import (
+    daily_columns,
+    fetch_lesson_rollups,
+    lesson_rollups_sql,
+    merge_daily_sql,
+    merge_insights_sql,
+)
+from ai_manager.repo.streaming import fetch_records, iter_batches_for_keys, iter_records
 
 SYNONYM_COURSE_IDS = (2, 3, 4, 5, 6, 7, 8, 9)
+SYNONYM_ATTEMPTS_TABLE = "public.attempts"
+LESSON_TOP_WEAK_WORDS = 5
 
+SYNONYM_WORD_KEY = ("user_id", "lesson_id", "word_id")
+SYNONYM_WORD_DAILY_COLUMNS = daily_columns(SYNONYM_WORD_KEY, carried=("course_id",))
 
-def get_synonym_word_aggregates(limit: int = 500, since_ts=None) -> List[Dict]:
+SYNONYM_LESSON_INSIGHT_COLUMNS = (
+    "user_id",
+    "course_id",
+    "lesson_id",
+    "accuracy_rate",
+    "avg_response_ms",
+    "last_attempt_at",
+    "top_weak_word_ids",
+)
+# A lesson row is rewritten only when one of these changed (not for a new
+# job_run_id alone), or its scoring model_version did. Summary write-backs
+# tag model_version "<version>+llm", so the tag is ignored in the comparison.
+SYNONYM_LESSON_CHANGE_COLUMNS = (
+    "accuracy_rate",
+    "avg_response_ms",
+    "last_attempt_at",
+    "top_weak_word_ids",
+)
+
+SYNONYM_LESSON_ROLLUPS_SQL = lesson_rollups_sql(
+    "synonym_ai_word_insights",
+    "word_id",
+    {
+        "top_weak_word_ids": "ARRAY_AGG(top.word_id ORDER BY {order})",
+        "top_weak_headwords": "ARRAY_AGG(w.headword ORDER BY {order})",
+    },
+    top_join="LEFT JOIN public.words w ON w.word_id = top.word_id",
+    carried=("course_id",),
+)
+
+
+@instrumented()
+def get_synonym_attempt_chunk_bound(after_key, until_ts, chunk_size: int, shard=None):
+    """
+    Last (ts, id, attempts) of the next keyset chunk of synonym attempts
+    (restricted to one user shard when shard=(index, count) is given).
+    """
+    return next_chunk_bound(
+        SYNONYM_ATTEMPTS_TABLE,
+        after_key,
+        until_ts,
+        chunk_size,
+        where=f"a.course_id = ANY(%(course_ids)s) AND {SHARD_PREDICATE}",
+        params={"course_ids": list(SYNONYM_COURSE_IDS), **shard_params(shard)},
+    )
+
+
+@instrumented()
+def get_synonym_latest_attempt_key(until_ts, shard=None):
+    """
+    Newest (ts, id) of synonym attempts at or before until_ts (scheduler probe),
+    restricted to one user shard when shard=(index, count) is given.
+    """
+    return latest_key(
+        SYNONYM_ATTEMPTS_TABLE,
+        until_ts,
+        where=f"a.course_id = ANY(%(course_ids)s) AND {SHARD_PREDICATE}",
+        params={"course_ids": list(SYNONYM_COURSE_IDS), **shard_params(shard)},
+    )
+
+
+@instrumented()
+def get_synonym_user_range_bounds(ranges: int) -> List[int]:
     """
-    Aggregate synonym attempts at word level.
+    user_id bounds splitting synonym attempts into about `ranges` backfill ranges.
+    """
+    return user_range_bounds(
+        SYNONYM_ATTEMPTS_TABLE,
+        ranges,
+        where="a.course_id = ANY(%(course_ids)s)",
+        params={"course_ids": list(SYNONYM_COURSE_IDS)},
+    )
+
+
+@instrumented()
+def get_synonym_active_users(after_key, users: Tuple[int, int], shard=None) -> List[int]:
+    """
+    Learners of a backfill's user_id range (and shard) with synonym attempts
+    past the keyset position after_key.
+    """
+    return users_active_after(
+        SYNONYM_ATTEMPTS_TABLE,
+        after_key,
+        users,
+        where=f"a.course_id = ANY(%(course_ids)s) AND a.headword IS NOT NULL AND {SHARD_PREDICATE}",
+        params={"course_ids": list(SYNONYM_COURSE_IDS), **shard_params(shard)},
+    )
+
+
+@instrumented()
+def get_synonym_word_aggregates(
+    after_key,
+    until_key,
+    shard=None,
+    users=None,
+    user_ids=None,
+    skip_user_ids=(),
+    stream: bool = False,
+):
+    """
+    Aggregate synonym attempts per word and UTC day, as records
+    (streaming.iter_records).
     Source of truth: public.attempts
-    Map attempts.headword -> canonical word_id (words.word_id).
+    Groups on the normalized headword (headword_key); word_id is NULL until
+    word_resolver.resolve_word_ids() maps it to the canonical word_id.
+    Covers attempts with after_key < (a.ts, a.id) <= until_key, optionally
+    restricted to one user shard and/or an inclusive (first, last) user_id
+    range (backfill), narrowed to user_ids / without skip_user_ids.
+    stream=True yields the records from a server-side cursor instead of a
+    list; consume them before the caller's transaction ends.
     """
-    sql = """
+    sql = f"""
         SELECT
             a.user_id,
-            a.course_id,
             a.lesson_id,
-            w.word_id AS word_id,
+            LOWER(a.headword) AS headword_key,
+            NULL::bigint AS word_id,
+            MAX(a.course_id) AS course_id,
+            (a.ts AT TIME ZONE 'UTC')::date AS day,
             COUNT(*) AS attempts_total,
             COUNT(*) FILTER (WHERE a.is_correct = FALSE) AS attempts_incorrect,
-            AVG(CASE WHEN a.is_correct THEN 1 ELSE 0 END) AS accuracy_rate,
-            AVG(a.response_ms) AS avg_response_ms,
+            SUM(a.response_ms) AS response_ms_sum,
+            COUNT(a.response_ms) AS response_ms_count,
             MAX(a.ts) AS last_attempt_at,
-            MAX(a.ts) FILTER (WHERE a.is_correct = FALSE) AS last_incorrect_at,
-            (
-                AVG(CASE WHEN a.is_correct THEN 1 ELSE 0 END) * 0.7
-                + (1 - AVG(CASE WHEN a.is_correct THEN 1 ELSE 0 END)) * 0.3
-            ) AS weakness_score
+            MAX(a.ts) FILTER (WHERE a.is_correct = FALSE) AS last_incorrect_at
         FROM public.attempts a
-        JOIN public.words w
-          ON LOWER(w.headword) = LOWER(a.headword)
         WHERE a.course_id = ANY(%(course_ids)s)
           AND a.headword IS NOT NULL
-          AND (%(since_ts)s IS NULL OR a.ts > %(since_ts)s)
-        GROUP BY a.user_id, a.course_id, a.lesson_id, w.word_id
-        ORDER BY last_attempt_at DESC
-        LIMIT %(limit)s;
+          AND (%(after_ts)s IS NULL OR (a.ts, a.id) > (%(after_ts)s, %(after_id)s))
+          AND (a.ts, a.id) <= (%(until_ts)s, %(until_id)s)
+          AND {SHARD_PREDICATE}
+          AND {USER_RANGE_PREDICATE}
+        GROUP BY a.user_id, a.lesson_id, LOWER(a.headword), (a.ts AT TIME ZONE 'UTC')::date
     """
 
-    with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(sql, {"course_ids": list(SYNONYM_COURSE_IDS), "since_ts": since_ts, "limit": limit})
-            rows = cur.fetchall()
-            cols = [d[0] for d in cur.description]
-
-    return [dict(zip(cols, r)) for r in rows]
+    return (iter_records if stream else fetch_records)(
+        sql,
+        {
+            "course_ids": list(SYNONYM_COURSE_IDS),
+            **keyset_params(after_key, until_key),
+            **shard_params(shard),
+            **user_range_params(users, user_ids, skip_user_ids),
+        },
+    )
 
 
 
-def upsert_synonym_word_insights(rows: List[Dict], job_run_id: int = None, model_version: str = "phase1-v1") -> int:
+@instrumented(rows_in="rows")
+def upsert_synonym_word_insights(rows: Iterable[Tuple], job_run_id: int = None, model_version: str = "phase1-v1") -> int:
     """
-    Controlled upsert into synonym_ai_word_insights.
-    Expects rows from get_synonym_word_aggregates().
+    Merge per-(word, day) deltas from get_synonym_word_aggregates() (with
+    word_id resolved) into synonym_ai_word_daily and, summed per word, into
+    synonym_ai_word_insights, from one staging pass.
+    Counts and response-time sums are added to the stored state, and the
+    derived rates are recomputed from the totals.
+    Returns the number of word rows written.
     """
-    sql = """
-        INSERT INTO synonym_ai_word_insights (
-            user_id,
-            course_id,
-            lesson_id,
-            word_id,
-            attempts_total,
-            attempts_incorrect,
-            accuracy_rate,
-            avg_response_ms,
-            last_attempt_at,
-            last_incorrect_at,
-            weakness_score,
-            evaluated_at,
-            model_version,
-            job_run_id
-        )
-        VALUES (
-            %(user_id)s,
-            %(course_id)s,
-            %(lesson_id)s,
-            %(word_id)s,
-            %(attempts_total)s,
-            %(attempts_incorrect)s,
-            %(accuracy_rate)s,
-            %(avg_response_ms)s,
-            %(last_attempt_at)s,
-            %(last_incorrect_at)s,
-            %(weakness_score)s,
-            NOW(),
-            %(model_version)s,
-            %(job_run_id)s
+    with get_connection() as conn:
+        counts = bulk_merge(
+            conn,
+            "public.synonym_ai_word_daily",
+            SYNONYM_WORD_DAILY_COLUMNS,
+            rows,
+            [
+                merge_daily_sql("public.synonym_ai_word_daily", SYNONYM_WORD_KEY, carried=("course_id",)),
+                merge_insights_sql(
+                    "synonym_ai_word_insights",
+                    SYNONYM_WORD_KEY,
+                    carried=("course_id",),
+                    constants=("model_version", "job_run_id"),
+                ),
+            ],
+            params={"model_version": model_version, "job_run_id": job_run_id},
         )
-        ON CONFLICT (user_id, lesson_id, word_id)
-        DO UPDATE SET
-            attempts_total      = EXCLUDED.attempts_total,
-            attempts_incorrect  = EXCLUDED.attempts_incorrect,
-            accuracy_rate       = EXCLUDED.accuracy_rate,
-            avg_response_ms     = EXCLUDED.avg_response_ms,
-            last_attempt_at     = EXCLUDED.last_attempt_at,
-            last_incorrect_at   = EXCLUDED.last_incorrect_at,
-            weakness_score      = EXCLUDED.weakness_score,
-            evaluated_at        = NOW(),
-            model_version       = EXCLUDED.model_version,
-            job_run_id          = EXCLUDED.job_run_id;
-    """
-
-    payload = []
-    for row in rows:
-        payload.append({
-            "user_id": row["user_id"],
-            "course_id": row["course_id"],
-            "lesson_id": row["lesson_id"],
-            "word_id": row["word_id"],
-            "attempts_total": row["attempts_total"],
-            "attempts_incorrect": row["attempts_incorrect"],
-            "accuracy_rate": row["accuracy_rate"],
-            "avg_response_ms": row["avg_response_ms"],
-            "last_attempt_at": row["last_attempt_at"],
-            "last_incorrect_at": row["last_incorrect_at"],
-            "weakness_score": row["weakness_score"],
-            "model_version": model_version,
-            "job_run_id": job_run_id,
-        })
-
-    if not payload:
-        return 0
+        conn.commit()
+
+    return counts[-1] if counts else 0
+
 
+@instrumented()
+def delete_synonym_word_state(users: Tuple[int, int], user_ids=None, skip_user_ids=()) -> int:
+    """
+    Delete the synonym_ai_word_daily and synonym_ai_word_insights rows of an
+    inclusive (first, last) user_id range (narrowed to user_ids / without
+    skip_user_ids), before a backfill rebuilds them.
+    Returns the number of word rows deleted.
+    """
+    params = user_range_params(users, user_ids, skip_user_ids)
     with get_connection() as conn:
         with conn.cursor() as cur:
-            cur.executemany(sql, payload)
+            cur.execute(f"DELETE FROM public.synonym_ai_word_daily WHERE {USER_RANGE_PREDICATE}", params)
+            cur.execute(f"DELETE FROM synonym_ai_word_insights WHERE {USER_RANGE_PREDICATE}", params)
+            deleted = cur.rowcount
         conn.commit()
 
-    return len(payload)
+    return deleted
 
 
-def get_synonym_lesson_rollups(limit: int = 200) -> List[Dict]:
+def iter_synonym_word_attempts(word_keys: Iterable[Tuple]):
     """
-    Build lesson-level rollups directly from attempts.
-    One row per (user_id, course_id, lesson_id).
+    Stream the full attempt history of the given (user_id, lesson_id, headword_key)
+    keys as batches of (user_id, lesson_id, headword_key, epoch_seconds, is_correct, response_ms).
     """
     sql = """
         SELECT
             a.user_id,
-            a.course_id,
             a.lesson_id,
-            COUNT(*) AS attempts_total,
-            COUNT(*) FILTER (WHERE a.is_correct = FALSE) AS attempts_incorrect,
-            AVG(CASE WHEN a.is_correct THEN 1 ELSE 0 END) AS accuracy_rate,
-            AVG(a.response_ms) AS avg_response_ms,
-            MAX(a.ts) AS last_attempt_at,
-            MAX(a.ts) FILTER (WHERE a.is_correct = FALSE) AS last_incorrect_at
+            LOWER(a.headword),
+            EXTRACT(EPOCH FROM a.ts)::float8,
+            a.is_correct::int,
+            a.response_ms
         FROM public.attempts a
         WHERE a.course_id = ANY(%(course_ids)s)
-          AND a.lesson_id IS NOT NULL
-        GROUP BY a.user_id, a.course_id, a.lesson_id
-        ORDER BY last_attempt_at DESC
-        LIMIT %(limit)s;
+          AND (a.user_id, a.lesson_id, LOWER(a.headword)) IN %(keys)s
+    """
+    return iter_batches_for_keys(sql, word_keys, params={"course_ids": list(SYNONYM_COURSE_IDS)})
+
+
+@instrumented(rows_in="user_ids")
+def get_synonym_response_baselines(user_ids: Iterable[int]) -> Dict[int, Tuple]:
+    """
+    Each learner's response-time baseline over all their synonym attempts:
+    {user_id: (count, sum, sum_sq)} of response_ms (see scoring.stage).
+    """
+    sql = """
+        SELECT
+            user_id,
+            COUNT(response_ms)::float8,
+            COALESCE(SUM(response_ms), 0)::float8,
+            COALESCE(SUM(response_ms::float8 * response_ms), 0)
+        FROM public.attempts
+        WHERE user_id = ANY(%(user_ids)s::bigint[])
+          AND course_id = ANY(%(course_ids)s)
+        GROUP BY user_id
     """
 
     with get_connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(sql, {"course_ids": list(SYNONYM_COURSE_IDS), "limit": limit})
-            rows = cur.fetchall()
-            cols = [desc[0] for desc in cur.description]
+            cur.execute(sql, {"user_ids": list(user_ids), "course_ids": list(SYNONYM_COURSE_IDS)})
+            return {user_id: tuple(state) for user_id, *state in cur.fetchall()}
+
+
+@instrumented()
+def update_synonym_word_scores(rows: Iterable[Tuple]) -> int:
+    """
+    Apply (user_id, lesson_id, word_id, weakness_score, model_version) tuples.
+    """
+    with get_connection() as conn:
+        updated = bulk_update(
+            conn,
+            "synonym_ai_word_insights",
+            ("user_id", "lesson_id", "word_id"),
+            ("weakness_score", "model_version"),
+            rows,
+        )
+        conn.commit()
 
-    return [dict(zip(cols, row)) for row in rows]
+    return updated
 
 
+@instrumented(rows_in="lesson_keys")
+def get_synonym_lesson_rollups(lesson_keys: Iterable[Tuple], batch_size: int = 1000) -> List[Dict]:
+    """
+    Build lesson-level rollups for the given (user_id, lesson_id) pairs only,
+    derived from synonym_ai_word_insights (never from raw attempts).
+    One row per (user_id, lesson_id), with its LESSON_TOP_WEAK_WORDS
+    weakest words ranked within the lesson.
+    """
+    return fetch_lesson_rollups(SYNONYM_LESSON_ROLLUPS_SQL, lesson_keys, LESSON_TOP_WEAK_WORDS, batch_size)
+
+
+@instrumented(rows_in="rows")
 def upsert_synonym_lesson_insights(rows: List[Dict], job_run_id: int = None, model_version: str = "phase1-v1") -> int:
     """
     Controlled upsert into synonym_ai_lesson_insights.
     Uses derived rollups from synonym_ai_word_insights.
     """
-    sql = """
-        INSERT INTO synonym_ai_lesson_insights (
-            user_id,
-            course_id,
-            lesson_id,
-            accuracy_rate,
-            avg_response_ms,
-            last_attempt_at,
-            top_weak_word_ids,
-            evaluated_at,
-            model_version,
-            job_run_id
-        )
-        VALUES (
-            %(user_id)s,
-            %(course_id)s,
-            %(lesson_id)s,
-            %(accuracy_rate)s,
-            %(avg_response_ms)s,
-            %(last_attempt_at)s,
-            %(top_weak_word_ids)s,
-            NOW(),
-            %(model_version)s,
-            %(job_run_id)s
-        )
-        ON CONFLICT (user_id, lesson_id)
+    conflict = f"""
+        (user_id, lesson_id)
         DO UPDATE SET
             accuracy_rate     = EXCLUDED.accuracy_rate,
             avg_response_ms   = EXCLUDED.avg_response_ms,
@@ -201,32 +317,49 @@ def upsert_synonym_lesson_insights(rows: List[Dict], job_run_id: int = None, mod
             top_weak_word_ids = EXCLUDED.top_weak_word_ids,
             evaluated_at      = NOW(),
             model_version     = EXCLUDED.model_version,
-            job_run_id        = EXCLUDED.job_run_id;
-    """
-
-    payload = []
-    for row in rows:
-        payload.append({
-            "user_id": row["user_id"],
-            "course_id": row["course_id"],
-            "lesson_id": row["lesson_id"],
-            "accuracy_rate": row["accuracy_rate"],
-            "avg_response_ms": row["avg_response_ms"],
-            "last_attempt_at": row["last_attempt_at"],
-            "top_weak_word_ids": json.dumps(row["top_weak_word_ids"]),
-            "model_version": model_version,
-            "job_run_id": job_run_id,
-        })
-
-    if not payload:
-        return 0
+            job_run_id        = EXCLUDED.job_run_id
+        WHERE {changed(SYNONYM_LESSON_CHANGE_COLUMNS)}
+           OR split_part(t.model_version, '+', 1) IS DISTINCT FROM EXCLUDED.model_version
+    """
+
+    payload = (
+        {**row, "top_weak_word_ids": json.dumps(row["top_weak_word_ids"])}
+        for row in rows
+    )
 
     with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.executemany(sql, payload)
+        written = bulk_upsert(
+            conn,
+            "synonym_ai_lesson_insights",
+            SYNONYM_LESSON_INSIGHT_COLUMNS,
+            payload,
+            conflict,
+            constants={"model_version": model_version, "job_run_id": job_run_id},
+            expressions={"evaluated_at": "NOW()"},
+        )
         conn.commit()
 
-    return len(payload)
+    return written
+
+
+@instrumented(rows_in="rows")
+def update_synonym_lesson_summaries(rows: Iterable[Tuple]) -> int:
+    """
+    Apply many (user_id, lesson_id, summary_text, model_version) tuples to
+    synonym_ai_lesson_insights in one UPDATE ... FROM per batch.
+    """
+    with get_connection() as conn:
+        updated = bulk_update(
+            conn,
+            "public.synonym_ai_lesson_insights",
+            ("user_id", "lesson_id"),
+            ("summary_text", "model_version"),
+            rows,
+            expressions={"evaluated_at": "NOW()"},
+        )
+        conn.commit()
+
+    return updated
 
 
 def update_synonym_lesson_summary(
@@ -235,14 +368,34 @@ def update_synonym_lesson_summary(
     summary_text,
     model_version,
 ):
-    sql = """
-        UPDATE public.synonym_ai_lesson_insights
-        SET summary_text = %s,
-            model_version = %s,
-            evaluated_at = NOW()
-        WHERE user_id = %s AND lesson_id = %s
+    update_synonym_lesson_summaries([(user_id, lesson_id, summary_text, model_version)])
+
+
+class LessonSummaryWriter:
     """
-    with get_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(sql, (summary_text, model_version, user_id, lesson_id))
-        conn.commit()
+    Buffers (user_id, lesson_id, summary_text, model_version) tuples and
+    flushes them with update_synonym_lesson_summaries every batch_size rows.
+    """
+
+    def __init__(self, batch_size: int = 200):
+        self.batch_size = batch_size
+        self.pending = []
+        self.written = 0
+
+    def add(self, user_id, lesson_id, summary_text, model_version):
+        self.pending.append((user_id, lesson_id, summary_text, model_version))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> int:
+        if self.pending:
+            self.written += update_synonym_lesson_summaries(self.pending)
+            self.pending = []
+        return self.written
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
@@ -0,0 +1,86 @@
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+from ai_manager.db import get_connection
+from ai_manager.logging.metrics import add_counter, instrumented
+
+_lock = threading.Lock()
+_version = None
+_index: Dict[str, int] = {}
+
+
+def _words_version(cur):
+    """
+    Cheap change signature for public.words, probed on every chunk: max
+    word_id (one index lookup) and the table's insert/update/delete
+    counters, which move on any change without scanning the table (a
+    writing session reports them within seconds of committing).
+    """
+    cur.execute(
+        """
+        SELECT
+            (SELECT MAX(word_id) FROM public.words),
+            n_tup_ins + n_tup_upd + n_tup_del
+        FROM pg_stat_user_tables
+        WHERE relid = 'public.words'::regclass
+        """
+    )
+    return tuple(cur.fetchone())
+
+
+@instrumented()
+def get_headword_index() -> Dict[str, int]:
+    """
+    Normalized headword (LOWER) -> word_id, reloaded only when public.words
+    has changed since the last load. Duplicate headwords resolve to the
+    lowest word_id.
+    """
+    global _version, _index
+
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            version = _words_version(cur)
+            if version == _version:
+                return _index
+
+            with _lock:
+                if version != _version:
+                    cur.execute(
+                        """
+                        SELECT LOWER(headword), MIN(word_id)
+                        FROM public.words
+                        WHERE headword IS NOT NULL
+                        GROUP BY LOWER(headword)
+                        """
+                    )
+                    _index = dict(cur.fetchall())
+                    _version = version
+
+    return _index
+
+
+@instrumented(rows_in="rows")
+def resolve_word_ids(rows: Iterable[Tuple], key: str = "headword_key") -> Tuple[List[Tuple], Counter]:
+    """
+    Fill the word_id of each aggregate record from the normalized headword
+    in its `key` field; records are immutable, so matches are replaced.
+    Unmatched rows are dropped (and counted as rows_unresolved).
+    Returns (resolved rows, Counter of attempts per unmatched headword).
+    """
+    index = get_headword_index()
+    resolved = []
+    unmatched = Counter()
+    dropped = 0
+
+    for row in rows:
+        headword = getattr(row, key)
+        word_id = index.get(headword)
+        if word_id is None:
+            unmatched[headword] += row.attempts_total
+            dropped += 1
+            continue
+        resolved.append(row._replace(word_id=word_id))
+
+    add_counter("rows_unresolved", dropped)
+    return resolved, unmatched
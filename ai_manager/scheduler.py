@@ -0,0 +1,290 @@
+import argparse
+import os
+import select
+import signal
+import sys
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from ai_manager.config import (
+    DRAIN_LAG_SECONDS,
+    LANE_SHARDS,
+    LANE_WORKERS,
+    SCHEDULER_LANE_INTERVALS,
+    SCHEDULER_MIN_GAP_SECONDS,
+    SCHEDULER_NOTIFY_CHANNEL,
+    SCHEDULER_PROBE_SECONDS,
+)
+from ai_manager.db import close_pool, get_connection, open_listener
+from ai_manager.jobs import math_job, spelling_job, synonym_job
+from ai_manager.jobs.sharding import shard_job_name
+from ai_manager.llm.client import get_client
+from ai_manager.main import LANES, check_pool_size, lane_tasks, task_label
+from ai_manager.repo.math_repo import get_math_latest_attempt_key
+from ai_manager.repo.spelling_repo import get_spelling_latest_attempt_key
+from ai_manager.repo.synonym_repo import get_synonym_latest_attempt_key
+from ai_manager.state.checkpoints import get_checkpoints
+
+# lane -> (checkpoint job name, newest eligible (ts, id) probe)
+LANE_SOURCES = {
+    "synonym": (synonym_job.JOB_NAME, get_synonym_latest_attempt_key),
+    "spelling": (spelling_job.JOB_NAME, get_spelling_latest_attempt_key),
+    "math": (math_job.JOB_NAME, get_math_latest_attempt_key),
+}
+
+# Wait this long before retrying a lost LISTEN connection.
+LISTENER_RETRY_SECONDS = 30
+
+
+class LaneSchedule:
+    """
+    Timing state of one lane: when it last started, when it is next due,
+    and the futures of its current run (one per shard).
+    """
+
+    __slots__ = ("name", "interval", "last_started", "next_due", "running")
+
+    def __init__(self, name: str, interval: float):
+        self.name = name
+        self.interval = interval
+        self.last_started = None
+        self.next_due = time.monotonic()
+        self.running = {}  # future -> shard
+
+    @property
+    def busy(self) -> bool:
+        return any(not future.done() for future in self.running)
+
+    def ready_at(self) -> float:
+        if self.last_started is None:
+            return self.next_due
+        return max(self.next_due, self.last_started + SCHEDULER_MIN_GAP_SECONDS)
+
+
+def _behind(checkpoint, latest) -> bool:
+    """
+    Whether attempts up to `latest` (ts, id) are past `checkpoint`.
+    A ts-only checkpoint (id None) covers every attempt at its ts.
+    """
+    if checkpoint is None or checkpoint[0] is None:
+        return True
+    ts, last_id = checkpoint
+    return ts < latest[0] or (ts == latest[0] and last_id is not None and last_id < latest[1])
+
+
+def lanes_with_backlog(lane_names, shards: int = LANE_SHARDS):
+    """
+    Lanes with attempts old enough to drain (past the lag window) that
+    their checkpoints have not reached. Each shard's checkpoint is compared
+    with the newest attempt of its own learners, since it only advances
+    over those; a shard with no such attempts is never behind. One index
+    probe per lane and shard plus one checkpoint query.
+    """
+    until_ts = datetime.now(timezone.utc) - timedelta(seconds=DRAIN_LAG_SECONDS)
+    checkpoints = get_checkpoints()
+    layout = [None] if shards <= 1 else [(index, shards) for index in range(shards)]
+    pending = []
+
+    for name in lane_names:
+        job_name, latest_attempt_key = LANE_SOURCES[name]
+        for shard in layout:
+            latest = latest_attempt_key(until_ts, shard=shard)
+            if latest is not None and _behind(checkpoints.get(shard_job_name(job_name, shard)), latest):
+                pending.append(name)
+                break
+
+    return pending
+
+
+def warm_up():
+    """
+    Open the pool (and the LLM client when summaries are enabled) once, so
+    lane runs start without connection or client setup.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+
+    if synonym_job.ENABLE_LLM_SUMMARIES:
+        get_client()
+
+
+def _notified_lanes(listener, lane_names):
+    """
+    Drain pending notifications. A payload naming lanes (comma-separated)
+    wakes those lanes; any other payload wakes all of them.
+    """
+    listener.poll()
+    woken = set()
+    while listener.notifies:
+        payload = listener.notifies.pop(0).payload.strip()
+        named = {name.strip() for name in payload.split(",")} & set(lane_names)
+        woken |= named or set(lane_names)
+    return woken
+
+
+def run_scheduler(
+    lane_names=None,
+    workers: int = LANE_WORKERS,
+    shards: int = LANE_SHARDS,
+    channel: str = SCHEDULER_NOTIFY_CHANNEL,
+    probe_seconds: float = SCHEDULER_PROBE_SECONDS,
+) -> int:
+    """
+    Run lanes from one resident process until SIGTERM / SIGINT, then let
+    running lanes finish and return 0.
+
+    Each lane runs on its own interval and earlier when a probe (or a
+    notification followed by a probe) finds attempts past its checkpoint.
+    A lane never overlaps itself and never starts within the minimum gap of
+    its previous start. Between runs the process blocks in select(), so an
+    idle service costs one probe per probe_seconds. Lane failures are
+    reported and retried at the next due time.
+    """
+    lane_names = list(lane_names or LANES)
+    # One more connection for the backlog probe on this thread.
+    check_pool_size(lane_tasks(lane_names, shards), workers, reserved=1)
+    lanes = {name: LaneSchedule(name, SCHEDULER_LANE_INTERVALS[name]) for name in lane_names}
+
+    # Signals and finished runs wake the loop through this pipe.
+    wake_r, wake_w = os.pipe()
+    os.set_blocking(wake_r, False)
+    os.set_blocking(wake_w, False)
+    stopping = []
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    previous_handlers = {sig: signal.signal(sig, stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+    previous_wakeup_fd = signal.set_wakeup_fd(wake_w)
+
+    def wake(_future=None):
+        try:
+            os.write(wake_w, b"\0")
+        except BlockingIOError:
+            pass
+
+    warm_up()
+    print(f"Scheduler started: {', '.join(lane_names)} ({shards} shard(s), {workers} worker(s))")
+
+    listener = None
+    listener_retry_at = time.monotonic()
+    next_probe = time.monotonic() if probe_seconds > 0 else float("inf")
+    rechecks = []
+
+    pool = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        while not stopping:
+            now = time.monotonic()
+
+            if channel and listener is None and now >= listener_retry_at:
+                try:
+                    listener = open_listener(channel)
+                except Exception as exc:
+                    print(f"Scheduler: LISTEN {channel} failed ({exc}); retrying", file=sys.stderr)
+                    listener_retry_at = now + LISTENER_RETRY_SECONDS
+
+            for lane in lanes.values():
+                for future, shard in list(lane.running.items()):
+                    if not future.done():
+                        continue
+                    del lane.running[future]
+                    if future.exception() is not None:
+                        print(f"{task_label(lane.name, shard)} lane FAILED", file=sys.stderr)
+                        traceback.print_exception(future.exception())
+
+            if now >= next_probe:
+                idle = [name for name, lane in lanes.items() if not lane.busy]
+                try:
+                    for name in lanes_with_backlog(idle, shards):
+                        lanes[name].next_due = min(lanes[name].next_due, now)
+                except Exception as exc:
+                    # The service keeps running through database outages.
+                    print(f"Scheduler: probe failed ({exc})", file=sys.stderr)
+                rechecks = [at for at in rechecks if at > now]
+                next_probe = min([now + probe_seconds if probe_seconds > 0 else float("inf"), *rechecks])
+
+            for lane in lanes.values():
+                if lane.busy or now < lane.ready_at():
+                    continue
+                lane.last_started = now
+                lane.next_due = now + lane.interval
+                for name, shard in lane_tasks([lane.name], shards):
+                    future = pool.submit(LANES[name], shard)
+                    future.add_done_callback(wake)
+                    lane.running[future] = shard
+                print(f"Scheduler: started {lane.name}")
+
+            deadlines = [next_probe] + [lane.ready_at() for lane in lanes.values() if not lane.busy]
+            timeout = max(0.0, min(deadlines) - time.monotonic())
+            if channel and listener is None:
+                timeout = min(timeout, max(0.0, listener_retry_at - time.monotonic()))
+
+            readable, _, _ = select.select([wake_r] + ([listener] if listener else []), [], [], timeout)
+
+            if wake_r in readable:
+                while True:
+                    try:
+                        if not os.read(wake_r, 512):
+                            break
+                    except BlockingIOError:
+                        break
+
+            if listener is not None and listener in readable:
+                try:
+                    woken = _notified_lanes(listener, lane_names)
+                except Exception as exc:
+                    print(f"Scheduler: LISTEN connection lost ({exc}); reconnecting", file=sys.stderr)
+                    listener.close()
+                    listener = None
+                    woken = set(lane_names)
+                if woken:
+                    # Probe now, and again once the notified attempts have
+                    # aged past the drain lag window.
+                    now = time.monotonic()
+                    next_probe = min(next_probe, now)
+                    rechecks.append(now + DRAIN_LAG_SECONDS + 1)
+
+        print("Scheduler stopping: waiting for running lanes")
+    finally:
+        pool.shutdown(wait=True)
+        if listener is not None:
+            listener.close()
+        signal.set_wakeup_fd(previous_wakeup_fd)
+        for sig, handler in previous_handlers.items():
+            signal.signal(sig, handler)
+        os.close(wake_r)
+        os.close(wake_w)
+        close_pool()
+
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run AI insight lanes from a resident scheduler.")
+    parser.add_argument("lanes", nargs="*", help=f"Lanes to schedule: {', '.join(LANES)} (default: all)")
+    parser.add_argument("--workers", type=int, default=LANE_WORKERS)
+    parser.add_argument("--shards", type=int, default=LANE_SHARDS, help="hash-partition learners into N shards")
+    parser.add_argument("--channel", default=SCHEDULER_NOTIFY_CHANNEL, help="LISTEN channel for wake-ups")
+    parser.add_argument("--probe-seconds", type=float, default=SCHEDULER_PROBE_SECONDS)
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.lanes if name not in LANES]
+    if unknown:
+        parser.error(f"unknown lanes: {', '.join(unknown)}")
+
+    sys.exit(
+        run_scheduler(
+            args.lanes,
+            workers=args.workers,
+            shards=args.shards,
+            channel=args.channel,
+            probe_seconds=args.probe_seconds,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
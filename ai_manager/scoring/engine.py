@@ -0,0 +1,193 @@
+import gc
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from ai_manager.config import SCORING_HALF_LIFE_DAYS
+
+# Beta prior on the error rate: (errors, correct) pseudo-counts.
+BETA_PRIOR_ERRORS = 1.0
+BETA_PRIOR_CORRECT = 3.0
+
+
+class AttemptArrays(NamedTuple):
+    group: np.ndarray  # int64 code of the (user, lesson, item) key
+    user: np.ndarray  # int64 code of the user
+    ts: np.ndarray  # float64 epoch seconds
+    is_correct: np.ndarray  # float64 0/1; a NULL is_correct is 1, as in the SQL aggregates
+    response_ms: np.ndarray  # float64, NaN when missing
+    user_ids: np.ndarray  # user_id of each user code
+
+
+def _factorize(values: list) -> Tuple[np.ndarray, np.ndarray]:
+    uniques, codes = np.unique(np.asarray(values), return_inverse=True)
+    return uniques, codes.astype(np.int64)
+
+
+def build_arrays(batches: Iterable[List[tuple]]) -> Tuple[AttemptArrays, List[tuple]]:
+    """
+    batches: lists of (user_id, lesson_id, item, epoch_seconds, is_correct, response_ms).
+    Returns the column arrays and the (user_id, lesson_id, item) key of each group code.
+    is_correct None counts as correct: the SQL aggregates only count FALSE
+    as an error.
+    """
+    columns = [[], [], [], [], [], []]
+    # Millions of freshly allocated row objects otherwise trigger repeated
+    # full GC passes, which cost more than the transpose itself.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for batch in batches:
+            if batch:
+                for column, values in zip(columns, zip(*batch)):
+                    column.extend(values)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    users, lessons, items, ts, correct, response = columns
+    if not users:
+        empty = np.zeros(0, dtype=np.int64)
+        return AttemptArrays(
+            empty, empty, empty.astype(np.float64), empty.astype(np.float64), empty.astype(np.float64), empty
+        ), []
+
+    user_values, user_codes = _factorize(users)
+    lesson_values, lesson_codes = _factorize(lessons)
+    item_values, item_codes = _factorize(items)
+
+    n_lessons, n_items = len(lesson_values), len(item_values)
+    combined = (user_codes * n_lessons + lesson_codes) * n_items + item_codes
+    key_codes, group = np.unique(combined, return_inverse=True)
+    keys = list(zip(
+        user_values[key_codes // (n_lessons * n_items)].tolist(),
+        lesson_values[(key_codes // n_items) % n_lessons].tolist(),
+        item_values[key_codes % n_items].tolist(),
+    ))
+
+    arrays = AttemptArrays(
+        group=group.reshape(-1).astype(np.int64),
+        user=user_codes,
+        ts=np.asarray(ts, dtype=np.float64),
+        is_correct=np.nan_to_num(np.asarray(correct, dtype=np.float64), nan=1.0),
+        response_ms=np.asarray(response, dtype=np.float64),
+        user_ids=user_values,
+    )
+    return arrays, keys
+
+
+def _safe_div(num: np.ndarray, den: np.ndarray) -> np.ndarray:
+    return np.divide(num, den, out=np.zeros_like(num, dtype=np.float64), where=den > 0)
+
+
+def compute_features(
+    arrays: AttemptArrays,
+    now: float = None,
+    half_life_days: float = SCORING_HALF_LIFE_DAYS,
+    user_baseline: Optional[np.ndarray] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Per-group features over attempt arrays, all vectorized:
+    counts, plain and time-decayed accuracy, Beta-smoothed error rate and the
+    group's mean response time as a z-score against the user's own attempts
+    (0 for a group without response times).
+
+    user_baseline: (count, sum, sum of squares) of each user's response
+    times, one row per user code, e.g. from the learner's full history (see
+    user_baseline_array). Without it the baseline is taken from the attempts
+    in `arrays`, so a group's z-score depends on which groups share them.
+    """
+    now = time.time() if now is None else now
+    g = arrays.group
+    n_groups = int(g.max()) + 1 if g.size else 0
+    n_users = int(arrays.user.max()) + 1 if arrays.user.size else 0
+
+    n = np.bincount(g, minlength=n_groups).astype(np.float64)
+    correct = np.bincount(g, weights=arrays.is_correct, minlength=n_groups)
+
+    age_days = np.maximum(now - arrays.ts, 0.0) / 86400.0
+    weight = np.power(0.5, age_days / half_life_days)
+    decayed_n = np.bincount(g, weights=weight, minlength=n_groups)
+    decayed_correct = np.bincount(g, weights=weight * arrays.is_correct, minlength=n_groups)
+
+    errors = n - correct
+    smoothed_error = (errors + BETA_PRIOR_ERRORS) / (n + BETA_PRIOR_ERRORS + BETA_PRIOR_CORRECT)
+
+    has_rt = ~np.isnan(arrays.response_ms)
+    rt = np.where(has_rt, arrays.response_ms, 0.0)
+    if user_baseline is None:
+        user_baseline = np.column_stack([
+            np.bincount(arrays.user, weights=has_rt, minlength=n_users),
+            np.bincount(arrays.user, weights=rt, minlength=n_users),
+            np.bincount(arrays.user, weights=rt * rt, minlength=n_users),
+        ])
+    user_rt_n, user_rt_sum, user_rt_sum_sq = np.asarray(user_baseline, dtype=np.float64).reshape(-1, 3).T
+    user_rt_mean = _safe_div(user_rt_sum, user_rt_n)
+    user_rt_sq = _safe_div(user_rt_sum_sq, user_rt_n)
+    user_rt_std = np.sqrt(np.maximum(user_rt_sq - user_rt_mean ** 2, 0.0))
+
+    group_rt_n = np.bincount(g, weights=has_rt, minlength=n_groups)
+    group_rt_mean = _safe_div(np.bincount(g, weights=rt, minlength=n_groups), group_rt_n)
+    group_user = np.zeros(n_groups, dtype=np.int64)
+    group_user[g] = arrays.user
+    response_z = _safe_div(
+        group_rt_mean - user_rt_mean[group_user],
+        user_rt_std[group_user],
+    )
+    # A group without response times is neither fast nor slow.
+    response_z[group_rt_n == 0] = 0.0
+
+    return {
+        "n": n,
+        "accuracy": _safe_div(correct, n),
+        "decayed_accuracy": _safe_div(decayed_correct, decayed_n),
+        "smoothed_error": smoothed_error,
+        "response_z": response_z,
+    }
+
+
+def _phase1_v1(f: Dict[str, np.ndarray]) -> np.ndarray:
+    # Same formula as the SQL aggregates.
+    return f["accuracy"] * 0.7 + (1 - f["accuracy"]) * 0.3
+
+
+def _phase2_decay_v1(f: Dict[str, np.ndarray]) -> np.ndarray:
+    slowness = 1.0 / (1.0 + np.exp(-f["response_z"]))
+    return (
+        (1 - f["decayed_accuracy"]) * 0.5
+        + f["smoothed_error"] * 0.4
+        + slowness * 0.1
+    )
+
+
+MODELS: Dict[str, Callable[[Dict[str, np.ndarray]], np.ndarray]] = {
+    "phase1-v1": _phase1_v1,
+    "phase2-decay-v1": _phase2_decay_v1,
+}
+
+
+def user_baseline_array(arrays: AttemptArrays, baselines: Dict[int, tuple]) -> np.ndarray:
+    """
+    {user_id: (count, sum, sum_sq)} response-time baselines as the
+    user_baseline array of compute_features; users without one get zeros.
+    """
+    empty = (0.0, 0.0, 0.0)
+    return np.array(
+        [baselines.get(user_id, empty) for user_id in arrays.user_ids.tolist()],
+        dtype=np.float64,
+    ).reshape(-1, 3)
+
+
+def score(
+    arrays: AttemptArrays,
+    model_version: str,
+    now: float = None,
+    user_baseline: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    weakness_score per group code under the formula selected by model_version.
+    """
+    if model_version not in MODELS:
+        raise ValueError(f"Unknown scoring model: {model_version}")
+    return MODELS[model_version](compute_features(arrays, now=now, user_baseline=user_baseline))
@@ -0,0 +1,43 @@
+from typing import Callable, Dict, Iterable, Optional
+
+from ai_manager.logging.metrics import instrumented
+
+# Scored by the SQL aggregates themselves; no rescoring stage needed.
+SQL_MODEL_VERSION = "phase1-v1"
+
+
+@instrumented(rows_in="keys")
+def rescore_items(
+    keys: Iterable[tuple],
+    iter_attempts: Callable,
+    update_scores: Callable,
+    model_version: str,
+    key_map: Optional[Dict[tuple, tuple]] = None,
+    user_baselines: Optional[Callable] = None,
+) -> int:
+    """
+    Recompute weakness_score for the given item keys from their full attempt
+    history, under the formula selected by model_version.
+    key_map translates streamed keys to stored keys when they differ
+    (synonym headword_key -> word_id).
+    user_baselines(user_ids) -> {user_id: (count, sum, sum_sq)} gives each
+    learner's response-time baseline over their whole history, so a score
+    does not depend on which other items are rescored with it.
+    """
+    # NumPy is only needed once a non-SQL model is selected.
+    from ai_manager.scoring.engine import build_arrays, score, user_baseline_array
+
+    arrays, group_keys = build_arrays(iter_attempts(keys))
+    if not group_keys:
+        return 0
+
+    baseline = None
+    if user_baselines is not None:
+        baseline = user_baseline_array(arrays, user_baselines(arrays.user_ids.tolist()))
+
+    scores = score(arrays, model_version, user_baseline=baseline)
+    rows = (
+        (*(key_map[key] if key_map else key), float(value), model_version)
+        for key, value in zip(group_keys, scores)
+    )
+    return update_scores(rows)
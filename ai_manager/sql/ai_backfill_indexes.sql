@@ -0,0 +1,13 @@
+-- Per-learner lookups on the attempts tables: a backfill reads one user_id
+-- range at a time, and non-SQL scoring models stream each item's history
+-- by (user_id, lesson_id, item).
+-- Run outside a transaction block (CREATE INDEX CONCURRENTLY).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS attempts_user_lesson_idx
+    ON public.attempts (user_id, lesson_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS spelling_attempts_user_lesson_idx
+    ON public.spelling_attempts (user_id, lesson_id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS math_attempts_user_lesson_idx
+    ON public.math_attempts (user_id, lesson_id);
@@ -0,0 +1,145 @@
+-- Per-(user, lesson, item, day) rollups of the attempts each lane merges.
+-- The lanes add every chunk's delta here (additive state only, day = UTC
+-- date of the attempt) and derive the all-time insight deltas from the same
+-- staged rows. The *_window_insights views serve 7- and 30-day figures from
+-- these rows, without touching the attempt tables.
+-- SAFE: additive only (new tables and views)
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.synonym_ai_word_daily (
+    user_id BIGINT NOT NULL,
+    course_id INT,
+    lesson_id BIGINT NOT NULL,
+    word_id BIGINT NOT NULL,
+    day DATE NOT NULL,
+    attempts_total BIGINT NOT NULL,
+    attempts_incorrect BIGINT NOT NULL,
+    response_ms_sum NUMERIC,
+    response_ms_count BIGINT,
+    last_attempt_at TIMESTAMPTZ,
+    last_incorrect_at TIMESTAMPTZ,
+    PRIMARY KEY (user_id, lesson_id, word_id, day)
+);
+
+CREATE TABLE IF NOT EXISTS public.spelling_ai_word_daily (
+    user_id BIGINT NOT NULL,
+    lesson_id BIGINT NOT NULL,
+    headword TEXT NOT NULL,
+    day DATE NOT NULL,
+    attempts_total BIGINT NOT NULL,
+    attempts_incorrect BIGINT NOT NULL,
+    response_ms_sum NUMERIC,
+    response_ms_count BIGINT,
+    last_attempt_at TIMESTAMPTZ,
+    last_incorrect_at TIMESTAMPTZ,
+    PRIMARY KEY (user_id, lesson_id, headword, day)
+);
+
+CREATE TABLE IF NOT EXISTS public.math_ai_question_daily (
+    user_id BIGINT NOT NULL,
+    lesson_id BIGINT NOT NULL,
+    question_id TEXT NOT NULL,
+    day DATE NOT NULL,
+    attempts_total BIGINT NOT NULL,
+    attempts_incorrect BIGINT NOT NULL,
+    response_ms_sum NUMERIC,
+    response_ms_count BIGINT,
+    last_attempt_at TIMESTAMPTZ,
+    last_incorrect_at TIMESTAMPTZ,
+    PRIMARY KEY (user_id, lesson_id, question_id, day)
+);
+
+-- Sliding windows (last 7 / 30 UTC days, today included). Filter on user_id
+-- (and lesson_id): the primary key serves it, so a learner's windows read
+-- at most 30 rows per item. weakness_* uses the phase1-v1 formula.
+CREATE OR REPLACE VIEW public.synonym_ai_word_window_insights AS
+SELECT
+    user_id,
+    course_id,
+    lesson_id,
+    word_id,
+    attempts_7d,
+    1 - attempts_incorrect_7d::numeric / NULLIF(attempts_7d, 0) AS accuracy_rate_7d,
+    (1 - attempts_incorrect_7d::numeric / NULLIF(attempts_7d, 0)) * 0.7
+        + (attempts_incorrect_7d::numeric / NULLIF(attempts_7d, 0)) * 0.3 AS weakness_score_7d,
+    attempts_30d,
+    1 - attempts_incorrect_30d::numeric / NULLIF(attempts_30d, 0) AS accuracy_rate_30d,
+    (1 - attempts_incorrect_30d::numeric / NULLIF(attempts_30d, 0)) * 0.7
+        + (attempts_incorrect_30d::numeric / NULLIF(attempts_30d, 0)) * 0.3 AS weakness_score_30d,
+    last_attempt_at
+FROM (
+    SELECT
+        user_id,
+        MAX(course_id) AS course_id,
+        lesson_id,
+        word_id,
+        SUM(attempts_total) FILTER (WHERE day > (NOW() AT TIME ZONE 'UTC')::date - 7) AS attempts_7d,
+        SUM(attempts_incorrect) FILTER (WHERE day > (NOW() AT TIME ZONE 'UTC')::date - 7) AS attempts_incorrect_7d,
+        SUM(attempts_total) AS attempts_30d,
+        SUM(attempts_incorrect) AS attempts_incorrect_30d,
+        MAX(last_attempt_at) AS last_attempt_at
+    FROM public.synonym_ai_word_daily
+    WHERE day > (NOW() AT TIME ZONE 'UTC')::date - 30
+    GROUP BY user_id, lesson_id, word_id
+) w;
+
+CREATE OR REPLACE VIEW public.spelling_ai_word_window_insights AS
+SELECT
+    user_id,
+    lesson_id,
+    headword,
+    attempts_7d,
+    1 - attempts_incorrect_7d::numeric / NULLIF(attempts_7d, 0) AS accuracy_rate_7d,
+    (1 - attempts_incorrect_7d::numeric / NULLIF(attempts_7d, 0)) * 0.7
+        + (attempts_incorrect_7d::numeric / NULLIF(attempts_7d, 0)) * 0.3 AS weakness_score_7d,
+    attempts_30d,
+    1 - attempts_incorrect_30d::numeric / NULLIF(attempts_30d, 0) AS accuracy_rate_30d,
+    (1 - attempts_incorrect_30d::numeric / NULLIF(attempts_30d, 0)) * 0.7
+        + (attempts_incorrect_30d::numeric / NULLIF(attempts_30d, 0)) * 0.3 AS weakness_score_30d,
+    last_attempt_at
+FROM (
+    SELECT
+        user_id,
+        lesson_id,
+        headword,
+        SUM(attempts_total) FILTER (WHERE day > (NOW() AT TIME ZONE 'UTC')::date - 7) AS attempts_7d,
+        SUM(attempts_incorrect) FILTER (WHERE day > (NOW() AT TIME ZONE 'UTC')::date - 7) AS attempts_incorrect_7d,
+        SUM(attempts_total) AS attempts_30d,
+        SUM(attempts_incorrect) AS attempts_incorrect_30d,
+        MAX(last_attempt_at) AS last_attempt_at
+    FROM public.spelling_ai_word_daily
+    WHERE day > (NOW() AT TIME ZONE 'UTC')::date - 30
+    GROUP BY user_id, lesson_id, headword
+) w;
+
+CREATE OR REPLACE VIEW public.math_ai_question_window_insights AS
+SELECT
+    user_id,
+    lesson_id,
+    question_id,
+    attempts_7d,
+    1 - attempts_incorrect_7d::numeric / NULLIF(attempts_7d, 0) AS accuracy_rate_7d,
+    (1 - attempts_incorrect_7d::numeric / NULLIF(attempts_7d, 0)) * 0.7
+        + (attempts_incorrect_7d::numeric / NULLIF(attempts_7d, 0)) * 0.3 AS weakness_score_7d,
+    attempts_30d,
+    1 - attempts_incorrect_30d::numeric / NULLIF(attempts_30d, 0) AS accuracy_rate_30d,
+    (1 - attempts_incorrect_30d::numeric / NULLIF(attempts_30d, 0)) * 0.7
+        + (attempts_incorrect_30d::numeric / NULLIF(attempts_30d, 0)) * 0.3 AS weakness_score_30d,
+    last_attempt_at
+FROM (
+    SELECT
+        user_id,
+        lesson_id,
+        question_id,
+        SUM(attempts_total) FILTER (WHERE day > (NOW() AT TIME ZONE 'UTC')::date - 7) AS attempts_7d,
+        SUM(attempts_incorrect) FILTER (WHERE day > (NOW() AT TIME ZONE 'UTC')::date - 7) AS attempts_incorrect_7d,
+        SUM(attempts_total) AS attempts_30d,
+        SUM(attempts_incorrect) AS attempts_incorrect_30d,
+        MAX(last_attempt_at) AS last_attempt_at
+    FROM public.math_ai_question_daily
+    WHERE day > (NOW() AT TIME ZONE 'UTC')::date - 30
+    GROUP BY user_id, lesson_id, question_id
+) w;
+
+COMMIT;
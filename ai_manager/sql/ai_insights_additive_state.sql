@@ -0,0 +1,59 @@
+-- Mergeable aggregation state for the insight tables.
+-- The lanes upsert per-run deltas and merge them into these columns,
+-- so accuracy_rate / avg_response_ms / weakness_score can be recomputed
+-- from exact running totals instead of from the latest delta only.
+--
+-- Rows written before this version only hold figures of their latest run
+-- (and of at most 500 attempts), so they cannot seed exact totals. They
+-- are cleared, with their daily rollups if present, and the lane
+-- checkpoints are reset: the next run of each lane re-drains the whole
+-- attempt history into fresh state. Lesson rows are rewritten as it goes.
+-- Derived rows only; the attempt tables are untouched.
+
+BEGIN;
+
+ALTER TABLE public.synonym_ai_word_insights
+    ADD COLUMN IF NOT EXISTS response_ms_sum NUMERIC,
+    ADD COLUMN IF NOT EXISTS response_ms_count BIGINT;
+
+ALTER TABLE public.spelling_ai_word_insights
+    ADD COLUMN IF NOT EXISTS response_ms_sum NUMERIC,
+    ADD COLUMN IF NOT EXISTS response_ms_count BIGINT;
+
+ALTER TABLE public.math_ai_question_insights
+    ADD COLUMN IF NOT EXISTS response_ms_sum NUMERIC,
+    ADD COLUMN IF NOT EXISTS response_ms_count BIGINT;
+
+TRUNCATE public.synonym_ai_word_insights,
+         public.spelling_ai_word_insights,
+         public.math_ai_question_insights;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY[
+        'public.synonym_ai_word_daily',
+        'public.spelling_ai_word_daily',
+        'public.math_ai_question_daily'
+    ] LOOP
+        IF to_regclass(t) IS NOT NULL THEN
+            EXECUTE format('TRUNCATE %s', t);
+        END IF;
+    END LOOP;
+
+    FOREACH t IN ARRAY ARRAY[
+        'public.platform_ai_job_checkpoints',
+        'public.platform_ai_job_checkpoint'
+    ] LOOP
+        IF to_regclass(t) IS NOT NULL THEN
+            EXECUTE format(
+                'DELETE FROM %s WHERE split_part(job_name, '':'', 1) = ANY(%L)',
+                t,
+                ARRAY['synonym_ai_phase1', 'spelling_ai_phase1', 'math_ai_phase1']
+            );
+        END IF;
+    END LOOP;
+END $$;
+
+COMMIT;
@@ -0,0 +1,35 @@
+-- Lesson-level insights for the spelling and math lanes, matching
+-- synonym_ai_lesson_insights: one row per (user, lesson), recomputed from
+-- the item insight tables for the lessons a run touched, with the lesson's
+-- weakest items by weakness_score.
+-- SAFE: additive only (new tables)
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS public.spelling_ai_lesson_insights (
+    user_id BIGINT NOT NULL,
+    lesson_id BIGINT NOT NULL,
+    attempts_total BIGINT,
+    accuracy_rate NUMERIC,
+    avg_response_ms NUMERIC,
+    last_attempt_at TIMESTAMPTZ,
+    top_weak_headwords JSONB,
+    evaluated_at TIMESTAMPTZ,
+    model_version TEXT,
+    PRIMARY KEY (user_id, lesson_id)
+);
+
+CREATE TABLE IF NOT EXISTS public.math_ai_lesson_insights (
+    user_id BIGINT NOT NULL,
+    lesson_id BIGINT NOT NULL,
+    attempts_total BIGINT,
+    accuracy_rate NUMERIC,
+    avg_response_ms NUMERIC,
+    last_attempt_at TIMESTAMPTZ,
+    top_weak_question_ids JSONB,
+    evaluated_at TIMESTAMPTZ,
+    model_version TEXT,
+    PRIMARY KEY (user_id, lesson_id)
+);
+
+COMMIT;
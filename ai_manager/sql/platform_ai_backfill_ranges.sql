@@ -0,0 +1,19 @@
+-- Ledger of historical backfills (python -m ai_manager.jobs.backfill).
+-- One row per (backfill, lane, user_id range); a range stays pending
+-- (finished_at IS NULL) until its insight rows were rebuilt, so a rerun of
+-- the same backfill_name resumes with the ranges still pending.
+
+CREATE TABLE IF NOT EXISTS public.platform_ai_backfill_ranges (
+    backfill_name TEXT NOT NULL,
+    lane TEXT NOT NULL,
+    range_index INT NOT NULL,
+    user_from BIGINT NOT NULL,
+    user_to BIGINT NOT NULL,
+    model_version TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMPTZ,
+    attempts BIGINT,
+    rows_written BIGINT,
+    job_run_id TEXT,
+    PRIMARY KEY (backfill_name, lane, range_index)
+);
@@ -0,0 +1,6 @@
+-- Per-run metrics for platform_ai_job_runs: stage timings, row counts,
+-- DB round-trips, LLM tokens/latency percentiles and peak memory, as JSON.
+-- SAFE: additive only (no data loss)
+
+ALTER TABLE public.platform_ai_job_runs
+    ADD COLUMN IF NOT EXISTS metrics JSONB;
@@ -9,5 +9,9 @@ CREATE TABLE IF NOT EXISTS public.platform_ai_job_runs (
 
 CREATE TABLE IF NOT EXISTS public.platform_ai_job_checkpoints (
     job_name TEXT PRIMARY KEY,
-    last_processed_at TIMESTAMPTZ
+    last_processed_at TIMESTAMPTZ,
+    last_processed_id BIGINT
 );
+
+ALTER TABLE public.platform_ai_job_checkpoints
+    ADD COLUMN IF NOT EXISTS last_processed_id BIGINT;
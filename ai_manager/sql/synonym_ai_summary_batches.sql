@@ -0,0 +1,38 @@
+-- Lesson-summary batches submitted to the Batch API (AI_SUMMARY_MODE=batch).
+-- A row stays pending (finished_at IS NULL) until a later run downloads the
+-- batch's output and applies it to synonym_ai_lesson_insights.
+
+CREATE TABLE IF NOT EXISTS public.synonym_ai_summary_batches (
+    batch_id TEXT PRIMARY KEY,
+    input_file_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    lesson_count INT NOT NULL,
+    status TEXT NOT NULL,
+    job_run_id TEXT,
+    submitted_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMPTZ,
+    summaries_applied INT,
+    summaries_failed INT,
+    -- {cache_key: [[user_id, lesson_id], ...]}: further lessons that render
+    -- the same prompt as a submitted line and receive its summary too.
+    shared_lessons JSONB
+);
+
+ALTER TABLE public.synonym_ai_summary_batches ADD COLUMN IF NOT EXISTS shared_lessons JSONB;
+
+CREATE INDEX IF NOT EXISTS synonym_ai_summary_batches_pending_idx
+    ON public.synonym_ai_summary_batches (submitted_at)
+    WHERE finished_at IS NULL;
+
+-- Latest submitted prompt (cache_key) per lesson. A finished batch writes a
+-- lesson's summary only while its line's cache_key is still the lesson's
+-- latest, so an older batch finishing after a newer one never overwrites
+-- the newer summary.
+CREATE TABLE IF NOT EXISTS public.synonym_ai_summary_batch_lessons (
+    user_id BIGINT NOT NULL,
+    lesson_id BIGINT NOT NULL,
+    cache_key TEXT NOT NULL,
+    batch_id TEXT NOT NULL,
+    PRIMARY KEY (user_id, lesson_id)
+);
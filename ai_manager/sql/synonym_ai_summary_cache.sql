@@ -0,0 +1,13 @@
+-- Content-addressed cache of LLM lesson summaries.
+-- cache_key = sha256(model, system prompt, user prompt, generation params).
+
+CREATE TABLE IF NOT EXISTS public.synonym_ai_summary_cache (
+    cache_key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    summary_text TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    last_used_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS synonym_ai_summary_cache_last_used_idx
+    ON public.synonym_ai_summary_cache (last_used_at);
@@ -0,0 +1,5 @@
+-- Normalized headword lookup used by the synonym lane's word resolver.
+-- Run outside a transaction block (CREATE INDEX CONCURRENTLY).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS words_lower_headword_idx
+    ON public.words (LOWER(headword));
@@ -1,4 +1,8 @@
-from ai_manager.db import get_connection
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from ai_manager.db import dry_run, get_connection
+from ai_manager.logging.metrics import instrumented
 import psycopg2
 
 CHECKPOINT_TABLE_CANDIDATES = [
@@ -6,70 +10,216 @@ CHECKPOINT_TABLE_CANDIDATES = [
     "public.platform_ai_job_checkpoint",
 ]
 
+# Resolved once per process: which candidate table is in use, and whether
+# its schema (last_processed_id) has been ensured by this process.
+_table_lock = threading.Lock()
+_table_name: Optional[str] = None
+_table_ensured = False
+
 
-def _pick_table(conn) -> str:
+def _pick_table(conn) -> Optional[str]:
     """
-    Pick the first checkpoints table that exists, else default to the primary name.
+    Pick the first checkpoints table that exists (one round-trip), else None.
     """
     with conn.cursor() as cur:
-        for t in CHECKPOINT_TABLE_CANDIDATES:
-            cur.execute("SELECT to_regclass(%s);", (t,))
-            exists = cur.fetchone()[0]
-            if exists:
-                return t
-    return CHECKPOINT_TABLE_CANDIDATES[0]
+        cur.execute(
+            "SELECT t FROM unnest(%s::text[]) WITH ORDINALITY AS c(t, n) "
+            "WHERE to_regclass(t) IS NOT NULL ORDER BY n LIMIT 1",
+            (CHECKPOINT_TABLE_CANDIDATES,),
+        )
+        row = cur.fetchone()
+    return row[0] if row else None
 
 
 def _ensure_table_exists(conn, table_name: str):
     """
-    Ensure the checkpoints table exists (job_name PK + last_processed_at).
+    Ensure the checkpoints table exists (job_name PK + last_processed_at/id).
+    The DDL only runs when something is missing, so the steady state takes
+    no exclusive lock.
     """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT EXISTS (
+                SELECT 1 FROM pg_attribute
+                WHERE attrelid = to_regclass(%s)
+                  AND attname = 'last_processed_id'
+                  AND NOT attisdropped
+            )
+            """,
+            (table_name,),
+        )
+        if cur.fetchone()[0]:
+            return
+
     ddl = f"""
     CREATE TABLE IF NOT EXISTS {table_name} (
         job_name TEXT PRIMARY KEY,
-        last_processed_at TIMESTAMPTZ
+        last_processed_at TIMESTAMPTZ,
+        last_processed_id BIGINT
     );
+    ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS last_processed_id BIGINT;
     """
     with conn.cursor() as cur:
         cur.execute(ddl)
 
 
+def _checkpoint_table(conn, ensure: bool = False) -> Optional[str]:
+    """
+    The checkpoints table, resolved once per process. With ensure=True the
+    table is created / migrated (once per process, every time in a dry run)
+    in the caller's transaction. Without it, None means no checkpoints table exists yet.
+    """
+    global _table_name, _table_ensured
+
+    if _table_name is not None and (_table_ensured or not ensure):
+        return _table_name
+
+    with _table_lock:
+        if _table_name is None:
+            _table_name = _pick_table(conn)
+        if ensure and not _table_ensured:
+            table_name = _table_name or CHECKPOINT_TABLE_CANDIDATES[0]
+            _ensure_table_exists(conn, table_name)
+            if dry_run():
+                # The DDL is rolled back with the dry run's transaction, so
+                # nothing is cached and the next call ensures it again.
+                return table_name
+            _table_name, _table_ensured = table_name, True
+        return _table_name
+
+
+def reset_checkpoint_table():
+    """
+    Forget the resolved table (e.g. after it was dropped or renamed).
+    """
+    global _table_name, _table_ensured
+
+    with _table_lock:
+        _table_name = None
+        _table_ensured = False
+
+
+def get_checkpoints(job_names: Optional[Iterable[str]] = None) -> Dict[str, Tuple]:
+    """
+    Keyset positions {job_name: (last_processed_at, last_processed_id)} for
+    the given jobs (all jobs when None), in one query. Jobs without a
+    checkpoint are absent. last_processed_id is None for checkpoints
+    written before ids were tracked.
+    """
+    names = list(job_names) if job_names is not None else None
+    sql = """
+        SELECT job_name, last_processed_at, {last_id}
+        FROM {table_name}
+        WHERE %(names)s::text[] IS NULL OR job_name = ANY(%(names)s)
+    """
+
+    with get_connection() as conn:
+        table_name = _checkpoint_table(conn)
+        if table_name is None:
+            return {}
+
+        with conn.cursor() as cur:
+            # Failed reads roll back to this savepoint only, so the caller's
+            # open transaction (e.g. a pinned lane connection) keeps its work.
+            cur.execute("SAVEPOINT ai_checkpoint_read")
+            try:
+                cur.execute(sql.format(last_id="last_processed_id", table_name=table_name), {"names": names})
+            except psycopg2.errors.UndefinedColumn:
+                # Table predates last_processed_id -> ts-only checkpoints
+                cur.execute("ROLLBACK TO SAVEPOINT ai_checkpoint_read")
+                cur.execute(sql.format(last_id="NULL", table_name=table_name), {"names": names})
+            except psycopg2.errors.UndefinedTable:
+                # Table dropped since it was resolved -> treat as first run
+                cur.execute("ROLLBACK TO SAVEPOINT ai_checkpoint_read")
+                reset_checkpoint_table()
+                return {}
+            rows = cur.fetchall()
+            cur.execute("RELEASE SAVEPOINT ai_checkpoint_read")
+
+        return {name: (ts, last_id) for name, ts, last_id in rows}
+
+
+@instrumented()
+def lock_checkpoints(job_names: Iterable[str]) -> Dict[str, Tuple]:
+    """
+    Lock the given jobs' checkpoint rows (in job_name order) until the end of
+    the caller's db.transaction(), and return their keyset positions like
+    get_checkpoints(). Missing rows are inserted first (empty, so they read
+    as no checkpoint), since FOR UPDATE cannot lock a row that does not
+    exist yet. Lanes lock their checkpoint first thing in each chunk
+    transaction and a backfill locks the lane's before it merges what the
+    lane merged meanwhile, so the two never write the same learners
+    concurrently and never deadlock.
+    """
+    names = sorted(set(job_names))
+
+    with get_connection() as conn:
+        table_name = _checkpoint_table(conn, ensure=True)
+
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                INSERT INTO {table_name} (job_name)
+                SELECT unnest(%s::text[])
+                ON CONFLICT (job_name) DO NOTHING
+                """,
+                (names,),
+            )
+            cur.execute(
+                f"""
+                SELECT job_name, last_processed_at, last_processed_id
+                FROM {table_name}
+                WHERE job_name = ANY(%s)
+                ORDER BY job_name
+                FOR UPDATE
+                """,
+                (names,),
+            )
+            return {name: (ts, last_id) for name, ts, last_id in cur.fetchall() if ts is not None}
+
+
 def get_checkpoint(job_name: str):
     """
     Returns last_processed_at or None.
     If the table doesn't exist yet, return None (first run).
     """
-    try:
-        with get_connection() as conn:
-            table_name = _pick_table(conn)
-            sql = f"""
-                SELECT last_processed_at
-                FROM {table_name}
-                WHERE job_name = %s
-            """
-            with conn.cursor() as cur:
-                cur.execute(sql, (job_name,))
-                row = cur.fetchone()
-                return row[0] if row else None
-    except psycopg2.errors.UndefinedTable:
-        # Infra table missing -> treat as first run
-        return None
+    return get_checkpoint_key(job_name)[0]
 
 
-def update_checkpoint(job_name: str, ts):
+@instrumented()
+def get_checkpoint_key(job_name: str):
+    """
+    Returns the keyset position (last_processed_at, last_processed_id).
+    Either part may be None: (None, None) on first run, (ts, None) for
+    checkpoints written before ids were tracked.
+    """
+    return get_checkpoints([job_name]).get(job_name, (None, None))
+
+
+@instrumented()
+def update_checkpoint(job_name: str, ts, last_id=None):
     """
     Upsert checkpoint. Creates table if missing.
+    last_id is the attempts id at ts when the lane walks in (ts, id) order.
+    Inside db.transaction() the commit is deferred, so the checkpoint lands
+    atomically with the writes it covers.
     """
     with get_connection() as conn:
-        table_name = _pick_table(conn)
-        _ensure_table_exists(conn, table_name)
+        table_name = _checkpoint_table(conn, ensure=True)
 
         sql = f"""
-            INSERT INTO {table_name} (job_name, last_processed_at)
-            VALUES (%s, %s)
+            INSERT INTO {table_name} (job_name, last_processed_at, last_processed_id)
+            VALUES (%s, %s, %s)
             ON CONFLICT (job_name)
-            DO UPDATE SET last_processed_at = EXCLUDED.last_processed_at
+            DO UPDATE SET last_processed_at = EXCLUDED.last_processed_at,
+                          last_processed_id = EXCLUDED.last_processed_id
         """
-        with conn.cursor() as cur:
-            cur.execute(sql, (job_name, ts))
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql, (job_name, ts, last_id))
+        except psycopg2.errors.UndefinedTable:
+            # The DDL that ensured it was rolled back, or it was dropped
+            reset_checkpoint_table()
+            raise
         conn.commit()
@@ -0,0 +1,59 @@
+import json
+
+from ai_manager.llm.prompts import BATCH_SUMMARY_MAX_CHARS, parse_batch_summaries
+
+LESSONS = [
+    {"user_id": 7, "lesson_id": 1},
+    {"user_id": 7, "lesson_id": 2},
+    {"user_id": 8, "lesson_id": 1},
+]
+
+
+def _reply(*items):
+    return json.dumps({"summaries": [dict(zip(("user_id", "lesson_id", "summary"), item)) for item in items]})
+
+
+def test_valid_items_are_keyed_like_the_lesson_rows():
+    text = _reply((7, 1, "Steady accuracy."), ("8", "1", "  Mostly correct.  "))
+
+    assert parse_batch_summaries(text, LESSONS) == {
+        (7, 1): "Steady accuracy.",
+        (8, 1): "Mostly correct.",
+    }
+
+
+def test_malformed_replies_accept_nothing():
+    for text in (
+        "not json",
+        '{"summaries": [',
+        "",
+        None,
+        json.dumps([{"user_id": 7, "lesson_id": 1, "summary": "x"}]),
+        json.dumps({"summaries": {"user_id": 7, "lesson_id": 1, "summary": "x"}}),
+        json.dumps({"items": []}),
+    ):
+        assert parse_batch_summaries(text, LESSONS) == {}
+
+
+def test_unknown_lessons_are_dropped():
+    text = _reply((7, 1, "Kept."), (9, 1, "Not requested."), (7, 3, "Not requested."))
+
+    assert parse_batch_summaries(text, LESSONS) == {(7, 1): "Kept."}
+
+
+def test_duplicate_lessons_are_dropped_entirely():
+    text = _reply((7, 1, "First."), (7, 2, "Kept."), ("7", "1", "Second."))
+
+    assert parse_batch_summaries(text, LESSONS) == {(7, 2): "Kept."}
+
+
+def test_empty_non_text_and_overlong_summaries_are_dropped():
+    text = _reply(
+        (7, 1, "   "),
+        (7, 2, None),
+        (8, 1, "x" * (BATCH_SUMMARY_MAX_CHARS + 1)),
+    )
+    items = json.loads(text)["summaries"] + ["not an object", {"user_id": 7}]
+
+    assert parse_batch_summaries(text, LESSONS) == {}
+    assert parse_batch_summaries(json.dumps({"summaries": items}), LESSONS) == {}
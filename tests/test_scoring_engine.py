@@ -0,0 +1,74 @@
+import numpy as np
+
+from ai_manager.scoring.engine import build_arrays, compute_features, score, user_baseline_array
+
+NOW = 1_700_000_000.0
+DAY = 86400.0
+
+# (user_id, lesson_id, item, epoch_seconds, is_correct, response_ms)
+ITEM_A = [
+    (7, 1, "a", NOW - 1 * DAY, 1, 1200),
+    (7, 1, "a", NOW - 2 * DAY, 0, 3400),
+    (7, 1, "a", NOW - 5 * DAY, 1, None),
+]
+ITEM_B = [
+    (7, 1, "b", NOW - 1 * DAY, 1, 800),
+    (7, 1, "b", NOW - 3 * DAY, 1, 900),
+    (7, 2, "b", NOW - 4 * DAY, 0, 5000),
+]
+OTHER_USER = [
+    (8, 1, "a", NOW - 1 * DAY, 0, 9000),
+]
+
+
+def _history_baselines(user_ids):
+    # What get_*_response_baselines returns: (count, sum, sum_sq) over every attempt.
+    history = ITEM_A + ITEM_B + OTHER_USER
+    baselines = {}
+    for user_id in user_ids:
+        times = [float(ms) for u, *_, ms in history if u == user_id and ms is not None]
+        baselines[user_id] = (float(len(times)), sum(times), sum(t * t for t in times))
+    return baselines
+
+
+def _scores(attempts, model_version="phase2-decay-v1"):
+    arrays, keys = build_arrays([attempts])
+    baseline = user_baseline_array(arrays, _history_baselines(arrays.user_ids.tolist()))
+    return dict(zip(keys, score(arrays, model_version, now=NOW, user_baseline=baseline).tolist()))
+
+
+def test_score_does_not_depend_on_the_items_rescored_with_it():
+    alone = _scores(ITEM_A)
+    batched = _scores(ITEM_A + ITEM_B + OTHER_USER)
+
+    assert np.isclose(alone[(7, 1, "a")], batched[(7, 1, "a")])
+    assert np.isclose(_scores(ITEM_B)[(7, 1, "b")], batched[(7, 1, "b")])
+
+
+def test_baseline_array_follows_user_codes():
+    arrays, _ = build_arrays([OTHER_USER + ITEM_A])
+    baseline = user_baseline_array(arrays, {8: (1.0, 9000.0, 81e6)})
+
+    assert arrays.user_ids.tolist() == [7, 8]
+    assert baseline.tolist() == [[0.0, 0.0, 0.0], [1.0, 9000.0, 81e6]]
+
+
+def test_items_without_response_times_are_neither_fast_nor_slow():
+    untimed = [
+        (7, 3, "c", NOW - 1 * DAY, 1, None),
+        (7, 3, "c", NOW - 2 * DAY, 0, None),
+    ]
+    arrays, keys = build_arrays([untimed + ITEM_B])
+    baseline = user_baseline_array(arrays, _history_baselines([7]))
+    features = compute_features(arrays, now=NOW, user_baseline=baseline)
+
+    assert features["response_z"][keys.index((7, 3, "c"))] == 0.0
+
+
+def test_null_is_correct_is_not_an_error_as_in_sql():
+    # The SQL aggregates count only is_correct = FALSE as incorrect.
+    with_null = [(7, 1, "a", NOW - 1 * DAY, None, 1200), (7, 1, "a", NOW - 2 * DAY, 0, 3400)]
+    as_correct = [(7, 1, "a", NOW - 1 * DAY, 1, 1200), (7, 1, "a", NOW - 2 * DAY, 0, 3400)]
+
+    assert _scores(with_null, "phase1-v1") == _scores(as_correct, "phase1-v1")
+    assert _scores(with_null) == _scores(as_correct)